@@ -1,23 +1,32 @@
 #!/usr/bin/env python3
 """
 独立的 MCP 服务器
-通过 HTTP API 与 Web 服务器通信
+默认通过 HTTP API 与 Web 服务器通信；设置 EMBEDDED_WEB_SERVER=true 时在本进程内托管 Web 服务器
 """
 
 from src.utils.logger import setup_logger
 from src.utils.i18n import get_text
+from src.core.feedback_questions import QuestionError, format_answers, normalize_questions
+from src.core.image_budget import make_candidate, allocate_budget, select_variant
+from src.utils.image_format import SNIFF_BYTES, sniff_image_format
 from fastmcp import FastMCP, Image
-from typing import List, Union, Any
+from typing import TYPE_CHECKING, List, Union, Any, Optional, Dict, Tuple
 import asyncio
-import json
 import uuid
-import aiohttp
-import base64
+import mmap
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import sys
 import os
 
+# aiohttp 与 base64 只在处理请求时使用，延迟导入以缩短 MCP 握手前的启动时间
+if TYPE_CHECKING:
+    import aiohttp
+
 # 添加项目根目录到 Python 路径
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
@@ -34,15 +43,850 @@ WEB_HOST = os.getenv("WEB_HOST", "localhost")
 WEB_PORT = os.getenv("WEB_PORT", "9999")
 WEB_BASE_URL = f"http://{WEB_HOST}:{WEB_PORT}"
 
+# 可选：通过 Unix 域套接字连接同机 Web 服务器（需与 Web 服务器的 WEB_UDS_PATH 一致）
+WEB_UDS_PATH = os.getenv("WEB_UDS_PATH", "")
+
 # 反馈收集配置
 FEEDBACK_TIMEOUT = int(os.getenv("FEEDBACK_TIMEOUT", "600"))
 
+# 图片交接方式：auto（同机时使用共享内存）、shm、inline
+IMAGE_HANDOFF = os.getenv("IMAGE_HANDOFF", "auto").lower()
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# 已解码图片缓存（按内容哈希），跨工具调用复用
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 图片解码线程数（同时处理的图片数量上限），解码与 Image 构建不在事件循环中执行
+IMAGE_DECODE_WORKERS = max(1, int(os.getenv("IMAGE_DECODE_WORKERS", "4")))
+
+# 分块解码 base64 的块大小（4 的倍数），块之间可切换线程，避免长时间占用 GIL
+BASE64_CHUNK_CHARS = 1024 * 1024
+
+# MCP Image 支持的格式
+MCP_IMAGE_FORMATS = ("png", "jpeg", "gif", "webp")
+
+# 提前返回文字反馈时，等待图片上传完成的默认宽限期（秒）
+IMAGE_GRACE_PERIOD = float(os.getenv("IMAGE_GRACE_PERIOD", "5"))
+
+# 嵌入模式：在本进程内运行 Web 服务器并共享 WebSocketManager，不再经过 HTTP
+EMBEDDED_WEB_SERVER = os.getenv(
+    "EMBEDDED_WEB_SERVER", "false").lower() in ("1", "true", "yes")
+
+# Web 服务器未运行时自动启动（仅当 Web 服务器在本机），多个 MCP 进程通过 TEMP_DIR 下的锁文件复用同一个服务器
+WEB_AUTOSTART = os.getenv("WEB_AUTOSTART", "true").lower() in ("1", "true", "yes")
+WEB_AUTOSTART_TIMEOUT = float(os.getenv("WEB_AUTOSTART_TIMEOUT", "15"))
+TEMP_DIR = os.getenv("TEMP_DIR", "/tmp/feedback_collector")
+
+# HTTP 连接池配置
+HTTP_KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_POOL_SIZE = 8
+
+# 模块级共享会话，跨工具调用复用 keep-alive 连接
+_http_session: Optional["aiohttp.ClientSession"] = None
+
+
+async def get_http_session() -> "aiohttp.ClientSession":
+    """获取共享的 HTTP 会话（首次调用或已关闭时创建）"""
+    global _http_session
+    import aiohttp
+
+    if _http_session is None or _http_session.closed:
+        if WEB_UDS_PATH:
+            connector = aiohttp.UnixConnector(
+                path=WEB_UDS_PATH,
+                limit=HTTP_POOL_SIZE,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+            )
+        _http_session = aiohttp.ClientSession(connector=connector)
+        logger.info(
+            f"已创建共享 HTTP 会话，传输方式: {'unix:' + WEB_UDS_PATH if WEB_UDS_PATH else 'tcp'}")
+
+    return _http_session
+
+
+class FeedbackError(Exception):
+    """反馈收集失败，消息将直接返回给调用方"""
+
+
+class EmbeddedWebServer:
+    """在独立线程的事件循环中运行 Web 服务器，与 MCP 服务器共享 WebSocketManager"""
+
+    def __init__(self):
+        self.manager = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self, ready_timeout: float = 10.0):
+        """启动 Web 服务器线程，并等待其事件循环就绪"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        # 延迟导入，仅嵌入模式需要加载 Web 服务器依赖
+        from src.core.websocket_manager import WebSocketManager
+
+        self.manager = WebSocketManager()
+        self._thread = threading.Thread(
+            target=self._run, name="embedded-web-server", daemon=True)
+        self._thread.start()
+
+        if not self._ready.wait(ready_timeout):
+            raise RuntimeError("嵌入式 Web 服务器启动超时")
+        logger.info("嵌入式 Web 服务器已启动")
+
+    def _run(self):
+        """线程入口：创建独立事件循环并运行 uvicorn"""
+        from src.web_server import start_web_server
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_until_complete(start_web_server(self.manager))
+        except Exception as e:
+            logger.error(f"嵌入式 Web 服务器异常退出: {e}")
+        finally:
+            self.loop.close()
+
+    async def run(self, coro) -> Any:
+        """在 Web 服务器事件循环中执行协程，并在当前事件循环中等待结果"""
+        if self.loop is None or self.loop.is_closed():
+            coro.close()
+            raise FeedbackError("嵌入式 Web 服务器未运行")
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+# 嵌入式 Web 服务器实例（仅嵌入模式使用）
+embedded_server = EmbeddedWebServer()
+
+# 图片解码线程池（首次使用时创建）
+_decode_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_decode_executor() -> ThreadPoolExecutor:
+    """获取图片解码线程池，线程数即并发上限"""
+    global _decode_executor
+
+    if _decode_executor is None:
+        _decode_executor = ThreadPoolExecutor(
+            max_workers=IMAGE_DECODE_WORKERS, thread_name_prefix="image-decode")
+    return _decode_executor
+
+
+# 自动模式下的同机判断结果（首次成功访问 /health 后确定）
+_handoff_is_local: Optional[bool] = None
+
+
+def _verify_handoff_probe(probe: Optional[Dict]) -> bool:
+    """能否在同一路径读到服务器写入的令牌，即两个进程是否看到同一个共享内存目录"""
+    if not probe:
+        return False
+    try:
+        with open(probe["path"], "r") as f:
+            return f.read().strip() == probe["token"]
+    except (OSError, KeyError, TypeError):
+        return False
+
+
+async def _use_shared_memory_handoff() -> bool:
+    """
+    是否请求 Web 服务器通过共享内存交接图片
+
+    自动模式不按主机名猜测（SSH 转发或容器映射的端口也是 localhost），
+    而是读取 /health 中的同机证明文件，确认两个进程共享文件系统
+    """
+    global _handoff_is_local
+    import aiohttp
+
+    if IMAGE_HANDOFF == "shm":
+        return True
+    if IMAGE_HANDOFF != "auto":
+        return False
+    if _handoff_is_local is None:
+        session = await get_http_session()
+        try:
+            async with session.get(f"{WEB_BASE_URL}/health",
+                                   timeout=aiohttp.ClientTimeout(total=2)) as response:
+                if response.status != 200:
+                    return False
+                health = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            # 服务器暂不可达时不缓存结论，下次请求重新判断
+            return False
+        _handoff_is_local = _verify_handoff_probe(health.get("image_handoff"))
+        logger.info(f"图片交接方式: {'共享内存' if _handoff_is_local else '内联'}")
+    return _handoff_is_local
+
+
+class HandoffMapper:
+    """映射共享内存文件，按描述符返回零拷贝的 memoryview"""
+
+    def __init__(self):
+        self._maps: Dict[str, mmap.mmap] = {}
+        # 同一次提交的图片共用一个文件，多个解码线程可能同时建立映射
+        self._lock = threading.Lock()
+
+    def view(self, descriptor: Dict) -> memoryview:
+        """
+        获取描述符对应的图片数据
+
+        Args:
+            descriptor: {"path", "offset", "length"}
+
+        Returns:
+            指向映射内存的 memoryview
+        """
+        path = descriptor["path"]
+        with self._lock:
+            mapped = self._maps.get(path)
+            if mapped is None:
+                with open(path, "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # 文件由 Web 服务器在结果删除（取消或过期）时清理：同一结果可能被多次读取
+                # （例如以不同预算再次调用 get_feedback_images），这里不能删除；已建立的映射在文件删除后仍然有效
+                self._maps[path] = mapped
+
+        offset = descriptor["offset"]
+        return memoryview(mapped)[offset:offset + descriptor["length"]]
+
+
+async def _probe_web_server() -> bool:
+    """快速探测 Web 服务器是否就绪（/health）"""
+    import aiohttp
+
+    session = await get_http_session()
+    try:
+        async with session.get(f"{WEB_BASE_URL}/health",
+                               timeout=aiohttp.ClientTimeout(total=1)) as response:
+            return response.status == 200
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+
+
+async def _autostart_web_server() -> bool:
+    """
+    启动同机 Web 服务器并等待就绪
+
+    Returns:
+        是否已启动（或已由其他进程启动）；未启用自动启动或服务器不在本机时返回 False
+    """
+    if not WEB_AUTOSTART or not (WEB_UDS_PATH or WEB_HOST in LOCAL_HOSTS):
+        return False
+
+    from src.core.web_autostart import AutostartError, WebServerLauncher
+
+    logger.info("Web 服务器未运行，正在自动启动...")
+    launcher = WebServerLauncher(project_root, TEMP_DIR, int(WEB_PORT), {"WEB_HOST": WEB_HOST})
+    try:
+        await launcher.ensure_running(_probe_web_server, WEB_AUTOSTART_TIMEOUT)
+    except AutostartError as e:
+        raise FeedbackError(str(e))
+    return True
+
+
+async def _post_feedback_request(request_data: Dict):
+    """向 Web 服务器发送反馈请求"""
+    import aiohttp
+
+    # 复用模块级连接池，避免每次重新建立连接
+    session = await get_http_session()
+    async with session.post(
+        f"{WEB_BASE_URL}/api/request_feedback",
+        json=request_data,
+        headers={"X-Feedback-Caller": f"mcp-{os.getpid()}"},
+        timeout=aiohttp.ClientTimeout(total=10)
+    ) as response:
+        if response.status == 429:
+            raise FeedbackError(
+                f"反馈请求过于频繁，请在 {response.headers.get('Retry-After', '1')} 秒后重试")
+        if response.status != 200:
+            raise FeedbackError(f"发送反馈请求失败: HTTP {response.status}")
+
+        result = await response.json()
+        if result.get("status") != "success":
+            raise FeedbackError(
+                f"发送反馈请求失败: {result.get('error', '未知错误')}")
+
+
+async def _request_via_http(request_id: str, request_fields: Dict):
+    """
+    通过 HTTP API 请求反馈；Web 服务器未运行时自动启动后重试
+
+    Args:
+        request_id: 请求ID
+        request_fields: 附加的请求字段（priority / summary / questions）
+    """
+    import aiohttp
+
+    request_data = {
+        "id": request_id,
+        "timeout": FEEDBACK_TIMEOUT,
+        **request_fields
+    }
+
+    async def post():
+        if await _use_shared_memory_handoff():
+            request_data["image_handoff"] = "shm"
+        await _post_feedback_request(request_data)
+
+    try:
+        try:
+            await post()
+        except aiohttp.ClientConnectorError:
+            if not await _autostart_web_server():
+                raise
+            await post()
+
+    except asyncio.TimeoutError:
+        raise FeedbackError("连接 Web 服务器超时，请确保 Web 服务器正在运行")
+    except aiohttp.ClientError as e:
+        raise FeedbackError(
+            f"连接 Web 服务器失败: {str(e)}。请确保 Web 服务器正在运行在 {WEB_BASE_URL}")
+
+
+async def _poll_via_http(request_id: str, timeout: float, final: bool) -> Optional[Dict]:
+    """
+    轮询反馈结果
+
+    Args:
+        request_id: 请求ID
+        timeout: 最长等待时间（秒）
+        final: 为 False 时只提交了文字（partial）也返回
+
+    Returns:
+        Web 服务器返回的反馈结果；超时返回 None
+    """
+    import aiohttp
+
+    session = await get_http_session()
+    start_time = datetime.now()
+    poll_interval = 2  # 每2秒检查一次
+
+    while True:
+        # 检查是否超时
+        remaining = timeout - (datetime.now() - start_time).total_seconds()
+        if remaining <= 0:
+            return None
+
+        # 等待一段时间再检查
+        await asyncio.sleep(min(poll_interval, remaining))
+
+        # 检查反馈状态
+        try:
+            async with session.get(
+                f"{WEB_BASE_URL}/api/feedback/{request_id}",
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status == 200:
+                    result = await response.json()
+
+                    # 状态为 waiting（或需要最终结果时为 partial），继续等待
+                    status = result.get("status")
+                    if status != "waiting" and not (final and status == "partial"):
+                        return result
+
+        except asyncio.TimeoutError:
+            logger.warning("检查反馈状态超时，继续等待...")
+            continue
+        except aiohttp.ClientError as e:
+            logger.warning(f"检查反馈状态失败: {e}，继续等待...")
+            continue
+
+
+async def _wait_embedded(request_id: str, timeout: float, final: bool) -> Optional[Dict]:
+    """
+    嵌入模式：等待共享 WebSocketManager 中的反馈结果
+
+    Args:
+        request_id: 请求ID
+        timeout: 最长等待时间（秒）
+        final: 为 False 时只提交了文字（partial）也返回
+
+    Returns:
+        反馈存储中的结果条目；超时返回 None
+    """
+    manager = embedded_server.manager
+    future: Future = manager.wait_for_feedback(request_id, final)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        manager.discard_feedback_waiter(request_id, future)
+
+
+async def _wait_for_result(request_id: str, timeout: float, final: bool) -> Optional[Dict]:
+    """按运行模式等待反馈结果"""
+    if EMBEDDED_WEB_SERVER:
+        return await _wait_embedded(request_id, timeout, final)
+    return await _poll_via_http(request_id, timeout, final)
+
+
+async def _stored_language(request_id: str) -> str:
+    """已存储结果（例如只提交了文字的 partial）中用户的界面语言；没有结果或无法获取时为 CN"""
+    import aiohttp
+
+    result = None
+    if EMBEDDED_WEB_SERVER:
+        manager = embedded_server.manager
+        future: Future = manager.wait_for_feedback(request_id, final=False)
+        manager.discard_feedback_waiter(request_id, future)
+        if future.done():
+            result = future.result()
+    else:
+        session = await get_http_session()
+        try:
+            async with session.get(f"{WEB_BASE_URL}/api/feedback/{request_id}",
+                                   timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status == 200:
+                    result = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            pass
+    return ((result or {}).get("data") or {}).get("language", "CN")
+
+
+async def _collect(request_id: str, return_text_early: bool, image_grace_period: float,
+                   request_fields: Optional[Dict] = None) -> Dict:
+    """
+    发送反馈请求并等待结果
+
+    Args:
+        request_id: 请求ID
+        return_text_early: 文字提交后是否不等待全部图片上传完成
+        image_grace_period: 提前返回时，文字提交后继续等待图片的时间（秒）
+        request_fields: 附加的请求字段（priority / summary / questions）
+
+    Returns:
+        反馈结果（completed / partial / cancelled / error）
+    """
+    request_fields = request_fields or {}
+    try:
+        if EMBEDDED_WEB_SERVER:
+            manager = embedded_server.manager
+            # 先注册等待者，避免广播后用户立即提交时错过结果
+            future: Future = manager.wait_for_feedback(request_id, not return_text_early)
+            try:
+                await embedded_server.run(
+                    manager.request_feedback(request_id, FEEDBACK_TIMEOUT,
+                                             caller=f"mcp-{os.getpid()}", **request_fields))
+                logger.info("反馈请求已发送，等待用户在 Web 界面提交反馈...")
+                result = await asyncio.wait_for(asyncio.wrap_future(future), FEEDBACK_TIMEOUT)
+            except asyncio.TimeoutError:
+                result = None
+            finally:
+                manager.discard_feedback_waiter(request_id, future)
+        else:
+            await _request_via_http(request_id, request_fields)
+            logger.info("反馈请求已发送，等待用户在 Web 界面提交反馈...")
+            result = await _poll_via_http(request_id, FEEDBACK_TIMEOUT, not return_text_early)
+
+        if result is None:
+            # 放弃等待：关闭浏览器中的表单，之后的提交不再存储
+            _cancel_in_background(request_id, "timeout")
+            raise FeedbackError("反馈收集超时，请重试")
+
+        if result.get("status") == "partial":
+            # 文字已提交，在宽限期内等待图片，超时则先返回文字
+            completed = await _wait_for_result(request_id, image_grace_period, final=True)
+            if completed is not None:
+                return completed
+            logger.info(f"图片仍在上传，先返回文字反馈，请求ID: {request_id}")
+
+        return result
+
+    except asyncio.CancelledError:
+        # MCP 客户端取消了工具调用；取消所在的任务会被反复取消，通知在独立任务中完成
+        logger.info(f"工具调用已被取消，请求ID: {request_id}")
+        _cancel_in_background(request_id, "cancelled")
+        raise
+
+
+async def _cancel_request(request_id: str, reason: str):
+    """通知 Web 服务器取消请求：关闭浏览器中的表单并释放请求占用的资源（尽力而为）"""
+    try:
+        if EMBEDDED_WEB_SERVER:
+            await embedded_server.run(
+                embedded_server.manager.cancel_request(request_id, reason))
+            return
+
+        import aiohttp
+
+        session = await get_http_session()
+        async with session.post(
+            f"{WEB_BASE_URL}/api/feedback/{request_id}/cancel",
+            json={"reason": reason},
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as response:
+            if response.status != 200:
+                logger.warning(f"取消反馈请求失败: HTTP {response.status}")
+    except Exception as e:
+        logger.warning(f"取消反馈请求失败: {e}")
+
+
+# 进行中的后台任务（保留引用，避免任务在完成前被回收）
+_background_tasks = set()
+
+
+def _cancel_in_background(request_id: str, reason: str):
+    """在独立任务中取消请求，不受调用方任务取消的影响"""
+    task = asyncio.create_task(_cancel_request(request_id, reason))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+class BlobCache:
+    """按内容哈希缓存已解码的图片字节，超出容量时淘汰最久未使用的条目"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._total_bytes = 0
+        # 由多个解码线程并发访问
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: Any):
+        with self._lock:
+            if key in self._items or len(data) > self.max_bytes:
+                return
+            self._items[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+
+blob_cache = BlobCache(BLOB_CACHE_MAX_BYTES)
+
+
+def _b64decode_chunked(data: str) -> bytes:
+    """分块解码 base64，大图解码期间其他线程（包括事件循环）仍可获得 GIL"""
+    import base64
+
+    if len(data) <= BASE64_CHUNK_CHARS:
+        return base64.b64decode(data)
+    return b"".join(
+        base64.b64decode(data[start:start + BASE64_CHUNK_CHARS])
+        for start in range(0, len(data), BASE64_CHUNK_CHARS))
+
+
+def _image_candidates(img: Dict, handoff_mapper: HandoffMapper) -> List[Dict]:
+    """列出图片的所有可用版本（原图与服务器派生版本），数据按需加载"""
+    def loader(entry: Dict):
+        cache = {}
+        # 服务器为原图提供内容哈希，派生版本由原图确定，可共用哈希作为缓存键
+        cache_key = f"{img['hash']}:{entry.get('variant', 'original')}" if img.get("hash") else None
+
+        def load():
+            if "data" not in cache and cache_key:
+                cached = blob_cache.get(cache_key)
+                if cached is not None:
+                    cache["data"] = cached
+            if "data" not in cache:
+                if entry.get("handoff"):
+                    # 同机共享内存交接：直接映射，不复制
+                    cache["data"] = handoff_mapper.view(entry["handoff"])
+                else:
+                    img_data = entry.get("data", "")
+                    # 如果数据包含 data URL 前缀，去除它
+                    if img_data.startswith('data:'):
+                        # 格式: data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAA...
+                        img_data = img_data.split(',', 1)[1]
+                    # 解码 base64 数据
+                    cache["data"] = _b64decode_chunked(img_data)
+                # 共享内存视图不进入缓存：缓存会让映射（以及已删除文件的 tmpfs 页）一直驻留
+                if cache_key and not entry.get("handoff"):
+                    blob_cache.put(cache_key, cache["data"])
+            return cache["data"]
+        return load
+
+    candidates = []
+    for entry in [img] + list(img.get("variants") or []):
+        if not entry.get("data") and not entry.get("handoff"):
+            continue
+        size = entry["handoff"]["length"] if entry.get("handoff") else entry.get("size", 0)
+        candidates.append(make_candidate(
+            entry.get("variant", "original"), loader(entry), size,
+            entry.get("type", "image/png"), entry.get("width"), entry.get("height")))
+    return candidates
+
+
+def _describe_choice(choice: Dict, user_language: str) -> str:
+    """描述实际发送的图片版本"""
+    fmt = choice["format"] or "png"
+    dims = f"{choice['width']}x{choice['height']}" if choice.get("width") else ""
+    if user_language == "EN":
+        note = " (derived to fit the requested limits)" if choice["label"] == "derived" else ""
+        return f", sent as {choice['label']} {fmt} {dims}, {choice['size']} bytes{note}"
+    note = "（为满足限制而重新生成）" if choice["label"] == "derived" else ""
+    return f"，发送版本: {choice['label']} {fmt} {dims}，{choice['size']} bytes{note}"
+
+
+def _image_error_text(img_name: str, error: str, user_language: str) -> str:
+    """图片处理失败提示"""
+    if user_language == "CN":
+        return f"图片处理失败: {img_name} - {error}"
+    return f"Image processing failed: {img_name} - {error}"
+
+
+def _to_mcp_image(img_bytes: Any) -> Tuple[Image, str]:
+    """
+    按文件头识别格式并构建 MCP Image 对象
+
+    Args:
+        img_bytes: 图片字节（bytes 或共享内存的 memoryview）
+
+    Returns:
+        (Image 对象, 格式)；BMP 转换为 PNG
+
+    Raises:
+        ValueError: 无法识别的图片格式
+    """
+    img_format = sniff_image_format(bytes(img_bytes[:SNIFF_BYTES]))
+    if img_format is None:
+        raise ValueError("无法识别的图片格式")
+
+    if img_format not in MCP_IMAGE_FORMATS:
+        # MCP 客户端不支持的格式（如 BMP）转换为 PNG
+        import io
+        from PIL import Image as PILImage
+
+        buffer = io.BytesIO()
+        with PILImage.open(io.BytesIO(img_bytes)) as image:
+            image.save(buffer, format="PNG")
+        img_bytes, img_format = buffer.getvalue(), "png"
+
+    return Image(data=img_bytes, format=img_format), img_format
+
+
+def _prepare_image(index: int, img: Dict, candidates: List[Dict], default: Optional[Dict],
+                   allowance: Optional[int], user_language: str,
+                   image_options: Dict) -> List[Union[str, Image]]:
+    """
+    处理单张图片：选择版本、解码并构建 Image 对象（在解码线程池中执行）
+
+    Args:
+        index: 图片序号
+        img: 图片条目
+        candidates: 可用版本
+        default: 未指定约束时使用的版本
+        allowance: 该图片的字节上限
+        user_language: 用户语言
+        image_options: 可选的 budget_bytes / max_dimension / format
+
+    Returns:
+        该图片对应的描述文本与 Image 对象
+    """
+    started = time.perf_counter()
+
+    # 获取图片信息
+    img_name = img.get('name', f'image_{index+1}')
+    img_size = img.get('size', 0)
+
+    # 添加图片描述文本
+    if user_language == "EN":
+        img_description = f"Image {index+1}: {img_name} ({img_size} bytes)"
+    else:
+        img_description = f"图片{index+1}: {img_name} ({img_size} bytes)"
+
+    # 服务器判定为无效的图片
+    if img.get("error"):
+        return [img_description, _image_error_text(img_name, img["error"], user_language)]
+
+    if not candidates:
+        return [img_description]
+
+    max_dimension = image_options.get("max_dimension")
+    preferred_format = image_options.get("format")
+    constrained = image_options.get("budget_bytes") is not None or max_dimension or preferred_format
+
+    try:
+        if constrained:
+            choice = select_variant(candidates, allowance, max_dimension, preferred_format)
+            if choice is None:
+                omitted = " (omitted: does not fit the image byte budget)" if user_language == "EN" else "（已省略：超出图片字节预算）"
+                return [img_description + omitted]
+        else:
+            # 优先使用服务器生成的规范化版本
+            choice = default
+        selected = time.perf_counter()
+
+        img_bytes = choice["load"]()
+        decoded = time.perf_counter()
+
+        # 按文件头确定格式，不信任客户端声明的类型
+        image_obj, img_format = _to_mcp_image(img_bytes)
+        finished = time.perf_counter()
+
+        if constrained:
+            img_description += _describe_choice({**choice, "format": img_format}, user_language)
+        logger.info(
+            f"图片 {img_name} 处理完成，格式: {img_format}，大小: {len(img_bytes)} bytes，"
+            f"选择 {(selected - started) * 1000:.1f}ms，解码 {(decoded - selected) * 1000:.1f}ms，"
+            f"构建 {(finished - decoded) * 1000:.1f}ms")
+        return [img_description, image_obj]
+
+    except Exception as e:
+        logger.error(f"处理图片 {img_name} 时出错: {str(e)}")
+        return [img_description, _image_error_text(img_name, str(e), user_language)]
+
+
+async def _build_image_content(images: List[Dict], user_language: str,
+                               image_options: Dict) -> List[Union[str, Image]]:
+    """
+    构建图片部分的返回内容，按需在字节预算、最大边长与格式约束下选择或派生版本
+
+    各图片在解码线程池中并行处理，不阻塞 MCP 传输所在的事件循环
+
+    Args:
+        images: 反馈中的图片列表
+        user_language: 用户语言
+        image_options: 可选的 budget_bytes / max_dimension / format
+    """
+    handoff_mapper = HandoffMapper()
+    budget = image_options.get("budget_bytes")
+
+    candidates_list = [
+        [] if img.get("error") else _image_candidates(img, handoff_mapper) for img in images]
+    defaults = [
+        next((c for c in candidates if c["label"] == "normalized"), candidates[0]) if candidates else None
+        for candidates in candidates_list]
+
+    # 按各图片默认版本的大小分配总预算
+    allowances: List[Optional[int]] = [None] * len(images)
+    if budget is not None:
+        planned = allocate_budget(
+            [d["size"] if d else 0 for d in defaults], budget)
+        allowances = [a if d else None for a, d in zip(planned, defaults)]
+
+    loop = asyncio.get_running_loop()
+    executor = get_decode_executor()
+    started = time.perf_counter()
+
+    parts = await asyncio.gather(*[
+        loop.run_in_executor(
+            executor, _prepare_image, i, img, candidates_list[i], defaults[i],
+            allowances[i], user_language, image_options)
+        for i, img in enumerate(images)
+    ])
+
+    logger.info(
+        f"已处理 {len(images)} 张图片，耗时 {(time.perf_counter() - started) * 1000:.1f}ms"
+        f"（并发上限 {IMAGE_DECODE_WORKERS}）")
+
+    # 保持图片原有顺序
+    return [item for part in parts for item in part]
+
+
+async def _build_feedback_content(result: Dict, request_id: str,
+                                  image_options: Optional[Dict] = None) -> List[Union[str, Image]]:
+    """
+    将反馈结果转换为工具返回内容
+
+    Args:
+        result: 反馈结果（completed / partial / cancelled / error）
+        request_id: 请求ID
+        image_options: 图片预算与分辨率选项
+
+    Returns:
+        包含文本和图片的内容列表
+    """
+    if result.get("status") == "cancelled":
+        # 反馈被用户取消
+        cancel_data = result.get("data", {})
+        cancel_reason = cancel_data.get("reason", "用户取消")
+        logger.info(f"反馈被取消，请求ID: {request_id}, 原因: {cancel_reason}")
+        return [f"反馈收集已取消: {cancel_reason}"]
+
+    if result.get("status") == "error":
+        error_msg = result.get("message", "反馈处理出错")
+        logger.error(f"反馈处理错误: {error_msg}")
+        return [f"反馈收集失败: {error_msg}"]
+
+    # 反馈已完成（partial 表示文字已提交、图片仍在上传）
+    feedback_data = result.get("data", {})
+
+    # 从反馈数据中获取用户选择的语言
+    user_language = feedback_data.get("language", "CN")
+
+    # 构建返回内容列表
+    content_list = []
+
+    # 批量问题的答案
+    if feedback_data.get("questions"):
+        content_list.append(format_answers(
+            feedback_data["questions"], feedback_data.get("answers"), user_language))
+
+    # 处理文字反馈
+    if feedback_data.get("text"):
+        text_prefix = get_text("user_text_feedback", user_language)
+        text_content = f"{text_prefix}{feedback_data['text']}"
+        content_list.append(text_content)
+
+    # 处理图片反馈
+    if feedback_data.get("images"):
+        images_prefix = get_text("user_uploaded_images", user_language)
+        content_list.append(images_prefix)
+        content_list.extend(await _build_image_content(
+            feedback_data["images"], user_language, image_options or {}))
+
+    # 仍在上传的图片，提示调用方稍后获取
+    if result.get("status") == "partial":
+        content_list.append(get_text("images_still_uploading", user_language).format(
+            count=feedback_data.get("images_pending", 0), request_id=request_id))
+
+    # 如果没有任何反馈内容，添加空反馈提示
+    if not content_list:
+        empty_feedback_text = get_text("user_empty_feedback", user_language)
+        content_list.append(empty_feedback_text)
+
+    # 根据用户设置决定是否添加自动附加prompt
+    auto_append = feedback_data.get("auto_append", True)
+    if auto_append:
+        # 根据语言添加重要提示
+        auto_append_text = f"{get_text('auto_append_prompt', user_language)}"
+        content_list.append(auto_append_text)
+
+    logger.info(
+        f"反馈收集完成，请求ID: {request_id}, 自动附加prompt: {auto_append}, 内容项数: {len(content_list)}")
+    return content_list
+
 
 @mcp.tool()
-async def collect_feedback() -> List[Union[str, Image]]:
+async def collect_feedback(
+    image_budget_bytes: Optional[int] = None,
+    max_image_dimension: Optional[int] = None,
+    image_format: Optional[str] = None,
+    return_text_early: bool = False,
+    image_grace_period: Optional[float] = None,
+    priority: int = 0,
+    summary: Optional[str] = None
+) -> List[Union[str, Image]]:
     """
     收集用户反馈的交互式工具。
     显示反馈收集界面，用户可以提供文字和/或图片反馈。
+    多个请求同时等待时，界面按优先级与截止时间排成队列依次回答。
+
+    Args:
+        image_budget_bytes: 可选，所有返回图片的总字节上限，超出时自动缩小图片
+        max_image_dimension: 可选，返回图片的最大边长（像素）
+        image_format: 可选，返回图片的首选格式（webp / jpeg / png）
+        return_text_early: 可选，为 true 时用户提交文字后不必等待全部图片上传完成
+        image_grace_period: 可选，提前返回前等待图片的秒数，超时后先返回文字，
+            图片可随后通过 get_feedback_images 获取
+        priority: 可选，在请求队列中的优先级，数值越大越先显示
+        summary: 可选，在请求队列中显示的简短说明（例如需要用户确认的事项）
 
     Returns:
         包含用户反馈内容的列表，包括文本内容和图片内容
@@ -53,183 +897,140 @@ async def collect_feedback() -> List[Union[str, Image]]:
 
         logger.info(f"开始收集反馈，请求ID: {request_id}")
 
-        # 通过 HTTP API 发送反馈请求
-        async with aiohttp.ClientSession() as session:
-            # 1. 发送反馈请求
-            request_data = {
-                "id": request_id,
-                "timeout": FEEDBACK_TIMEOUT
-            }
+        grace = IMAGE_GRACE_PERIOD if image_grace_period is None else max(image_grace_period, 0)
+        result = await _collect(request_id, return_text_early, grace,
+                                {"priority": priority, "summary": summary})
 
-            try:
-                async with session.post(
-                    f"{WEB_BASE_URL}/api/request_feedback",
-                    json=request_data,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status != 200:
-                        error_msg = f"发送反馈请求失败: HTTP {response.status}"
-                        logger.error(error_msg)
-                        return [error_msg]
+        image_options = {
+            "budget_bytes": image_budget_bytes,
+            "max_dimension": max_image_dimension,
+            "format": image_format
+        }
+        return await _build_feedback_content(result, request_id, image_options)
 
-                    result = await response.json()
-                    if result.get("status") != "success":
-                        error_msg = f"发送反馈请求失败: {result.get('error', '未知错误')}"
-                        logger.error(error_msg)
-                        return [error_msg]
+    except FeedbackError as e:
+        logger.error(str(e))
+        return [str(e)]
+    except Exception as e:
+        error_msg = f"反馈收集出错: {str(e)}"
+        logger.error(error_msg)
+        return [error_msg]
 
-            except asyncio.TimeoutError:
-                return ["连接 Web 服务器超时，请确保 Web 服务器正在运行"]
-            except aiohttp.ClientError as e:
-                return [f"连接 Web 服务器失败: {str(e)}。请确保 Web 服务器正在运行在 {WEB_BASE_URL}"]
 
-            logger.info("反馈请求已发送，等待用户在 Web 界面提交反馈...")
+@mcp.tool()
+async def collect_feedback_batch(
+    questions: List[Dict[str, Any]],
+    summary: Optional[str] = None,
+    priority: int = 0,
+    image_budget_bytes: Optional[int] = None,
+    max_image_dimension: Optional[int] = None,
+    image_format: Optional[str] = None
+) -> List[Union[str, Image]]:
+    """
+    一次向用户提出多个问题的反馈工具。
+    所有问题在同一表单中显示，用户一次提交即返回全部答案，以及可选的文字与图片反馈。
 
-            # 2. 轮询等待反馈结果
-            start_time = datetime.now()
-            poll_interval = 2  # 每2秒检查一次
-
-            while True:
-                # 检查是否超时
-                elapsed = (datetime.now() - start_time).total_seconds()
-                if elapsed >= FEEDBACK_TIMEOUT:
-                    return ["反馈收集超时，请重试"]
-
-                # 等待一段时间再检查
-                await asyncio.sleep(poll_interval)
-
-                # 检查反馈状态
-                try:
-                    async with session.get(
-                        f"{WEB_BASE_URL}/api/feedback/{request_id}",
-                        timeout=aiohttp.ClientTimeout(total=5)
-                    ) as response:
-                        if response.status == 200:
-                            result = await response.json()
-
-                            if result.get("status") == "completed":
-                                # 反馈已完成
-                                feedback_data = result.get("data", {})
-
-                                # 从反馈数据中获取用户选择的语言
-                                user_language = feedback_data.get(
-                                    "language", "CN")
-
-                                # 构建返回内容列表
-                                content_list = []
-
-                                # 处理文字反馈
-                                if feedback_data.get("text"):
-                                    text_prefix = get_text(
-                                        "user_text_feedback", user_language)
-                                    text_content = f"{text_prefix}{feedback_data['text']}"
-                                    content_list.append(text_content)
-
-                                # 处理图片反馈
-                                if feedback_data.get("images"):
-                                    images_prefix = get_text(
-                                        "user_uploaded_images", user_language)
-                                    content_list.append(images_prefix)
-
-                                    for i, img in enumerate(feedback_data["images"]):
-                                        # 获取图片信息
-                                        img_name = img.get(
-                                            'name', f'image_{i+1}')
-                                        img_size = img.get('size', 0)
-                                        img_data = img.get('data', '')
-                                        img_type = img.get('type', 'image/png')
-
-                                        # 添加图片描述文本
-                                        if user_language == "EN":
-                                            img_description = f"Image {i+1}: {img_name} ({img_size} bytes)"
-                                        else:
-                                            img_description = f"图片{i+1}: {img_name} ({img_size} bytes)"
-                                        content_list.append(img_description)
-
-                                        # 处理图片数据
-                                        if img_data:
-                                            try:
-                                                # 如果数据包含 data URL 前缀，去除它
-                                                if img_data.startswith('data:'):
-                                                    # 格式: data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAA...
-                                                    img_data = img_data.split(',', 1)[
-                                                        1]
-
-                                                # 解码 base64 数据
-                                                img_bytes = base64.b64decode(
-                                                    img_data)
-
-                                                # 确定图片格式
-                                                img_format = "png"  # 默认格式
-                                                if img_type:
-                                                    if "jpeg" in img_type or "jpg" in img_type:
-                                                        img_format = "jpeg"
-                                                    elif "gif" in img_type:
-                                                        img_format = "gif"
-                                                    elif "webp" in img_type:
-                                                        img_format = "webp"
-
-                                                # 创建 Image 对象
-                                                image_obj = Image(
-                                                    data=img_bytes, format=img_format)
-                                                content_list.append(image_obj)
-
-                                                logger.debug(
-                                                    f"成功处理图片 {img_name}，格式: {img_format}，大小: {len(img_bytes)} bytes")
-
-                                            except Exception as e:
-                                                logger.error(
-                                                    f"处理图片 {img_name} 时出错: {str(e)}")
-                                                error_text = f"图片处理失败: {img_name} - {str(e)}" if user_language == "CN" else f"Image processing failed: {img_name} - {str(e)}"
-                                                content_list.append(error_text)
-
-                                # 如果没有任何反馈内容，添加空反馈提示
-                                if not content_list:
-                                    empty_feedback_text = get_text(
-                                        "user_empty_feedback", user_language)
-                                    content_list.append(empty_feedback_text)
-
-                                # 根据用户设置决定是否添加自动附加prompt
-                                auto_append = feedback_data.get(
-                                    "auto_append", True)
-                                if auto_append:
-                                    # 根据语言添加重要提示
-                                    auto_append_text = f"{get_text('auto_append_prompt', user_language)}"
-                                    content_list.append(auto_append_text)
-
-                                logger.info(
-                                    f"反馈收集完成，请求ID: {request_id}, 自动附加prompt: {auto_append}, 内容项数: {len(content_list)}")
-                                return content_list
-
-                            elif result.get("status") == "cancelled":
-                                # 反馈被用户取消
-                                cancel_data = result.get("data", {})
-                                cancel_reason = cancel_data.get(
-                                    "reason", "用户取消")
-                                logger.info(
-                                    f"反馈被取消，请求ID: {request_id}, 原因: {cancel_reason}")
-                                return [f"反馈收集已取消: {cancel_reason}"]
-
-                            elif result.get("status") == "error":
-                                error_msg = result.get("message", "反馈处理出错")
-                                logger.error(f"反馈处理错误: {error_msg}")
-                                return [f"反馈收集失败: {error_msg}"]
-
-                            # 状态为 waiting，继续等待
-
-                except asyncio.TimeoutError:
-                    logger.warning("检查反馈状态超时，继续等待...")
-                    continue
-                except aiohttp.ClientError as e:
-                    logger.warning(f"检查反馈状态失败: {e}，继续等待...")
-                    continue
+    Args:
+        questions: 问题列表，每项包含：
+            prompt: 问题内容（必填）
+            id: 可选，问题标识，答案中按此标识对应，默认 q1、q2...
+            type: 可选，text（文本，默认）/ choice（单选）/ multi_choice（多选）/ confirm（是/否）
+            options: choice / multi_choice 的选项列表
+            required: 可选，是否必答，默认 true
+        summary: 可选，在请求队列中显示的简短说明
+        priority: 可选，在请求队列中的优先级，数值越大越先显示
+        image_budget_bytes: 可选，所有返回图片的总字节上限，超出时自动缩小图片
+        max_image_dimension: 可选，返回图片的最大边长（像素）
+        image_format: 可选，返回图片的首选格式（webp / jpeg / png）
 
+    Returns:
+        各问题的答案，以及用户的文字与图片反馈
+    """
+    try:
+        try:
+            normalized = normalize_questions(questions)
+        except QuestionError as e:
+            raise FeedbackError(f"问题定义不正确: {e}")
+
+        request_id = str(uuid.uuid4())
+        logger.info(f"开始批量收集反馈，请求ID: {request_id}, 问题数: {len(normalized)}")
+
+        result = await _collect(request_id, False, 0, {
+            "priority": priority,
+            "summary": summary,
+            "questions": normalized
+        })
+
+        image_options = {
+            "budget_bytes": image_budget_bytes,
+            "max_dimension": max_image_dimension,
+            "format": image_format
+        }
+        return await _build_feedback_content(result, request_id, image_options)
+
+    except FeedbackError as e:
+        logger.error(str(e))
+        return [str(e)]
     except Exception as e:
         error_msg = f"反馈收集出错: {str(e)}"
         logger.error(error_msg)
         return [error_msg]
 
 
+@mcp.tool()
+async def get_feedback_images(
+    request_id: str,
+    wait_seconds: float = 60,
+    image_budget_bytes: Optional[int] = None,
+    max_image_dimension: Optional[int] = None,
+    image_format: Optional[str] = None
+) -> List[Union[str, Image]]:
+    """
+    获取提前返回的反馈中仍在上传的图片。
+
+    Args:
+        request_id: collect_feedback 返回内容中给出的请求ID
+        wait_seconds: 最长等待图片上传完成的秒数
+        image_budget_bytes: 可选，所有返回图片的总字节上限
+        max_image_dimension: 可选，返回图片的最大边长（像素）
+        image_format: 可选，返回图片的首选格式（webp / jpeg / png）
+
+    Returns:
+        图片内容列表
+    """
+    try:
+        result = await _wait_for_result(request_id, max(wait_seconds, 0), final=True)
+        if result is None:
+            return [get_text("images_not_ready", await _stored_language(request_id))]
+
+        if result.get("status") != "completed":
+            return await _build_feedback_content(result, request_id)
+
+        feedback_data = result.get("data", {})
+        user_language = feedback_data.get("language", "CN")
+        if not feedback_data.get("images"):
+            return [get_text("no_feedback_images", user_language)]
+
+        image_options = {
+            "budget_bytes": image_budget_bytes,
+            "max_dimension": max_image_dimension,
+            "format": image_format
+        }
+        content_list = [get_text("user_uploaded_images", user_language)]
+        content_list.extend(await _build_image_content(
+            feedback_data["images"], user_language, image_options))
+        return content_list
+
+    except Exception as e:
+        error_msg = f"获取反馈图片出错: {str(e)}"
+        logger.error(error_msg)
+        return [error_msg]
+
+
 if __name__ == "__main__":
+    # 嵌入模式下先在后台线程启动 Web 服务器
+    if EMBEDDED_WEB_SERVER:
+        embedded_server.start()
+
     # 运行 MCP 服务器
     mcp.run()
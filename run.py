@@ -6,15 +6,23 @@ MCP Web 反馈收集器 - Web服务器启动脚本
 
 import os
 import sys
-import asyncio
+import signal
 import socket
-import subprocess
 from pathlib import Path
 
 # 添加项目根目录到 Python 路径
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+from src.utils.port_owner import find_port_owners, wait_until
+
+# 等待本项目进程优雅退出、端口释放的最长时间（秒）
+GRACEFUL_EXIT_TIMEOUT = 5.0
+PORT_RELEASE_TIMEOUT = 2.0
+
+# Windows 没有 SIGKILL
+SIGKILL = getattr(signal, 'SIGKILL', signal.SIGTERM)
+
 
 def check_port_in_use(port):
     """检查端口是否被占用"""
@@ -29,27 +37,29 @@ def check_port_in_use(port):
 def get_process_info_on_port(port):
     """获取占用端口的进程信息"""
     try:
-        # 查找占用端口的进程详细信息
-        result = subprocess.run(['lsof', '-i', f':{port}'],
-                                capture_output=True, text=True)
-        if result.returncode == 0 and result.stdout.strip():
-            lines = result.stdout.strip().split('\n')[1:]  # 跳过标题行
-            processes = []
-            for line in lines:
-                if line.strip():
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        processes.append({
-                            'command': parts[0],
-                            'pid': parts[1],
-                            'user': parts[2] if len(parts) > 2 else 'unknown'
-                        })
-            return processes
+        return find_port_owners(port)
     except Exception as e:
         print(f"⚠️ 获取进程信息时发生错误: {e}")
     return []
 
 
+def is_project_process(proc):
+    """是否是本项目的 Web 服务器进程"""
+    return 'python' in proc['command'].lower() and (
+        'run.py' in proc['cmdline'] or 'web_server' in proc['cmdline'])
+
+
+def send_signal(pid, sig):
+    """向进程发送信号，进程已退出时视为成功"""
+    try:
+        os.kill(int(pid), sig)
+        return True
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+
+
 def kill_process_on_port(port, force=False):
     """杀死占用指定端口的进程"""
     processes = get_process_info_on_port(port)
@@ -63,26 +73,19 @@ def kill_process_on_port(port, force=False):
             f"   - {proc['command']} (PID: {proc['pid']}, 用户: {proc['user']})")
 
     # 检查是否是我们自己的进程
-    our_processes = [p for p in processes if 'python' in p['command'].lower() and (
-        'run.py' in p['command'] or 'web_server' in p['command'])]
+    our_processes = [p for p in processes if is_project_process(p)]
 
     if our_processes and not force:
         print("🔍 检测到可能是本项目的进程，尝试优雅关闭...")
         for proc in our_processes:
-            try:
-                # 先尝试 SIGTERM
-                subprocess.run(['kill', '-15', proc['pid']], check=True)
+            # 先尝试 SIGTERM
+            if send_signal(proc['pid'], signal.SIGTERM):
                 print(f"📤 向进程 {proc['pid']} 发送 SIGTERM 信号")
-            except subprocess.CalledProcessError:
+            else:
                 print(f"⚠️ 无法向进程 {proc['pid']} 发送 SIGTERM 信号")
 
-        # 等待进程退出
-        import time
-        time.sleep(2)
-
-        # 检查进程是否还在
-        remaining = get_process_info_on_port(port)
-        if remaining:
+        # 轮询等待进程释放端口，退出后立即继续
+        if not wait_until(lambda: not get_process_info_on_port(port), GRACEFUL_EXIT_TIMEOUT):
             print("⚠️ 进程仍在运行，使用强制终止...")
             return kill_process_on_port(port, force=True)
         else:
@@ -90,8 +93,7 @@ def kill_process_on_port(port, force=False):
             return True
 
     # 对于非本项目进程，询问用户意见
-    other_processes = [p for p in processes if not ('python' in p['command'].lower(
-    ) and ('run.py' in p['command'] or 'web_server' in p['command']))]
+    other_processes = [p for p in processes if not is_project_process(p)]
 
     if other_processes:
         print("⚠️ 发现非本项目的进程占用端口，为了安全起见，不会自动终止这些进程")
@@ -110,7 +112,7 @@ def kill_process_on_port(port, force=False):
                 print("⚠️ 正在强制终止非本项目进程...")
                 for proc in other_processes:
                     print(f"🔧 强制终止进程 {proc['pid']} ({proc['command']})")
-                    subprocess.run(['kill', '-9', proc['pid']])
+                    send_signal(proc['pid'], SIGKILL)
                 return True
             else:
                 print("👋 已取消启动，请处理端口冲突后重新运行")
@@ -123,13 +125,37 @@ def kill_process_on_port(port, force=False):
     try:
         for proc in processes:
             print(f"🔧 强制终止进程 {proc['pid']} ({proc['command']})")
-            subprocess.run(['kill', '-9', proc['pid']])
+            send_signal(proc['pid'], SIGKILL)
         return True
     except Exception as e:
         print(f"❌ 强制终止进程时发生错误: {e}")
         return False
 
 
+def take_over_listener():
+    """
+    请求运行中的本项目服务器交出监听套接字（平滑重启）
+    成功时旧进程停止接受新连接，排空后把未完成的请求与结果交给本进程
+
+    Returns:
+        监听套接字列表；无法接管时返回 None
+    """
+    from src.utils.config import Config
+    if not Config().WEB_HANDOFF:
+        return None
+
+    from src.core.listener_handoff import HandoffError
+    from src.web_server import listener_handoff
+    try:
+        sockets = listener_handoff.take_over()
+    except HandoffError as e:
+        print(f"ℹ️ 无法平滑接管: {e}")
+        return None
+
+    print("♻️ 已从运行中的服务器接管监听端口，旧进程排空后将交接未完成的请求并退出")
+    return sockets
+
+
 def find_available_port(start_port=9999, max_attempts=10):
     """查找可用端口"""
     for port in range(start_port, start_port + max_attempts):
@@ -153,27 +179,27 @@ def main():
             f"🌐 Web 地址: http://{os.environ['WEB_HOST']}:{os.environ['WEB_PORT']}")
         print("📝 注意：MCP服务器由Cursor自动管理，无需手动启动")
 
-        # 检查端口是否被占用
+        # 检查端口是否被占用；本项目服务器正在运行时优先平滑接管
+        sockets = None
         if check_port_in_use(port):
+            sockets = take_over_listener()
+
+        if sockets is None and check_port_in_use(port):
             print(f"⚠️ 端口 {port} 被占用，正在分析占用进程...")
 
             # 获取进程信息
             processes = get_process_info_on_port(port)
             if not processes:
                 print("🤔 无法获取占用进程信息，可能是权限问题")
-                print(f"💡 请手动运行: lsof -i :{port}")
+                print(f"💡 请手动运行: lsof -i :{port}  或  ss -ltnp 'sport = :{port}'")
                 print(f"💡 然后运行: kill -9 <PID>")
                 sys.exit(1)
 
             # 尝试清理端口
             if kill_process_on_port(port):
                 print("✅ 端口清理成功")
-                # 等待一下确保端口释放
-                import time
-                time.sleep(1)
-
-                # 再次检查端口
-                if check_port_in_use(port):
+                # 轮询等待端口释放
+                if not wait_until(lambda: not check_port_in_use(port), PORT_RELEASE_TIMEOUT):
                     print(f"❌ 端口 {port} 仍被占用，请手动处理")
                     sys.exit(1)
             else:
@@ -199,7 +225,7 @@ def main():
 
         # 导入并运行Web服务器
         from src.web_server import run_web_server
-        run_web_server()
+        run_web_server(sockets)
 
     except KeyboardInterrupt:
         print("\n👋 收到中断信号，正在关闭服务器...")
@@ -0,0 +1,112 @@
+"""
+内容寻址的图片存储
+按 SHA-256 去重保存已处理的图片条目，并通过引用计数管理生命周期
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from src.core.image_handoff import decode_data_url
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 图片条目中与具体提交相关、不属于内容的字段
+PER_SUBMISSION_KEYS = {"name", "uploadTime"}
+
+
+def hash_image_data(data: str) -> str:
+    """计算 base64 图片数据（可带 data URL 前缀）解码后内容的 SHA-256"""
+    return hashlib.sha256(decode_data_url(data)).hexdigest()
+
+
+def _entry_size(entry: Dict) -> int:
+    """估算条目占用的字节数（原图与派生版本的内联数据）"""
+    size = len(entry.get("data") or "")
+    for variant in entry.get("variants") or []:
+        size += len(variant.get("data") or "")
+    return size
+
+
+class BlobStore:
+    """按内容哈希保存图片条目，引用计数为 0 的条目按最近使用顺序淘汰"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._blobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._refcounts: Dict[str, int] = {}
+        self._total_bytes = 0
+
+    def known(self, hashes: Iterable[str]) -> List[str]:
+        """返回已存储的哈希"""
+        return [h for h in hashes if h in self._blobs]
+
+    def get(self, content_hash: str) -> Optional[Dict]:
+        """获取条目（不含提交相关字段），并更新最近使用顺序"""
+        entry = self._blobs.get(content_hash)
+        if entry is not None:
+            self._blobs.move_to_end(content_hash)
+        return entry
+
+    def put(self, content_hash: str, image: Dict) -> Dict:
+        """
+        保存条目并为调用方持有一个引用；已存在时返回已有条目，避免重复保存
+
+        先持有引用再检查容量，新条目不会在被引用前就被淘汰
+
+        Args:
+            content_hash: 原图内容的 SHA-256
+            image: 已处理的图片条目
+
+        Returns:
+            存储中的条目
+        """
+        existing = self.get(content_hash)
+        if existing is not None:
+            self.acquire(content_hash)
+            return existing
+
+        entry = {key: value for key, value in image.items() if key not in PER_SUBMISSION_KEYS}
+        entry["hash"] = content_hash
+        self._blobs[content_hash] = entry
+        self._refcounts[content_hash] = 1
+        self._total_bytes += _entry_size(entry)
+        self._evict()
+        return entry
+
+    def acquire(self, content_hash: str) -> bool:
+        """增加引用计数；条目已不在存储中时返回 False"""
+        if content_hash not in self._blobs:
+            return False
+        self._refcounts[content_hash] = self._refcounts.get(content_hash, 0) + 1
+        return True
+
+    def release(self, content_hash: str):
+        """减少引用计数，引用归零的条目在超出容量时可被淘汰"""
+        if self._refcounts.get(content_hash, 0) > 0:
+            self._refcounts[content_hash] -= 1
+        self._evict()
+
+    def _evict(self):
+        """超出容量时淘汰最久未使用且无引用的条目"""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        for content_hash in list(self._blobs.keys()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if self._refcounts.get(content_hash, 0) > 0:
+                continue
+            entry = self._blobs.pop(content_hash)
+            self._refcounts.pop(content_hash, None)
+            self._total_bytes -= _entry_size(entry)
+            logger.info(f"已淘汰图片缓存: {content_hash[:12]}")
+
+    def stats(self) -> Dict:
+        """获取存储统计"""
+        return {
+            "blobs": len(self._blobs),
+            "total_bytes": self._total_bytes,
+            "referenced": sum(1 for count in self._refcounts.values() if count > 0)
+        }
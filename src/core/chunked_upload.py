@@ -0,0 +1,190 @@
+"""
+可续传的分块图片上传
+部分上传的数据保存在 TEMP_DIR 中，连接断开后客户端从服务器确认的偏移继续上传
+"""
+
+import base64
+import binascii
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class UploadError(ValueError):
+    """上传请求无效，消息将返回给客户端"""
+
+
+class ChunkedUploadStore:
+    """
+    分块上传存储：每个上传对应一个 .part 数据文件和一个 .json 元数据文件，
+    已确认的偏移即数据文件的大小
+    """
+
+    def __init__(self, temp_dir: str, ttl: int = 3600):
+        """
+        Args:
+            temp_dir: 临时文件目录，上传数据保存在其下的 uploads 目录
+            ttl: 未完成或未被取走的上传保留时间（秒）
+        """
+        self.base_dir = Path(temp_dir) / "uploads"
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+
+    def _paths(self, upload_id: str) -> Tuple[Path, Path]:
+        # 上传ID来自客户端，只保留安全字符
+        safe_id = "".join(c for c in upload_id if c.isalnum() or c in "-_")[:64]
+        if not safe_id:
+            raise UploadError("无效的上传ID")
+        return self.base_dir / f"{safe_id}.part", self.base_dir / f"{safe_id}.json"
+
+    def meta(self, upload_id: str) -> Dict:
+        """获取上传的元数据（name / size / type）"""
+        _, meta_path = self._paths(upload_id)
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise UploadError("上传不存在或已过期，请重新上传")
+
+    def offset(self, upload_id: str) -> int:
+        """已确认的字节数"""
+        data_path, _ = self._paths(upload_id)
+        try:
+            return data_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def begin(self, upload_id: str, name: str, size: int, mime_type: str) -> int:
+        """
+        开始或恢复上传
+
+        Args:
+            upload_id: 客户端生成的上传ID（同一图片重连后保持不变）
+            name: 文件名
+            size: 总字节数
+            mime_type: 客户端声明的类型
+
+        Returns:
+            应继续上传的偏移
+        """
+        self.cleanup_expired()
+        data_path, meta_path = self._paths(upload_id)
+
+        if meta_path.exists():
+            meta = self.meta(upload_id)
+            if meta["size"] == size:
+                return self.offset(upload_id)
+            # 同一ID但内容不同，重新开始
+            logger.warning(f"上传 {upload_id} 的大小已变化，重新开始")
+
+        meta = {"name": name, "size": size, "type": mime_type, "created_at": time.time()}
+        meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        data_path.write_bytes(b"")
+        return 0
+
+    def append(self, upload_id: str, offset: int, chunk: str) -> int:
+        """
+        追加一块数据；偏移与已确认的偏移不一致时忽略该块，由客户端按返回的偏移重发
+
+        Args:
+            upload_id: 上传ID
+            offset: 该块的起始偏移
+            chunk: base64 编码的数据块
+
+        Returns:
+            追加后已确认的偏移
+        """
+        meta = self.meta(upload_id)
+        data_path, meta_path = self._paths(upload_id)
+        current = self.offset(upload_id)
+        if offset != current:
+            return current
+
+        try:
+            data = base64.b64decode(chunk, validate=True)
+        except (binascii.Error, ValueError):
+            raise UploadError("数据块不是有效的 base64")
+
+        if current + len(data) > meta["size"]:
+            raise UploadError(f"数据超过声明的大小 ({meta['size']} bytes)")
+
+        with open(data_path, "ab") as f:
+            f.write(data)
+        # 保持元数据文件的修改时间，避免进行中的上传被当作过期清理
+        os.utime(meta_path)
+        return current + len(data)
+
+    def read_header(self, upload_id: str, length: int) -> bytes:
+        """读取已上传数据的开头部分（用于识别格式）"""
+        data_path, _ = self._paths(upload_id)
+        with open(data_path, "rb") as f:
+            return f.read(length)
+
+    def ensure_complete(self, upload_id: str):
+        """
+        检查上传是否已完成
+
+        Raises:
+            UploadError: 上传不存在或尚未完成
+        """
+        meta = self.meta(upload_id)
+        received = self.offset(upload_id)
+        if received != meta["size"]:
+            raise UploadError(f"上传尚未完成 ({received}/{meta['size']} bytes)")
+
+    def take(self, upload_id: str) -> Dict:
+        """
+        取出已完成的上传并删除临时文件
+
+        Args:
+            upload_id: 上传ID
+
+        Returns:
+            图片条目（name / size / type / data URL）
+
+        Raises:
+            UploadError: 上传不存在或尚未完成
+        """
+        meta = self.meta(upload_id)
+        data_path, _ = self._paths(upload_id)
+        data = data_path.read_bytes() if data_path.exists() else b""
+        if len(data) != meta["size"]:
+            raise UploadError(f"上传尚未完成 ({len(data)}/{meta['size']} bytes)")
+
+        self.discard(upload_id)
+        mime_type = meta.get("type") or "application/octet-stream"
+        return {
+            "name": meta["name"],
+            "size": meta["size"],
+            "type": mime_type,
+            "data": f"data:{mime_type};base64,{base64.b64encode(data).decode()}"
+        }
+
+    def discard(self, upload_id: str):
+        """删除上传的临时文件"""
+        for path in self._paths(upload_id):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除上传临时文件失败: {e}")
+
+    def cleanup_expired(self):
+        """清理超过保留时间的上传"""
+        deadline = time.time() - self.ttl
+        try:
+            for path in self.base_dir.iterdir():
+                try:
+                    if path.stat().st_mtime < deadline:
+                        path.unlink()
+                        logger.info(f"已清理过期上传文件: {path.name}")
+                except FileNotFoundError:
+                    continue
+        except OSError as e:
+            logger.warning(f"清理上传临时文件失败: {e}")
@@ -0,0 +1,163 @@
+"""
+批量问题：一次反馈请求携带多个问题，用户在同一表单中回答后一次提交
+问题在 MCP 服务器与 Web 服务器两端按同一规则规范化，答案在 Web 服务器存储前校验
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.i18n import get_text
+
+# 支持的问题类型：文本、单选、多选、是/否确认
+QUESTION_TYPES = ("text", "choice", "multi_choice", "confirm")
+
+# 单个请求的问题数量、选项数量及文本长度上限
+MAX_QUESTIONS = 20
+MAX_OPTIONS = 20
+MAX_PROMPT_LENGTH = 1000
+MAX_OPTION_LENGTH = 200
+MAX_ID_LENGTH = 64
+
+
+class QuestionError(ValueError):
+    """问题定义不合法，消息将返回给调用方"""
+
+
+def normalize_questions(questions: Any) -> List[Dict]:
+    """
+    校验并规范化问题列表
+
+    Args:
+        questions: 问题定义列表，每项包含 prompt，可选 id / type / options / required
+
+    Returns:
+        规范化后的问题列表（id 唯一，type 合法，选择题带有选项）
+
+    Raises:
+        QuestionError: 问题定义不合法
+    """
+    if not isinstance(questions, list) or not questions:
+        raise QuestionError("questions 必须是非空列表")
+    if len(questions) > MAX_QUESTIONS:
+        raise QuestionError(f"问题数量不能超过 {MAX_QUESTIONS} 个")
+
+    normalized = []
+    seen = set()
+    for index, question in enumerate(questions, 1):
+        if isinstance(question, str):
+            question = {"prompt": question}
+        if not isinstance(question, dict):
+            raise QuestionError(f"第 {index} 个问题格式不正确")
+
+        prompt = str(question.get("prompt") or "").strip()
+        if not prompt:
+            raise QuestionError(f"第 {index} 个问题缺少 prompt")
+
+        question_id = str(question.get("id") or f"q{index}").strip()[:MAX_ID_LENGTH]
+        if question_id in seen:
+            raise QuestionError(f"问题 id 重复: {question_id}")
+        seen.add(question_id)
+
+        question_type = question.get("type") or ("choice" if question.get("options") else "text")
+        if question_type not in QUESTION_TYPES:
+            raise QuestionError(
+                f"问题 {question_id} 的类型 {question_type} 不受支持（允许: {', '.join(QUESTION_TYPES)}）")
+
+        item = {
+            "id": question_id,
+            "prompt": prompt[:MAX_PROMPT_LENGTH],
+            "type": question_type,
+            "required": bool(question.get("required", True))
+        }
+
+        if question_type in ("choice", "multi_choice"):
+            options = question.get("options")
+            if not isinstance(options, list) or len(options) < 2:
+                raise QuestionError(f"问题 {question_id} 至少需要 2 个选项")
+            if len(options) > MAX_OPTIONS:
+                raise QuestionError(f"问题 {question_id} 的选项不能超过 {MAX_OPTIONS} 个")
+            item["options"] = [str(option)[:MAX_OPTION_LENGTH] for option in options]
+
+        normalized.append(item)
+    return normalized
+
+
+def validate_answers(questions: List[Dict], answers: Any,
+                     language: str = "CN") -> Tuple[Dict[str, Any], List[str]]:
+    """
+    按问题定义校验答案
+
+    Args:
+        questions: normalize_questions() 的结果
+        answers: 客户端提交的 {问题id: 答案}
+        language: 错误说明的语言
+
+    Returns:
+        (规范化后的答案, 错误说明列表)；未回答的非必答问题不出现在答案中
+    """
+    if not isinstance(answers, dict):
+        answers = {}
+
+    cleaned: Dict[str, Any] = {}
+    errors: List[str] = []
+    for question in questions:
+        value = _clean_answer(question, answers.get(question["id"]))
+        if value is _INVALID:
+            errors.append(get_text("question_invalid_answer", language).format(
+                prompt=question["prompt"]))
+        elif value is None:
+            if question["required"]:
+                errors.append(get_text("question_required", language).format(
+                    prompt=question["prompt"]))
+        else:
+            cleaned[question["id"]] = value
+    return cleaned, errors
+
+
+_INVALID = object()
+
+
+def _clean_answer(question: Dict, value: Any) -> Any:
+    """规范化单个答案：未回答返回 None，不合法返回 _INVALID"""
+    if value is None or value == "" or value == []:
+        return None
+
+    question_type = question["type"]
+    if question_type == "text":
+        return str(value).strip() or None
+    if question_type == "confirm":
+        return value if isinstance(value, bool) else _INVALID
+    if question_type == "choice":
+        return value if value in question["options"] else _INVALID
+
+    # multi_choice：保持选项顺序，去除重复
+    if not isinstance(value, list) or any(item not in question["options"] for item in value):
+        return _INVALID
+    return [option for option in question["options"] if option in value]
+
+
+def format_answers(questions: List[Dict], answers: Optional[Dict], language: str = "CN") -> str:
+    """
+    将答案格式化为返回给调用方的文本，每个问题带上 id，便于调用方对应
+
+    Args:
+        questions: 问题定义
+        answers: 规范化后的答案
+        language: 语言代码
+
+    Returns:
+        文本
+    """
+    answers = answers or {}
+    lines = [get_text("batch_answers_title", language)]
+    for index, question in enumerate(questions, 1):
+        value = answers.get(question["id"])
+        if value is None:
+            answer = get_text("answer_skipped", language)
+        elif isinstance(value, bool):
+            answer = get_text("answer_yes" if value else "answer_no", language)
+        elif isinstance(value, list):
+            answer = ", ".join(value)
+        else:
+            answer = str(value)
+        lines.append(f"{index}. [{question['id']}] {question['prompt']}\n   → {answer}")
+    return "\n".join(lines)
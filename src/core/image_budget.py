@@ -0,0 +1,173 @@
+"""
+图片字节预算与分辨率选择
+在已有版本中挑选满足约束的版本，必要时按确定性的缩放步骤派生新版本
+"""
+
+import io
+import math
+from typing import Callable, Dict, List, Optional
+
+# 派生版本的默认格式与质量
+DEFAULT_DERIVED_FORMAT = "webp"
+DERIVED_QUALITY = 80
+
+# 按预算缩放时的最大尝试次数与最小边长
+MAX_DOWNSCALE_STEPS = 6
+MIN_DIMENSION = 32
+
+# 格式名 -> Pillow 格式名
+PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "png": "PNG", "gif": "GIF"}
+
+
+def normalize_format(value: Optional[str]) -> Optional[str]:
+    """将 image/jpeg、jpg、JPEG 等写法统一为 jpeg / png / webp / gif"""
+    if not value:
+        return None
+    value = value.lower().split("/")[-1]
+    return "jpeg" if value == "jpg" else value
+
+
+def make_candidate(label: str, loader: Callable[[], bytes], size: int, format: Optional[str],
+                   width: Optional[int] = None, height: Optional[int] = None) -> Dict:
+    """
+    构建候选版本描述
+
+    Args:
+        label: 版本名称（original / normalized / derived）
+        loader: 惰性获取图片字节的函数
+        size: 字节数
+        format: 图片格式
+        width: 宽度（未知时按需从数据中读取）
+        height: 高度
+    """
+    return {
+        "label": label,
+        "load": loader,
+        "size": size,
+        "format": normalize_format(format),
+        "width": width,
+        "height": height
+    }
+
+
+def ensure_dimensions(candidate: Dict) -> Dict:
+    """补全候选版本的宽高（只解析图片头）"""
+    if not candidate.get("width") or not candidate.get("height"):
+        from PIL import Image
+
+        with Image.open(io.BytesIO(candidate["load"]())) as image:
+            candidate["width"], candidate["height"] = image.size
+    return candidate
+
+
+def allocate_budget(sizes: List[int], budget: int) -> List[int]:
+    """
+    在多张图片之间分配字节预算（注水法：小图先满足，剩余额度平均分给大图）
+
+    Args:
+        sizes: 每张图片的期望字节数
+        budget: 总预算
+
+    Returns:
+        每张图片的字节上限
+    """
+    allowances = [0] * len(sizes)
+    remaining = max(budget, 0)
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i], i))
+
+    for position, index in enumerate(order):
+        share = remaining // (len(order) - position)
+        allowances[index] = min(sizes[index], share)
+        remaining -= allowances[index]
+
+    return allowances
+
+
+def _encode(image, format: str) -> bytes:
+    """按格式编码图片"""
+    pil_format = PIL_FORMATS.get(format, "WEBP")
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    save_kwargs = {"optimize": True}
+    if pil_format in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = DERIVED_QUALITY
+    image.save(buffer, format=pil_format, **save_kwargs)
+    return buffer.getvalue()
+
+
+def derive_variant(source: Dict, max_bytes: Optional[int], max_dimension: Optional[int],
+                   format: Optional[str]) -> Optional[Dict]:
+    """
+    从源版本派生满足约束的新版本；缩放步骤只取决于输入，结果可复现
+
+    Args:
+        source: 源候选版本（通常是分辨率最高的版本）
+        max_bytes: 字节上限
+        max_dimension: 最大边长
+        format: 输出格式
+
+    Returns:
+        派生出的候选版本；无法满足字节上限时返回 None
+    """
+    from PIL import Image
+
+    format = normalize_format(format) or DEFAULT_DERIVED_FORMAT
+
+    with Image.open(io.BytesIO(source["load"]())) as image:
+        image.load()
+        longest = max(image.size)
+        scale = min(1.0, max_dimension / longest) if max_dimension else 1.0
+
+        for _ in range(MAX_DOWNSCALE_STEPS):
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            resized = image if size == image.size else image.resize(size, Image.LANCZOS)
+            encoded = _encode(resized, format)
+
+            if max_bytes is None or len(encoded) <= max_bytes:
+                return make_candidate("derived", lambda data=encoded: data, len(encoded),
+                                      format, size[0], size[1])
+
+            if max(size) <= MIN_DIMENSION:
+                break
+            # 字节数大致与像素数成正比，按面积比例缩小并留出余量
+            scale *= max(0.25, math.sqrt(max_bytes / len(encoded)) * 0.9)
+
+    return None
+
+
+def select_variant(candidates: List[Dict], max_bytes: Optional[int], max_dimension: Optional[int],
+                   format: Optional[str]) -> Optional[Dict]:
+    """
+    为单张图片选择版本：优先使用满足约束且分辨率最高的已有版本，否则派生
+
+    Args:
+        candidates: 可用版本
+        max_bytes: 字节上限
+        max_dimension: 最大边长
+        format: 期望格式
+
+    Returns:
+        选中的候选版本；无法满足约束时返回 None
+    """
+    format = normalize_format(format)
+
+    eligible = []
+    for candidate in candidates:
+        if format and candidate["format"] != format:
+            continue
+        if max_bytes is not None and candidate["size"] > max_bytes:
+            continue
+        if max_dimension and max(ensure_dimensions(candidate)["width"],
+                                 candidate["height"]) > max_dimension:
+            continue
+        eligible.append(candidate)
+
+    if eligible:
+        return max(eligible, key=lambda c: (ensure_dimensions(c)["width"] * c["height"], -c["size"]))
+
+    if max_bytes is not None and max_bytes <= 0:
+        return None
+
+    source = max(candidates, key=lambda c: ensure_dimensions(c)["width"] * c["height"])
+    return derive_variant(source, max_bytes, max_dimension, format)
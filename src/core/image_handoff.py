@@ -0,0 +1,180 @@
+"""
+同机图片共享内存交接
+将提交的图片字节写入 /dev/shm（或 TEMP_DIR 下的文件），反馈结果只携带路径/偏移描述符
+"""
+
+import base64
+import binascii
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from src.utils.logger import setup_logger, log_error
+
+logger = setup_logger(__name__)
+
+# 共享内存文件系统挂载点
+SHM_ROOT = Path("/dev/shm")
+
+# 描述符在图片条目中的键名
+HANDOFF_KEY = "handoff"
+
+
+def decode_data_url(data: str) -> bytes:
+    """
+    解码 base64 图片数据（可带 data URL 前缀）
+
+    Args:
+        data: base64 字符串或 data URL
+
+    Returns:
+        图片字节
+    """
+    if data.startswith("data:"):
+        # 格式: data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAA...
+        data = data.split(",", 1)[1]
+    return base64.b64decode(data)
+
+
+def handoff_paths(images: List[Dict]) -> Set[Path]:
+    """图片（及派生版本）描述符引用的共享内存文件"""
+    paths = set()
+    for image in images:
+        for entry in [image] + list(image.get("variants") or []):
+            descriptor = entry.get(HANDOFF_KEY)
+            if descriptor:
+                paths.add(Path(descriptor["path"]))
+    return paths
+
+
+class SharedImageStore:
+    """共享内存图片存储"""
+
+    def __init__(self, temp_dir: str, ttl: int = 600, base_dir: Optional[str] = None):
+        """
+        Args:
+            temp_dir: /dev/shm 不可用时的回退目录
+            ttl: 未被取走的文件保留时间（秒）
+            base_dir: 显式指定的存储目录
+        """
+        if base_dir:
+            self.base_dir = Path(base_dir)
+        elif SHM_ROOT.is_dir() and os.access(SHM_ROOT, os.W_OK):
+            self.base_dir = SHM_ROOT / "feedback_collector"
+        else:
+            self.base_dir = Path(temp_dir) / "shm"
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._probe: Optional[Dict] = None
+
+    def locality_probe(self) -> Optional[Dict]:
+        """
+        同机证明：在存储目录写入一个随机令牌文件。
+        客户端能在同一路径读到相同令牌，才说明双方看到的是同一个文件系统（同主机且未被容器隔离）
+
+        Returns:
+            {"path", "token"}；无法写入时返回 None
+        """
+        if self._probe is None:
+            # 按进程命名，重启后覆盖而不是累积
+            path = self.base_dir / f".locality-{os.getpid()}"
+            token = secrets.token_hex(16)
+            try:
+                path.write_text(token)
+            except OSError as e:
+                log_error(logger, e, "写入共享内存同机证明文件失败")
+                return None
+            self._probe = {"path": str(path), "token": token}
+        return self._probe
+
+    def _path_for(self, request_id: str) -> Path:
+        # 请求ID来自客户端，只保留安全字符；同一请求的每次提交写入新文件，
+        # 覆盖写入（截断）会让仍映射着旧文件的读取方访问越界
+        safe_id = "".join(c for c in request_id if c.isalnum() or c in "-_")
+        return self.base_dir / f"{safe_id}.{secrets.token_hex(4)}.bin"
+
+    def write_images(self, request_id: str, images: List[Dict]) -> List[Dict]:
+        """
+        将一次提交的所有图片顺序写入同一个文件，并用描述符替换内联数据
+
+        Args:
+            request_id: 请求ID
+            images: 客户端提交的图片列表
+
+        Returns:
+            新的图片列表；无法解码的图片保持内联
+        """
+        self.cleanup_expired()
+
+        path = self._path_for(request_id)
+        result = []
+        offset = 0
+
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        except OSError as e:
+            log_error(logger, e, "创建共享内存文件失败，图片保持内联")
+            return images
+
+        with os.fdopen(fd, "wb") as f:
+            def write_entry(entry: Dict) -> Dict:
+                nonlocal offset
+                data = entry.get("data") or ""
+                try:
+                    image_bytes = decode_data_url(data)
+                except (binascii.Error, ValueError, IndexError):
+                    return entry
+
+                f.write(image_bytes)
+                written = {key: value for key, value in entry.items() if key != "data"}
+                written["data"] = ""
+                written[HANDOFF_KEY] = {
+                    "path": str(path),
+                    "offset": offset,
+                    "length": len(image_bytes)
+                }
+                offset += len(image_bytes)
+                return written
+
+            for image in images:
+                if not image.get("data"):
+                    result.append(image)
+                    continue
+
+                entry = write_entry(image)
+                # 派生版本（如规范化后的图片）写入同一文件
+                if image.get("variants"):
+                    entry["variants"] = [write_entry(v) for v in image["variants"]]
+                result.append(entry)
+
+        logger.info(f"图片已写入共享内存: {path} ({offset} bytes)")
+        return result
+
+    def release(self, images: List[Dict]):
+        """删除图片描述符引用的共享内存文件（已建立的映射在删除后仍然有效）"""
+        for path in handoff_paths(images):
+            # 描述符经过结果存储往返，只删除存储目录下的文件
+            if path.parent != self.base_dir:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除共享内存文件失败: {e}")
+
+    def cleanup_expired(self):
+        """清理超过保留时间仍未被取走的文件"""
+        deadline = time.time() - self.ttl
+        try:
+            for path in self.base_dir.glob("*.bin"):
+                try:
+                    if path.stat().st_mtime < deadline:
+                        path.unlink()
+                        logger.info(f"已清理过期共享内存文件: {path}")
+                except FileNotFoundError:
+                    continue
+        except OSError as e:
+            logger.warning(f"清理共享内存文件失败: {e}")
@@ -0,0 +1,159 @@
+"""
+图片规范化处理管道
+在进程池中校验图片、去除元数据、按最大边长缩放并重新编码，保留原图与派生版本
+"""
+
+import asyncio
+import base64
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from src.core.image_handoff import decode_data_url
+from src.utils.logger import setup_logger, log_error
+
+logger = setup_logger(__name__)
+
+# 派生版本名称
+NORMALIZED_VARIANT = "normalized"
+
+# 输出格式 -> Pillow 格式名
+OUTPUT_FORMATS = {
+    "webp": "WEBP",
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+    "png": "PNG"
+}
+
+
+def normalize_image(data: str, max_dimension: int, output_format: str, quality: int) -> Dict:
+    """
+    规范化单张图片（在工作进程中执行）
+
+    Args:
+        data: base64 图片数据或 data URL
+        max_dimension: 最大边长（像素）
+        output_format: 输出格式（webp / jpeg / png）
+        quality: 有损格式的编码质量
+
+    Returns:
+        原图尺寸与派生版本信息；图片无效时包含 error
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        raw = decode_data_url(data)
+        # verify() 之后图片对象不可再用，需要重新打开
+        with Image.open(io.BytesIO(raw)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as e:
+        return {"error": f"无效的图片数据: {e}"}
+
+    result = {
+        "width": image.width,
+        "height": image.height,
+        "format": (image.format or "").lower()
+    }
+
+    # 动图保持原样，不生成派生版本
+    if getattr(image, "n_frames", 1) > 1:
+        result["variants"] = []
+        return result
+
+    pil_format = OUTPUT_FORMATS.get(output_format.lower(), "WEBP")
+    mime_format = "jpeg" if pil_format == "JPEG" else pil_format.lower()
+
+    # 只拷贝像素数据，丢弃 EXIF/ICC 等元数据
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if pil_format == "JPEG" or not has_alpha:
+        target_mode = "RGB"
+    else:
+        target_mode = "RGBA"
+    pixels = image.convert(target_mode)
+    clean = Image.new(target_mode, pixels.size)
+    clean.paste(pixels)
+
+    if max(clean.size) > max_dimension:
+        clean.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    save_kwargs = {"optimize": True}
+    if pil_format in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = quality
+    clean.save(buffer, format=pil_format, **save_kwargs)
+    encoded = buffer.getvalue()
+
+    result["variants"] = [{
+        "variant": NORMALIZED_VARIANT,
+        "type": f"image/{mime_format}",
+        "width": clean.width,
+        "height": clean.height,
+        "size": len(encoded),
+        "data": f"data:image/{mime_format};base64,{base64.b64encode(encoded).decode()}"
+    }]
+    return result
+
+
+class ImagePipeline:
+    """图片规范化管道，处理在进程池中进行，不阻塞事件循环"""
+
+    def __init__(self, max_dimension: int, output_format: str, quality: int, workers: int):
+        self.max_dimension = max_dimension
+        self.output_format = output_format
+        self.quality = quality
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """获取进程池（首次使用时创建）"""
+        if self._executor is None:
+            # 使用 spawn：fork 会让工作进程继承监听套接字，且在多线程（嵌入模式）下不安全
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def process(self, images: List[Dict]) -> List[Dict]:
+        """
+        并行规范化一次提交中的所有图片
+
+        Args:
+            images: 客户端提交的图片列表
+
+        Returns:
+            带尺寸与派生版本信息的图片列表，原图数据保留
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+
+        tasks = [
+            loop.run_in_executor(
+                executor, normalize_image, image.get("data") or "",
+                self.max_dimension, self.output_format, self.quality)
+            for image in images
+        ]
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+
+        result = []
+        for image, outcome in zip(images, outcomes):
+            if isinstance(outcome, Exception):
+                log_error(logger, outcome, f"图片规范化失败: {image.get('name')}")
+                result.append(image)
+                continue
+
+            if "error" in outcome:
+                logger.warning(f"拒绝无效图片 {image.get('name')}: {outcome['error']}")
+                result.append({**image, "data": "", "error": outcome["error"]})
+                continue
+
+            result.append({**image, **outcome})
+
+        return result
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
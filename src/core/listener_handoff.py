@@ -0,0 +1,259 @@
+"""
+监听套接字交接（平滑重启）
+旧进程在 Unix 域控制套接字上等待接管请求：收到后通过 SCM_RIGHTS 把监听套接字传给新进程，
+随后停止接受新连接并排空，最后把未完成的请求与已存储的结果发送给新进程。
+监听套接字在交接期间始终处于打开状态，重连的客户端在新进程的 accept 队列中等待，不会被拒绝
+"""
+
+import asyncio
+import json
+import os
+import socket
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 一次最多传递的监听套接字数量（TCP 端口与可选的 Unix 域套接字）
+MAX_LISTENERS = 8
+
+# 建立控制连接、接收监听套接字的超时（秒）
+TAKEOVER_TIMEOUT = 5.0
+
+
+class HandoffError(RuntimeError):
+    """接管失败（旧进程不存在、不支持或未响应），调用方应回退到普通启动"""
+
+
+def is_supported() -> bool:
+    """当前平台是否支持通过 Unix 域套接字传递文件描述符"""
+    return hasattr(socket, "AF_UNIX") and hasattr(socket, "send_fds")
+
+
+def _encode(message: Dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class ListenerHandoff:
+    """
+    平滑重启的两端：
+    - 运行中的进程调用 attach() + start() 监听接管请求
+    - 新进程调用 take_over() 取得监听套接字，启动后用 receive_state() 接收旧进程的状态
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 控制套接字路径
+        """
+        self.path = path
+        self._server = None
+        self._sockets: List[socket.socket] = []
+        self._control: Optional[socket.socket] = None
+        self._control_task: Optional[asyncio.Task] = None
+        # 旧进程：已接管的新进程连接；新进程：与旧进程的连接
+        self._successor: Optional[socket.socket] = None
+        self._predecessor: Optional[socket.socket] = None
+
+    @property
+    def handed_over(self) -> bool:
+        """监听套接字是否已交给新进程"""
+        return self._successor is not None
+
+    @property
+    def has_predecessor(self) -> bool:
+        """是否从旧进程接管而来（尚未收到旧进程的状态）"""
+        return self._predecessor is not None
+
+    def take_over(self, timeout: float = TAKEOVER_TIMEOUT) -> List[socket.socket]:
+        """
+        向运行中的旧进程请求监听套接字（阻塞，在服务器启动前调用）
+
+        Returns:
+            监听套接字列表
+
+        Raises:
+            HandoffError: 无法接管
+        """
+        if not is_supported():
+            raise HandoffError("当前平台不支持传递文件描述符")
+        if not os.path.exists(self.path):
+            raise HandoffError("未找到运行中服务器的控制套接字")
+
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(timeout)
+        try:
+            conn.connect(self.path)
+            conn.sendall(_encode({"action": "takeover", "pid": os.getpid()}))
+            data, fds, _, _ = socket.recv_fds(conn, 4096, MAX_LISTENERS)
+        except OSError as e:
+            conn.close()
+            raise HandoffError(f"接管监听套接字失败: {e}")
+
+        if not fds:
+            conn.close()
+            raise HandoffError(f"旧进程拒绝交接: {data.decode(errors='replace').strip()}")
+
+        sockets = [socket.socket(fileno=fd) for fd in fds]
+        self._predecessor = conn
+        logger.info(f"已从旧进程接管 {len(sockets)} 个监听套接字")
+        return sockets
+
+    def attach(self, server, sockets: List[socket.socket]):
+        """
+        记录本进程的 uvicorn 服务器与监听套接字，启用接管
+
+        Args:
+            server: uvicorn.Server，交接后通过 should_exit 触发排空
+            sockets: 监听套接字
+        """
+        self._server = server
+        self._sockets = list(sockets)
+
+    async def start(self, on_takeover: Callable[[], Awaitable[None]]):
+        """
+        开始监听接管请求（在服务器启动事件中调用）
+
+        Args:
+            on_takeover: 交出监听套接字后、开始排空前执行的回调（例如通知客户端重连）
+        """
+        if self._server is None or not is_supported():
+            return
+
+        # 接管而来时控制套接字路径仍指向旧进程，先删除再绑定自己的
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除旧的控制套接字失败: {e}")
+            return
+
+        control = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            control.bind(self.path)
+            os.chmod(self.path, 0o600)
+            control.listen(1)
+        except OSError as e:
+            control.close()
+            logger.warning(f"创建控制套接字失败，平滑重启不可用: {e}")
+            return
+        control.setblocking(False)
+
+        self._control = control
+        self._control_task = asyncio.create_task(self._accept_takeover(on_takeover))
+        logger.info(f"平滑重启控制套接字: {self.path}")
+
+    async def _accept_takeover(self, on_takeover: Callable[[], Awaitable[None]]):
+        """等待新进程的接管请求，交出监听套接字后触发排空"""
+        loop = asyncio.get_running_loop()
+        while True:
+            conn, _ = await loop.sock_accept(self._control)
+            try:
+                request = json.loads(await self._recv_line(conn))
+                if request.get("action") != "takeover":
+                    raise ValueError(f"未知操作: {request.get('action')}")
+
+                conn.setblocking(True)
+                socket.send_fds(conn, [_encode({"listeners": len(self._sockets)})],
+                                [sock.fileno() for sock in self._sockets])
+                conn.setblocking(False)
+            except (OSError, ValueError) as e:
+                logger.warning(f"处理接管请求失败: {e}")
+                conn.close()
+                continue
+
+            logger.info(f"监听套接字已交给新进程 (PID: {request.get('pid')})，开始排空")
+            self._successor = conn
+            # 控制套接字路径已由新进程接管，只关闭不删除
+            self._control.close()
+            self._control = None
+            break
+
+        try:
+            await on_takeover()
+        except Exception as e:
+            logger.error(f"交接回调执行失败: {e}")
+        # 关闭本进程的监听，等待进行中的请求完成后依次执行关闭事件
+        self._server.should_exit = True
+
+    @staticmethod
+    async def _recv_line(conn: socket.socket, limit: int = 4096) -> bytes:
+        """读取一行（接管请求）"""
+        loop = asyncio.get_running_loop()
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = await asyncio.wait_for(loop.sock_recv(conn, limit), TAKEOVER_TIMEOUT)
+            if not chunk or len(data) + len(chunk) > limit:
+                raise ValueError("接管请求不完整")
+            data += chunk
+        return data
+
+    async def send_state(self, state: Dict):
+        """旧进程：排空后把状态发送给新进程并关闭连接"""
+        if self._successor is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.sock_sendall(self._successor, _encode(state))
+            logger.info("状态已交给新进程")
+        except OSError as e:
+            logger.error(f"向新进程发送状态失败: {e}")
+        finally:
+            self._successor.close()
+
+    async def receive_state(self, timeout: float) -> Optional[Dict]:
+        """
+        新进程：等待旧进程排空后发送的状态
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            旧进程的状态；旧进程未发送或超时时返回 None
+        """
+        if self._predecessor is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        conn = self._predecessor
+        conn.setblocking(False)
+        chunks = []
+
+        async def read_all():
+            while True:
+                chunk = await loop.sock_recv(conn, 1024 * 1024)
+                if not chunk:
+                    return
+                chunks.append(chunk)
+
+        try:
+            await asyncio.wait_for(read_all(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("等待旧进程交接状态超时")
+            return None
+        except OSError as e:
+            logger.warning(f"接收旧进程状态失败: {e}")
+            return None
+        finally:
+            conn.close()
+            self._predecessor = None
+
+        try:
+            return json.loads(b"".join(chunks)) if chunks else None
+        except ValueError as e:
+            logger.warning(f"旧进程状态无法解析: {e}")
+            return None
+
+    def close(self):
+        """正常关闭（未交接）时删除控制套接字"""
+        if self._control_task and not self._control_task.done():
+            self._control_task.cancel()
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
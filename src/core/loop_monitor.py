@@ -0,0 +1,217 @@
+"""
+事件循环延迟监控与慢回调检测
+定时采样事件循环的调度延迟，并计时每个回调的执行时间，记录超过阈值的协程/处理函数名称与耗时。
+只在启用时替换 asyncio.Handle._run，未启用时没有任何额外开销
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 用于计算百分位的最近采样数
+LAG_WINDOW = 120
+# 保留的最近慢回调记录数
+RECENT_SLOW_CALLBACKS = 50
+# 按名称汇总的慢回调条目上限
+MAX_SLOW_CALLBACK_NAMES = 256
+
+# 当前 HTTP/WebSocket 请求的 ASGI scope，慢回调据此归属到路由处理函数
+_current_scope: contextvars.ContextVar = contextvars.ContextVar("loop_monitor_scope", default=None)
+
+
+class HandlerContextMiddleware:
+    """ASGI 中间件：把请求 scope 放入上下文变量，回调运行在请求任务的上下文中时可以找到对应的处理函数"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            _current_scope.set(scope)
+        await self.app(scope, receive, send)
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    """最近秩法百分位（ordered 已排序且非空）"""
+    index = max(int(len(ordered) * percent / 100 + 0.5) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def _describe_handle(handle: asyncio.Handle) -> Dict[str, Optional[str]]:
+    """回调名称：任务步骤取协程的限定名，普通回调取函数的限定名"""
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    task_name = None
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        name = getattr(coro, "__qualname__", None) or repr(coro)
+        task_name = owner.get_name()
+    else:
+        target = getattr(callback, "func", callback)
+        name = getattr(target, "__qualname__", None) or repr(target)
+
+    handler = None
+    context = handle._context
+    scope = context.get(_current_scope) if context is not None else None
+    if scope is not None:
+        endpoint = scope.get("endpoint")
+        handler = getattr(endpoint, "__qualname__", None) or f"{scope['type']} {scope['path']}"
+
+    return {"callback": name, "task": task_name, "handler": handler}
+
+
+class LoopMonitor:
+    """事件循环监控器"""
+
+    def __init__(self, interval: float, slow_callback_threshold: float, lag_limit: float):
+        """
+        Args:
+            interval: 延迟采样间隔（秒）
+            slow_callback_threshold: 回调执行超过该时间（秒）时记录为慢回调
+            lag_limit: 延迟超过该值（秒）时视为未就绪
+        """
+        self.interval = interval
+        self.slow_callback_threshold = slow_callback_threshold
+        self.lag_limit = lag_limit
+        self.enabled = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sampler: Optional[asyncio.Task] = None
+        self._original_run = None
+        # 下一次采样预期唤醒的时间，用于发现正在发生的阻塞
+        self._expected: Optional[float] = None
+        self._samples: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self._max_lag = 0.0
+        self._slow_recent: Deque[Dict] = deque(maxlen=RECENT_SLOW_CALLBACKS)
+        self._slow_by_name: Dict[str, Dict] = {}
+        self.slow_callback_count = 0
+
+    def start(self):
+        """在当前事件循环上开始采样并计时回调"""
+        if self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._install_handle_timer()
+        self._sampler = asyncio.create_task(self._sample_loop())
+        self.enabled = True
+        logger.info(
+            f"事件循环监控已启用，采样间隔 {self.interval}s，"
+            f"慢回调阈值 {self.slow_callback_threshold * 1000:.0f}ms")
+
+    def stop(self):
+        """停止采样并恢复 asyncio.Handle._run"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self._sampler:
+            self._sampler.cancel()
+            self._sampler = None
+        if self._original_run is not None:
+            asyncio.Handle._run = self._original_run
+            self._original_run = None
+        self._expected = None
+
+    def _install_handle_timer(self):
+        original = asyncio.Handle._run
+        self._original_run = original
+        monitor = self
+
+        def _run(handle):
+            if handle._loop is not monitor._loop:
+                return original(handle)
+            start = time.perf_counter()
+            try:
+                return original(handle)
+            finally:
+                duration = time.perf_counter() - start
+                if duration >= monitor.slow_callback_threshold:
+                    monitor._record_slow_callback(handle, duration)
+
+        asyncio.Handle._run = _run
+
+    def _record_slow_callback(self, handle: asyncio.Handle, duration: float):
+        try:
+            entry = _describe_handle(handle)
+        except Exception:
+            entry = {"callback": repr(handle), "task": None, "handler": None}
+        duration_ms = round(duration * 1000, 1)
+        entry["duration_ms"] = duration_ms
+        entry["timestamp"] = time.time()
+        self._slow_recent.append(entry)
+        self.slow_callback_count += 1
+
+        key = f"{entry['handler']} / {entry['callback']}" if entry["handler"] else entry["callback"]
+        summary = self._slow_by_name.get(key)
+        if summary is None and len(self._slow_by_name) < MAX_SLOW_CALLBACK_NAMES:
+            summary = self._slow_by_name[key] = {
+                "callback": entry["callback"], "handler": entry["handler"],
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        if summary is not None:
+            summary["count"] += 1
+            summary["total_ms"] += duration_ms
+            summary["max_ms"] = max(summary["max_ms"], duration_ms)
+
+        logger.warning(
+            f"慢回调: {key} 执行 {duration_ms}ms（任务 {entry['task']}）")
+
+    async def _sample_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(loop.time() - self._expected, 0.0)
+                self._samples.append(lag)
+                self._max_lag = max(self._max_lag, lag)
+        except asyncio.CancelledError:
+            pass
+
+    def current_lag(self) -> float:
+        """当前延迟：最近一次采样，或尚未唤醒的采样已经超时的时间"""
+        lag = self._samples[-1] if self._samples else 0.0
+        if self._expected is not None and self._loop is not None:
+            lag = max(lag, self._loop.time() - self._expected)
+        return lag
+
+    def is_healthy(self) -> bool:
+        """当前延迟与最近窗口的 p95 都不超过限制"""
+        if not self.enabled:
+            return True
+        if self.current_lag() > self.lag_limit:
+            return False
+        if self._samples:
+            return _percentile(sorted(self._samples), 95) <= self.lag_limit
+        return True
+
+    def stats(self) -> Dict:
+        """延迟百分位（毫秒）与慢回调统计"""
+        if not self.enabled:
+            return {"enabled": False}
+
+        ordered = sorted(self._samples)
+        lag_ms = {"current": round(self.current_lag() * 1000, 1),
+                  "max": round(self._max_lag * 1000, 1),
+                  "samples": len(ordered)}
+        if ordered:
+            for percent in (50, 95, 99):
+                lag_ms[f"p{percent}"] = round(_percentile(ordered, percent) * 1000, 1)
+
+        top = sorted(self._slow_by_name.values(), key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "enabled": True,
+            "healthy": self.is_healthy(),
+            "interval": self.interval,
+            "lag_limit_ms": round(self.lag_limit * 1000, 1),
+            "lag_ms": lag_ms,
+            "slow_callbacks": {
+                "threshold_ms": round(self.slow_callback_threshold * 1000, 1),
+                "count": self.slow_callback_count,
+                "top": [dict(s, total_ms=round(s["total_ms"], 1)) for s in top[:10]],
+                "recent": list(self._slow_recent)[-10:]
+            }
+        }
@@ -0,0 +1,152 @@
+"""
+消息序号与断线补发
+服务器发给客户端的消息带有单调递增的序号，并按会话（浏览器标签页）保存在有界环形缓冲区中。
+标签页重连时在握手中带上会话ID与最后收到的序号，服务器只补发其间错过的消息
+"""
+
+import time
+import uuid
+import weakref
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+# 同时保留的会话数量上限，超出时淘汰最久未连接的会话
+MAX_SESSIONS = 256
+
+
+class ReplaySession:
+    """一个会话的消息缓冲区"""
+
+    __slots__ = ("session_id", "buffer", "evicted_seq", "sockets", "connected", "detached_at")
+
+    def __init__(self, session_id: str, capacity: int, start_seq: int):
+        self.session_id = session_id
+        self.buffer: Deque[Tuple[int, str]] = deque(maxlen=capacity)
+        # 缓冲区覆盖不到的最大序号（会话创建前的消息或已被挤出的消息），请求补发更早的消息时无法补全
+        self.evicted_seq = start_seq
+        # 该会话当前的连接
+        self.sockets: Set = set()
+        self.connected = 0
+        self.detached_at = time.monotonic()
+
+    def append(self, seq: int, message: str):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.evicted_seq = self.buffer[0][0]
+        self.buffer.append((seq, message))
+
+    def since(self, last_seq: int) -> Tuple[List[Tuple[int, str]], bool]:
+        """
+        获取序号大于 last_seq 的消息
+
+        Returns:
+            (消息列表, 是否完整)；缓冲区已丢弃部分消息时不完整，客户端需要重新获取状态
+        """
+        return [entry for entry in self.buffer if entry[0] > last_seq], last_seq >= self.evicted_seq
+
+
+class ReplayLog:
+    """按会话保存已发送的消息，供重连后补发"""
+
+    def __init__(self, capacity: int, ttl: float, max_sessions: int = MAX_SESSIONS):
+        """
+        Args:
+            capacity: 每个会话保留的消息条数，<= 0 时不编号也不补发
+            ttl: 会话断开后保留的时间（秒）
+            max_sessions: 同时保留的会话数量上限
+        """
+        self.capacity = capacity
+        self.enabled = capacity > 0
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # 每个进程的序号空间不同，客户端发现实例变化（例如平滑重启）时从头计数
+        self.epoch = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._sessions: Dict[str, ReplaySession] = {}
+        self._by_socket: Dict[object, ReplaySession] = {}
+        # 已断开的连接 -> 会话：发给旧连接的消息（例如请求收件人的取消通知）仍记入会话缓冲区；
+        # 弱引用，旧连接不再被引用时自动移除，反复重连的标签页不会积累旧连接
+        self._detached: "weakref.WeakKeyDictionary[object, ReplaySession]" = weakref.WeakKeyDictionary()
+        self.replayed = 0
+        self.incomplete_resumes = 0
+
+    def next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def attach(self, session_id: str, websocket) -> ReplaySession:
+        """连接建立时关联到会话（不存在时创建）"""
+        self.prune()
+        session = self._sessions.get(session_id)
+        if session is None:
+            if len(self._sessions) >= self.max_sessions:
+                self._evict_oldest()
+            session = self._sessions[session_id] = ReplaySession(
+                session_id, self.capacity, self._seq)
+        session.sockets.add(websocket)
+        session.connected += 1
+        self._by_socket[websocket] = session
+        return session
+
+    def detach(self, websocket):
+        """连接断开：从会话中移除连接；会话在 ttl 内保留，继续记录发给它的消息"""
+        session = self._by_socket.pop(websocket, None)
+        if session is not None:
+            session.sockets.discard(websocket)
+            session.connected = max(session.connected - 1, 0)
+            session.detached_at = time.monotonic()
+            self._detached[websocket] = session
+
+    def session_for(self, websocket) -> Optional[ReplaySession]:
+        session = self._by_socket.get(websocket)
+        if session is None:
+            session = self._detached.get(websocket)
+        return session
+
+    def record(self, websocket, seq: int, message: str):
+        """记录发给单个连接的消息"""
+        session = self.session_for(websocket)
+        if session is not None:
+            session.append(seq, message)
+
+    def record_broadcast(self, seq: int, message: str):
+        """记录广播消息：所有会话（包括正在重连的）都保存同一个字符串"""
+        for session in self._sessions.values():
+            session.append(seq, message)
+
+    def prune(self):
+        """删除断开超过 ttl 的会话"""
+        now = time.monotonic()
+        expired = [s for s in self._sessions.values()
+                   if not s.connected and now - s.detached_at > self.ttl]
+        for session in expired:
+            self._remove(session)
+
+    def _evict_oldest(self):
+        idle = [s for s in self._sessions.values() if not s.connected]
+        candidates = idle or list(self._sessions.values())
+        self._remove(min(candidates, key=lambda s: s.detached_at))
+
+    def _remove(self, session: ReplaySession):
+        self._sessions.pop(session.session_id, None)
+        for websocket in session.sockets:
+            if self._by_socket.get(websocket) is session:
+                del self._by_socket[websocket]
+        for websocket, owner in list(self._detached.items()):
+            if owner is session:
+                del self._detached[websocket]
+
+    def stats(self) -> Dict:
+        """补发统计"""
+        return {
+            "enabled": self.enabled,
+            "epoch": self.epoch,
+            "last_seq": self._seq,
+            "sessions": len(self._sessions),
+            "buffered_messages": sum(len(s.buffer) for s in self._sessions.values()),
+            "replayed": self.replayed,
+            "incomplete_resumes": self.incomplete_resumes
+        }
@@ -0,0 +1,153 @@
+"""
+令牌桶限流
+每个键（WebSocket 连接或调用方）一个令牌桶，检查只做一次时间差计算，O(1)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+# 同时跟踪的键数量上限，超出时淘汰最久未使用的键
+DEFAULT_MAX_KEYS = 1024
+
+# 调用方自报标识的最大长度
+MAX_CALLER_ID_LENGTH = 64
+
+
+class TokenBucket:
+    """令牌桶：以 rate 个/秒补充令牌，最多积累 capacity 个"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def acquire(self, cost: float = 1.0) -> float:
+        """
+        尝试取出令牌
+
+        Returns:
+            0 表示放行；否则为令牌足够前需要等待的秒数
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """按键限流，并统计放行与拒绝次数"""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = DEFAULT_MAX_KEYS):
+        """
+        Args:
+            rate: 每秒补充的令牌数，<= 0 时不限流
+            burst: 桶容量（允许的突发数量）
+            max_keys: 同时跟踪的键数量上限
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.enabled = rate > 0
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def check(self, key: Hashable, cost: float = 1.0) -> float:
+        """
+        检查并记录一次请求
+
+        Args:
+            key: 限流键
+            cost: 本次消耗的令牌数
+
+        Returns:
+            0 表示放行；否则为建议的重试等待时间（秒）
+        """
+        if not self.enabled:
+            return 0.0
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        retry_after = bucket.acquire(cost)
+        if retry_after:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def forget(self, key: Hashable):
+        """移除键（例如连接断开）"""
+        self._buckets.pop(key, None)
+
+    def stats(self) -> Dict:
+        """获取限流统计"""
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "burst": self.burst,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "tracked_keys": len(self._buckets)
+        }
+
+
+class CallerKeys:
+    """
+    限流键：以对端地址为准，调用方自报的标识只在地址内部细分。
+    每个地址最多 max_callers 个独立标识，超出的标识共用地址级的键，伪造标识无法获得更多预算
+    """
+
+    def __init__(self, max_callers: int, idle_after: float, max_addresses: int = DEFAULT_MAX_KEYS):
+        """
+        Args:
+            max_callers: 每个地址独立计数的标识数量上限（0 表示忽略自报标识）
+            idle_after: 标识空闲超过该时间（秒）后让出名额；此时其令牌桶已经补满，换成新标识不会多给令牌
+            max_addresses: 同时跟踪的地址数量上限
+        """
+        self.max_callers = max_callers
+        self.idle_after = idle_after
+        self.max_addresses = max_addresses
+        self._callers: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+
+    def key(self, address: str, caller: Optional[str]) -> Tuple[str, Optional[str]]:
+        """
+        Args:
+            address: 对端地址（Unix 域套接字为 "local"）
+            caller: 调用方自报的标识
+
+        Returns:
+            (地址, 标识)；未声明或名额已满时标识为 None
+        """
+        if not caller or self.max_callers <= 0:
+            return (address, None)
+        caller = caller[:MAX_CALLER_ID_LENGTH]
+
+        callers = self._callers.get(address)
+        if callers is None:
+            callers = self._callers[address] = {}
+            if len(self._callers) > self.max_addresses:
+                self._callers.popitem(last=False)
+        else:
+            self._callers.move_to_end(address)
+
+        now = time.monotonic()
+        if caller not in callers and len(callers) >= self.max_callers:
+            for stale in [c for c, seen in callers.items() if now - seen >= self.idle_after]:
+                del callers[stale]
+        if caller not in callers and len(callers) >= self.max_callers:
+            return (address, None)
+        callers[caller] = now
+        return (address, caller)
@@ -0,0 +1,280 @@
+"""
+静态资源构建与分发
+为静态文件生成带内容哈希的文件名，并预先写出 .gz/.br 压缩副本
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.logger import setup_logger, log_error
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时只生成 gzip 副本
+    brotli = None
+
+logger = setup_logger(__name__)
+
+# 需要加指纹的文件类型（HTML 页面保持原路径，便于直接访问）
+FINGERPRINT_SUFFIXES = {".js", ".css", ".ico", ".png", ".svg", ".woff2"}
+
+# 值得预压缩的文本类文件
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".svg", ".ico", ".json"}
+
+# 压缩收益低于该比例时不写压缩副本
+MIN_COMPRESSION_GAIN = 0.9
+
+# 编码名称 -> 压缩副本后缀，按优先级排列
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 构建目录中保留的版本数（包括当前版本）：平滑重启时旧进程排空期间仍在使用上一个版本
+KEEP_BUILD_VERSIONS = 3
+
+# 未完成的临时构建目录超过该时间（秒）视为遗留，可以删除
+STALE_BUILD_SECONDS = 3600
+
+MANIFEST_FILE = "manifest.json"
+
+
+def manifest_version(manifest: Dict[str, str]) -> str:
+    """资源清单的内容哈希，任一资源内容变化时改变"""
+    return hashlib.sha256(
+        json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """
+    解析 Accept-Encoding 请求头
+
+    Args:
+        header: 请求头原始值
+
+    Returns:
+        编码名称到 q 值的映射
+    """
+    encodings: Dict[str, float] = {}
+    if not header:
+        return encodings
+
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[token] = quality
+
+    return encodings
+
+
+class StaticAssetPipeline:
+    """静态资源指纹化与预压缩管道"""
+
+    def __init__(self, source_dir: Path, build_dir: Path, url_prefix: str = "/assets",
+                 fallback_prefix: str = "/static"):
+        self.source_dir = Path(source_dir)
+        self.build_dir = Path(build_dir)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.fallback_prefix = fallback_prefix.rstrip("/")
+        # 逻辑路径 -> 指纹路径，例如 js/main.js -> js/main.3fa2b1c9d0.js
+        self._manifest: Dict[str, str] = {}
+        # 指纹路径 -> 可用编码集合
+        self._encodings: Dict[str, set] = {}
+        # 当前版本的输出目录（build_dir/<版本>），多个进程共用 build_dir 时互不覆盖
+        self._output_dir = self.build_dir
+
+    @property
+    def manifest(self) -> Dict[str, str]:
+        """获取资源清单"""
+        return dict(self._manifest)
+
+    @property
+    def version(self) -> str:
+        """资源清单的内容哈希，任一资源内容变化时改变"""
+        return manifest_version(self._manifest)
+
+    def asset_urls(self) -> List[str]:
+        """所有指纹化资源的访问 URL"""
+        return [f"{self.url_prefix}/{hashed}" for hashed in sorted(self._manifest.values())]
+
+    def build(self) -> Dict[str, str]:
+        """
+        构建所有静态资源：计算内容哈希，写出到按版本命名的子目录并生成压缩副本
+
+        同一版本已构建（例如另一个进程刚构建完成）时直接读取其清单；新版本先写入临时目录再原子地改名，
+        不会删除或覆盖其他进程（例如平滑重启时仍在排空的旧进程）正在使用的版本
+
+        Returns:
+            资源清单（逻辑路径 -> 指纹路径）
+        """
+        try:
+            sources: List[Tuple[str, str, bytes]] = []
+            for source in sorted(self.source_dir.rglob("*")):
+                if not source.is_file() or source.suffix.lower() not in FINGERPRINT_SUFFIXES:
+                    continue
+
+                content = source.read_bytes()
+                logical = source.relative_to(self.source_dir).as_posix()
+                digest = hashlib.sha256(content).hexdigest()[:10]
+                hashed = f"{logical[:-len(source.suffix)]}.{digest}{source.suffix}"
+                sources.append((logical, hashed, content))
+
+            manifest = {logical: hashed for logical, hashed, _ in sources}
+            version = manifest_version(manifest)
+            output_dir = self.build_dir / version
+
+            encodings = self._load_build(output_dir, manifest)
+            if encodings is None:
+                encodings = self._write_build(output_dir, manifest, sources)
+            else:
+                # 标记为最近使用，清理旧版本时保留
+                os.utime(output_dir)
+
+            self._manifest = manifest
+            self._encodings = encodings
+            self._output_dir = output_dir
+            logger.info(f"静态资源构建完成，共 {len(manifest)} 个文件，输出目录: {output_dir}")
+
+            self._prune_old_builds(version)
+
+        except Exception as e:
+            log_error(logger, e, "静态资源构建失败，回退到原始静态文件")
+            self._manifest = {}
+            self._encodings = {}
+
+        return self.manifest
+
+    @staticmethod
+    def _load_build(output_dir: Path, manifest: Dict[str, str]) -> Optional[Dict[str, set]]:
+        """读取已完成的版本目录的清单；不存在或与当前资源不一致时返回 None"""
+        try:
+            built = json.loads((output_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if built.get("files") != manifest:
+            return None
+        return {hashed: set(names) for hashed, names in (built.get("encodings") or {}).items()}
+
+    def _write_build(self, output_dir: Path, manifest: Dict[str, str],
+                     sources: List[Tuple[str, str, bytes]]) -> Dict[str, set]:
+        """写入临时目录后改名为版本目录"""
+        staging = self.build_dir / f".tmp-{output_dir.name}-{os.getpid()}"
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir(parents=True)
+
+        encodings: Dict[str, set] = {}
+        for _, hashed, content in sources:
+            target = staging / hashed
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(content)
+            encodings[hashed] = self._write_compressed(target, content)
+
+        (staging / MANIFEST_FILE).write_text(json.dumps({
+            "files": manifest,
+            "encodings": {hashed: sorted(names) for hashed, names in encodings.items()}
+        }, indent=2, sort_keys=True), encoding="utf-8")
+
+        try:
+            os.rename(staging, output_dir)
+        except OSError:
+            # 其他进程已先完成同一版本的构建，使用其结果
+            shutil.rmtree(staging, ignore_errors=True)
+            loaded = self._load_build(output_dir, manifest)
+            if loaded is None:
+                raise
+            return loaded
+        return encodings
+
+    def _prune_old_builds(self, current: str):
+        """删除较旧的版本目录（保留最近的几个）与遗留的临时目录"""
+        versions = []
+        now = time.time()
+        for path in self.build_dir.iterdir():
+            if not path.is_dir() or path.name == current:
+                continue
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if path.name.startswith(".tmp-"):
+                if now - mtime > STALE_BUILD_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif (path / MANIFEST_FILE).exists():
+                versions.append((mtime, path))
+
+        versions.sort(reverse=True)
+        for _, path in versions[KEEP_BUILD_VERSIONS - 1:]:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"已删除旧的静态资源版本: {path.name}")
+
+    def _write_compressed(self, target: Path, content: bytes) -> set:
+        """写出压缩副本，返回实际生成的编码集合"""
+        available = set()
+        if target.suffix.lower() not in COMPRESSIBLE_SUFFIXES or not content:
+            return available
+
+        candidates = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates["br"] = brotli.compress(content, quality=11)
+
+        for encoding, compressed in candidates.items():
+            if len(compressed) < len(content) * MIN_COMPRESSION_GAIN:
+                Path(f"{target}{ENCODING_SUFFIXES[encoding]}").write_bytes(compressed)
+                available.add(encoding)
+
+        return available
+
+    def url_for(self, logical_path: str) -> str:
+        """
+        获取资源的访问 URL
+
+        Args:
+            logical_path: 相对于静态目录的路径，例如 js/main.js
+
+        Returns:
+            指纹化 URL；资源未构建时返回原始静态路径
+        """
+        logical_path = logical_path.lstrip("/")
+        hashed = self._manifest.get(logical_path)
+        if hashed:
+            return f"{self.url_prefix}/{hashed}"
+        return f"{self.fallback_prefix}/{logical_path}"
+
+    def resolve(self, hashed_path: str, accept_encoding: Optional[str]) -> Optional[Tuple[Path, Optional[str]]]:
+        """
+        根据请求路径与 Accept-Encoding 选择要发送的文件
+
+        Args:
+            hashed_path: 指纹化路径
+            accept_encoding: 请求头 Accept-Encoding
+
+        Returns:
+            (文件路径, Content-Encoding)，资源不存在时返回 None
+        """
+        available = self._encodings.get(hashed_path)
+        if available is None:
+            return None
+
+        base = self._output_dir / hashed_path
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0)
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            if encoding in available and accepted.get(encoding, wildcard) > 0:
+                return Path(f"{base}{suffix}"), encoding
+
+        return base, None
@@ -0,0 +1,218 @@
+"""
+Web 服务器按需自动启动
+MCP 服务器连接不上同机 Web 服务器时启动 run.py，并轮询 /health 直到就绪。
+启动过程持有 TEMP_DIR 下的文件锁，多个 MCP 进程同时调用时只有一个会启动服务器，其余等待并复用
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 就绪探测间隔（秒）
+PROBE_INTERVAL = 0.05
+
+
+class AutostartError(RuntimeError):
+    """Web 服务器无法自动启动，消息将返回给调用方"""
+
+
+def _lock_file(f):
+    """阻塞获取文件排他锁"""
+    if os.name == "nt":
+        import msvcrt
+
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK 最多重试 10 秒，之后继续等待
+                continue
+    else:
+        import fcntl
+
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(f):
+    """释放文件锁"""
+    if os.name == "nt":
+        import msvcrt
+
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _process_alive(pid: int) -> bool:
+    """进程是否仍在运行"""
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        # Windows 上 os.kill(pid, 0) 会终止进程，无法安全探测，视为已退出
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_cmdline(pid: int) -> Optional[str]:
+    """进程的命令行（仅在有 /proc 的系统上可用）"""
+    try:
+        return Path(f"/proc/{pid}/cmdline").read_bytes().replace(b"\0", b" ").decode("utf-8", "replace")
+    except OSError:
+        return None
+
+
+def _is_starting_server(record: Dict, timeout: float) -> bool:
+    """
+    锁文件记录的进程是否是仍在启动中的 Web 服务器
+
+    PID 可能已被无关进程复用：启动时间超过就绪等待时间，或命令行中没有 run.py 时视为过期记录
+    """
+    pid = record.get("pid", 0)
+    if not _process_alive(pid):
+        return False
+    if time.time() - record.get("started_at", 0) > timeout:
+        return False
+    cmdline = _process_cmdline(pid)
+    return cmdline is None or "run.py" in cmdline
+
+
+class WebServerLauncher:
+    """启动并等待同机 Web 服务器就绪"""
+
+    def __init__(self, project_root: Path, temp_dir: str, port: int,
+                 env: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            project_root: 项目根目录（run.py 所在目录）
+            temp_dir: 锁文件与日志所在目录
+            port: Web 服务器端口
+            env: 传给 Web 服务器进程的额外环境变量
+        """
+        self.project_root = Path(project_root)
+        self.port = port
+        self.env = env or {}
+        base = Path(temp_dir)
+        base.mkdir(parents=True, exist_ok=True)
+        self.lock_path = base / f"web_server_{port}.lock"
+        self.log_path = base / f"web_server_{port}.log"
+
+    async def ensure_running(self, probe: Callable[[], Awaitable[bool]], timeout: float):
+        """
+        确保 Web 服务器正在运行：已就绪时直接返回，否则启动（或等待其他进程启动的）服务器
+
+        Args:
+            probe: 就绪探测（请求 /health），就绪时返回 True
+            timeout: 等待就绪的最长时间（秒）
+
+        Raises:
+            AutostartError: 启动失败或超时
+        """
+        lock = open(self.lock_path, "a+")
+        try:
+            # 锁在启动与就绪等待期间一直持有，其他 MCP 进程拿到锁时服务器已就绪
+            await asyncio.to_thread(_lock_file, lock)
+            if await probe():
+                return
+
+            record = self._read_record(lock)
+            if _is_starting_server(record, timeout):
+                # 之前启动的服务器仍在启动中，等待它而不是再启动一个
+                logger.info(f"Web 服务器进程 {record['pid']} 已存在，等待其就绪")
+                process = None
+            else:
+                process = self._spawn()
+                self._write_record(lock, {
+                    "pid": process.pid,
+                    "port": self.port,
+                    "started_at": time.time()
+                })
+
+            started = time.monotonic()
+            try:
+                await self._wait_ready(probe, process, timeout)
+            except AutostartError:
+                # 清除记录，下一次调用重新启动而不是继续等待同一个进程
+                self._write_record(lock, {})
+                raise
+            logger.info(f"Web 服务器已就绪，用时 {time.monotonic() - started:.2f}s")
+        finally:
+            try:
+                _unlock_file(lock)
+            except OSError:
+                pass
+            lock.close()
+
+    def _spawn(self) -> subprocess.Popen:
+        """在独立会话中启动 run.py，MCP 服务器退出后 Web 服务器继续运行"""
+        env = {**os.environ, **self.env, "WEB_PORT": str(self.port)}
+        kwargs = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = (subprocess.DETACHED_PROCESS |
+                                       subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            kwargs["start_new_session"] = True
+
+        with open(self.log_path, "ab") as log:
+            process = subprocess.Popen(
+                [sys.executable, str(self.project_root / "run.py")],
+                cwd=str(self.project_root),
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                **kwargs
+            )
+        logger.info(f"已启动 Web 服务器进程 (PID: {process.pid})，日志: {self.log_path}")
+        return process
+
+    async def _wait_ready(self, probe: Callable[[], Awaitable[bool]],
+                          process: Optional[subprocess.Popen], timeout: float):
+        """轮询就绪探测，进程提前退出时立即失败"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if await probe():
+                return
+            if process is not None and process.poll() is not None:
+                raise AutostartError(
+                    f"Web 服务器启动失败（退出码 {process.returncode}），请查看日志: {self.log_path}")
+            if time.monotonic() >= deadline:
+                raise AutostartError(
+                    f"Web 服务器在 {timeout:.0f} 秒内未就绪，请查看日志: {self.log_path}")
+            await asyncio.sleep(PROBE_INTERVAL)
+
+    @staticmethod
+    def _read_record(lock) -> Dict:
+        """读取锁文件中记录的服务器进程信息"""
+        try:
+            lock.seek(0)
+            return json.loads(lock.read() or "{}")
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def _write_record(lock, record: Dict):
+        """记录启动的服务器进程信息"""
+        lock.seek(0)
+        lock.truncate()
+        lock.write(json.dumps(record))
+        lock.flush()
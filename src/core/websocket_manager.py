@@ -3,16 +3,59 @@ WebSocket 连接管理器
 """
 
 import asyncio
+import itertools
 import json
+import threading
+import time
 import weakref
-from typing import Dict, List, Optional, Set
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Set, Tuple, Union
 from datetime import datetime
 
 from fastapi import WebSocket, WebSocketDisconnect
+from src.core.blob_store import BlobStore, hash_image_data
+from src.core.chunked_upload import ChunkedUploadStore, UploadError
+from src.core.feedback_questions import validate_answers
+from src.core.image_handoff import SharedImageStore
+from src.core.image_pipeline import ImagePipeline
+from src.core.message_replay import ReplayLog
+from src.core.rate_limit import RateLimiter
+from src.core.ws_compression import PayloadCodec, CompressionError, PAYLOAD_ENCODING
+from src.utils.config import Config
+from src.utils.i18n import get_text
+from src.utils.image_format import (
+    FORMAT_EXTENSIONS, SNIFF_BYTES, inspect_base64_image, sniff_image_format)
 from src.utils.logger import setup_logger, log_request, log_error
+from src.utils.memory_profile import container_usage
 
+config = Config()
 logger = setup_logger(__name__)
 
+# 需要读取或写入反馈存储的消息类型（平滑重启时须等旧进程的状态到达后再处理）
+STATEFUL_MESSAGE_TYPES = {"feedback_submit", "feedback_images", "feedback_cancel"}
+
+# WebSocket 关闭码：服务重启，客户端应立即重连
+CLOSE_SERVICE_RESTART = 1012
+
+# 记住已取消的请求ID数量上限，取消后迟到的提交会被拒绝而不是存储
+MAX_CANCELLED_REQUESTS = 1024
+
+# 请求摘要在队列中显示的最大长度
+MAX_SUMMARY_LENGTH = 200
+
+# 不编号、不补发的消息：连接握手、心跳及只对当前连接有意义的即时回复
+UNSEQUENCED_MESSAGE_TYPES = {
+    "connection_established", "resume", "heartbeat_request", "heartbeat_response",
+    "upload_ack", "upload_error", "blob_check_result", "rate_limited", "server_restarting"
+}
+
+# 使用单独限流预算的消息：分块上传与反馈提交由确认驱动，不应被其他消息挤占；心跳维持连接状态
+TRANSFER_MESSAGE_TYPES = {"upload_begin", "upload_chunk", "feedback_submit", "feedback_images", "heartbeat"}
+
+# 客户端会话ID的最大长度
+MAX_SESSION_ID_LENGTH = 64
+
 
 class WebSocketManager:
     """WebSocket 连接管理器"""
@@ -21,14 +64,287 @@ class WebSocketManager:
         # 使用弱引用集合存储活跃连接
         self._connections: Set[WebSocket] = set()
         self._connection_info: Dict[WebSocket, Dict] = {}
+        self._codecs: Dict[WebSocket, PayloadCodec] = {}
         self._heartbeat_task: Optional[asyncio.Task] = None
         self._heartbeat_interval = 30  # 心跳间隔（秒）
         self._feedback_storage: Optional[Dict] = None
+        # 等待反馈结果的 (Future, 是否只等待最终结果)，可跨事件循环/线程等待（嵌入模式下由 MCP 线程等待）
+        self._feedback_waiters: Dict[str, List[Tuple[Future, bool]]] = {}
+        self._waiters_lock = threading.Lock()
+        # 每个请求的附加选项（例如图片交接方式）
+        self._request_options: Dict[str, Dict] = {}
+        # 已广播、尚未完成的请求；已取消的请求ID
+        self._pending_requests: Dict[str, Dict] = {}
+        self._cancelled_requests: "OrderedDict[str, None]" = OrderedDict()
+        # 结果写入时间，超过 FEEDBACK_RESULT_TTL 的结果在心跳循环中删除
+        self._result_stored_at: Dict[str, float] = {}
+        # 请求到达顺序，优先级与截止时间相同时先到先答
+        self._request_seq = itertools.count()
+        self._image_store: Optional[SharedImageStore] = None
+        self._image_pipeline: Optional[ImagePipeline] = None
+        self._upload_store: Optional[ChunkedUploadStore] = None
+        # 内容寻址图片存储，重复上传的图片只保存、处理一次
+        self._blob_store = BlobStore(config.BLOB_STORE_MAX_BYTES)
+        # 平滑重启：从旧进程接管后，收到旧进程交接的状态前暂缓处理依赖该状态的消息
+        self._handoff_state_ready: Optional[asyncio.Event] = None
+        # 每个连接的消息限流，以及已收到限流通知、尚未恢复的连接（每次被限流只通知一次）
+        self._message_limiter = RateLimiter(config.WS_RATE_LIMIT, config.WS_RATE_BURST)
+        self._transfer_limiter = RateLimiter(config.WS_TRANSFER_RATE_LIMIT, config.WS_TRANSFER_RATE_BURST)
+        self._throttled: Set[WebSocket] = set()
+        # 消息序号与按会话的补发缓冲区
+        self._replay = ReplayLog(config.WS_REPLAY_BUFFER, config.WS_SESSION_TTL)
 
     def set_feedback_storage(self, feedback_storage: Dict):
         """设置反馈存储引用"""
         self._feedback_storage = feedback_storage
 
+    def _get_image_store(self) -> SharedImageStore:
+        """获取共享内存图片存储（首次使用时创建）"""
+        if self._image_store is None:
+            # 文件随结果一起删除；按时间清理只针对异常退出遗留的文件，不早于结果过期
+            self._image_store = SharedImageStore(
+                config.TEMP_DIR, max(config.IMAGE_HANDOFF_TTL, config.FEEDBACK_RESULT_TTL),
+                config.IMAGE_HANDOFF_DIR)
+        return self._image_store
+
+    def _get_upload_store(self) -> ChunkedUploadStore:
+        """获取分块上传存储（首次使用时创建）"""
+        if self._upload_store is None:
+            self._upload_store = ChunkedUploadStore(config.TEMP_DIR, config.UPLOAD_TTL)
+        return self._upload_store
+
+    def _get_image_pipeline(self) -> ImagePipeline:
+        """获取图片规范化管道（首次使用时创建）"""
+        if self._image_pipeline is None:
+            self._image_pipeline = ImagePipeline(
+                max_dimension=config.IMAGE_MAX_DIMENSION,
+                output_format=config.IMAGE_OUTPUT_FORMAT,
+                quality=config.IMAGE_QUALITY,
+                workers=config.IMAGE_WORKERS
+            )
+        return self._image_pipeline
+
+    async def request_feedback(self, request_id: str, timeout: int, language: str = "CN",
+                               image_handoff: Optional[str] = None, priority: int = 0,
+                               summary: Optional[str] = None,
+                               caller: Optional[str] = None,
+                               questions: Optional[List[Dict]] = None) -> Dict:
+        """
+        向所有客户端广播反馈请求，并加入待处理队列
+
+        Args:
+            request_id: 请求ID
+            timeout: 超时时间（秒）
+            language: 语言代码
+            image_handoff: 图片交接方式，"shm" 表示写入共享内存并只返回描述符
+            priority: 优先级，数值越大越靠前
+            summary: 在队列中显示的简短说明
+            caller: 发起请求的调用方标识
+            questions: 批量问题（已规范化），用户在同一表单中回答后一次提交
+
+        Returns:
+            已广播的请求数据
+        """
+        if image_handoff:
+            self._request_options[request_id] = {"image_handoff": image_handoff}
+
+        request_data = {
+            "type": "request_feedback",
+            "id": request_id,
+            "timestamp": datetime.now().isoformat(),
+            "timeout": timeout,
+            "language": language,
+            "priority": int(priority or 0),
+            "deadline": time.time() + timeout,
+            "summary": (summary or "")[:MAX_SUMMARY_LENGTH],
+            "caller": caller or "",
+            "questions": questions or [],
+            "seq": next(self._request_seq)
+        }
+
+        self._pending_requests[request_id] = request_data
+        await self.broadcast_message(request_data)
+        await self._broadcast_queue()
+        return request_data
+
+    def get_request_queue(self) -> List[Dict]:
+        """
+        获取等待用户回答的请求，按优先级（高在前）、截止时间（早在前）、到达顺序排序。
+        已提交文字、只等图片的请求不在队列中；已过截止时间的请求调用方已放弃等待，直接移除
+
+        Returns:
+            请求数据列表
+        """
+        now = time.time()
+        storage = self._feedback_storage or {}
+        queue = []
+        for request_id, request_data in list(self._pending_requests.items()):
+            if request_id in storage:
+                continue
+            # 旧进程交接来的请求可能没有截止时间
+            if request_data.get("deadline", now + 1) <= now:
+                self._pending_requests.pop(request_id, None)
+                continue
+            queue.append(request_data)
+
+        queue.sort(key=lambda r: (-r.get("priority", 0), r.get("deadline", now), r.get("seq", 0)))
+        return queue
+
+    def _queue_message(self) -> Dict:
+        """队列快照消息"""
+        return {
+            "type": "request_queue",
+            "requests": self.get_request_queue(),
+            # 客户端据此校正时钟差，计算剩余时间
+            "server_time": time.time(),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def _broadcast_queue(self):
+        """队列变化（新请求、提交、取消）时向所有客户端发送队列快照（正在重连的会话重连后补发）"""
+        await self.broadcast_message(self._queue_message())
+
+    async def cancel_request(self, request_id: str, reason: str = "cancelled") -> bool:
+        """
+        调用方取消或放弃等待：通知收到请求的客户端关闭表单，并立即释放请求占用的资源
+
+        Args:
+            request_id: 请求ID
+            reason: cancelled 或 timeout
+
+        Returns:
+            是否存在待处理的请求或已存储的结果
+        """
+        existed = self._drop_request(request_id)
+
+        self._cancelled_requests[request_id] = None
+        if len(self._cancelled_requests) > MAX_CANCELLED_REQUESTS:
+            self._cancelled_requests.popitem(last=False)
+
+        dismissal = {
+            "type": "request_timeout" if reason == "timeout" else "request_cancelled",
+            "request_id": request_id,
+            "message": "请求已超时" if reason == "timeout" else "调用方已取消请求",
+            "timestamp": datetime.now().isoformat()
+        }
+        if existed:
+            # 发给所有当前连接（重连的标签页、广播后才打开的标签页都可能显示着该请求），
+            # 并记入各会话的缓冲区，正在重连的会话重连后补发；客户端忽略不认识的请求ID
+            await self.broadcast_message(dismissal)
+            await self._broadcast_queue()
+
+        logger.info(f"请求已被调用方取消，请求ID: {request_id}, 原因: {reason}")
+        return existed
+
+    def _drop_request(self, request_id: str) -> bool:
+        """删除请求的待处理记录与已存储结果，释放图片引用与共享内存文件"""
+        pending = self._pending_requests.pop(request_id, None)
+        self._request_options.pop(request_id, None)
+        self._result_stored_at.pop(request_id, None)
+
+        with self._waiters_lock:
+            result = self._feedback_storage.pop(request_id, None) if self._feedback_storage is not None else None
+            waiters = self._feedback_waiters.pop(request_id, [])
+
+        # 仍在等待的调用方（例如 get_feedback_images）得到取消结果，而不是一直等到超时
+        cancelled = {"status": "cancelled", "data": {"reason": "调用方已取消请求"}}
+        for future, _ in waiters:
+            if not future.done():
+                future.set_result(cancelled)
+
+        if result:
+            self._release_result(result)
+
+        return pending is not None or result is not None
+
+    def _release_result(self, result: Dict):
+        """释放被删除或被替换的结果中图片持有的存储引用与共享内存文件"""
+        images = (result.get("data") or {}).get("images") or []
+        for image in images:
+            if image.get("hash"):
+                self._blob_store.release(image["hash"])
+        if self._image_store is not None:
+            self._image_store.release(images)
+
+    def _expire_results(self):
+        """删除超过保留时间的结果，释放图片引用与共享内存文件"""
+        deadline = time.monotonic() - config.FEEDBACK_RESULT_TTL
+        expired = [request_id for request_id, stored_at in self._result_stored_at.items()
+                   if stored_at < deadline]
+        for request_id in expired:
+            self._drop_request(request_id)
+        if expired:
+            logger.info(f"已删除过期的反馈结果: {len(expired)} 个")
+
+    async def _reject_cancelled(self, websocket: WebSocket, request_id: str) -> bool:
+        """请求已被调用方取消时通知客户端并返回 True，提交不再存储"""
+        if request_id not in self._cancelled_requests:
+            return False
+        logger.info(f"忽略已取消请求的提交，请求ID: {request_id}")
+        await self.send_to_client(websocket, {
+            "type": "request_cancelled",
+            "request_id": request_id,
+            "message": "调用方已取消请求"
+        })
+        return True
+
+    def wait_for_feedback(self, request_id: str, final: bool = True) -> Future:
+        """
+        获取在反馈结果写入时被设置结果的 Future（线程安全）
+
+        Args:
+            request_id: 请求ID
+            final: 为 True 时只在完成或取消时设置结果；为 False 时只提交了文字（partial）也会设置
+
+        Returns:
+            concurrent.futures.Future，结果为反馈存储中的条目
+        """
+        future: Future = Future()
+        with self._waiters_lock:
+            result = (self._feedback_storage or {}).get(request_id)
+            if result is not None and self._satisfies(result, final):
+                future.set_result(result)
+            else:
+                self._feedback_waiters.setdefault(request_id, []).append((future, final))
+        return future
+
+    @staticmethod
+    def _satisfies(result: Dict, final: bool) -> bool:
+        """结果是否满足等待条件"""
+        return not final or result.get("status") != "partial"
+
+    def discard_feedback_waiter(self, request_id: str, future: Future):
+        """移除不再等待的 Future（例如等待超时）"""
+        with self._waiters_lock:
+            waiters = [w for w in self._feedback_waiters.get(request_id, []) if w[0] is not future]
+            if waiters:
+                self._feedback_waiters[request_id] = waiters
+            else:
+                self._feedback_waiters.pop(request_id, None)
+
+    def _store_feedback_result(self, request_id: str, result: Dict):
+        """写入反馈存储并唤醒条件已满足的等待者"""
+        if result.get("status") != "partial":
+            self._pending_requests.pop(request_id, None)
+
+        with self._waiters_lock:
+            previous = self._feedback_storage.get(request_id)
+            self._feedback_storage[request_id] = result
+            waiters = self._feedback_waiters.pop(request_id, [])
+            ready = [future for future, final in waiters if self._satisfies(result, final)]
+            remaining = [(future, final) for future, final in waiters if not self._satisfies(result, final)]
+            if remaining:
+                self._feedback_waiters[request_id] = remaining
+
+        self._result_stored_at[request_id] = time.monotonic()
+        # 重新提交替换了旧结果：释放旧结果持有的图片引用与共享内存文件（每次提交写入各自的文件）
+        if previous is not None and previous is not result:
+            self._release_result(previous)
+
+        for future in ready:
+            if not future.done():
+                future.set_result(result)
+
     async def connect(self, websocket: WebSocket, client_info: Optional[Dict] = None):
         """
         管理新的WebSocket连接（连接应该已经被接受）
@@ -38,18 +354,32 @@ class WebSocketManager:
             client_info: 客户端信息
         """
         try:
-            # 注意：WebSocket 连接应该在调用此方法之前已经被接受
-            self._connections.add(websocket)
+            # 注意：WebSocket 连接应该在调用此方法之前已经被接受；补发完错过的消息后才加入连接集合，
+            # 期间的广播先进入会话缓冲区，随补发一起按序发送
 
             # 存储连接信息
             info = {
                 "connected_at": datetime.now().isoformat(),
                 "client_info": client_info or {},
-                "last_heartbeat": datetime.now().isoformat()
+                "last_heartbeat": datetime.now().isoformat(),
+                "rate_limited": 0
             }
             self._connection_info[websocket] = info
 
-            logger.info(f"新的WebSocket连接已建立，当前连接数: {len(self._connections)}")
+            # 客户端声明支持负载压缩且服务器启用时，对该连接压缩大消息
+            codec = PayloadCodec(
+                enabled=(config.WS_COMPRESSION == "payload" and
+                         info["client_info"].get("compression") == PAYLOAD_ENCODING),
+                threshold=config.WS_COMPRESSION_THRESHOLD,
+                level=config.WS_COMPRESSION_LEVEL,
+                max_message_size=config.WS_MAX_MESSAGE_SIZE
+            )
+            self._codecs[websocket] = codec
+
+            # 客户端带有会话ID时为连接编号消息，重连时补发错过的消息
+            session_id = str(info["client_info"].get("session") or "")[:MAX_SESSION_ID_LENGTH]
+            session = self._replay.attach(session_id, websocket) \
+                if session_id and self._replay.enabled else None
 
             # 启动心跳任务（如果还没有启动）
             if self._heartbeat_task is None or self._heartbeat_task.done():
@@ -57,16 +387,76 @@ class WebSocketManager:
                     self._heartbeat_loop())
 
             # 发送连接确认消息
-            await self.send_to_client(websocket, {
+            await self._send_frame(websocket, json.dumps({
                 "type": "connection_established",
                 "timestamp": datetime.now().isoformat(),
-                "message": "WebSocket连接已建立"
-            })
+                "message": "WebSocket连接已建立",
+                "compression": {
+                    "encoding": PAYLOAD_ENCODING,
+                    "threshold": codec.threshold
+                } if codec.enabled else None,
+                "replay": {"epoch": self._replay.epoch} if session else None
+            }, ensure_ascii=False))
+
+            complete, replayed = False, 0
+            if session:
+                complete, replayed = await self._resume_session(websocket, session, info["client_info"])
+
+            self._connections.add(websocket)
+            logger.info(f"新的WebSocket连接已建立，当前连接数: {len(self._connections)}")
+
+            if session:
+                await self.send_to_client(websocket, {
+                    "type": "resume",
+                    "complete": complete,
+                    "replayed": replayed,
+                    "last_seq": self._replay.last_seq
+                })
+            # 补发不完整（新会话、缓冲区已覆盖或服务器已重启）时发送完整的队列快照
+            if not complete:
+                await self.send_to_client(websocket, self._queue_message())
 
         except Exception as e:
             log_error(logger, e, "WebSocket连接建立失败")
+            await self.disconnect(websocket)
             raise
 
+    async def _resume_session(self, websocket: WebSocket, session,
+                              client_info: Dict) -> Tuple[bool, int]:
+        """
+        补发会话在 last_seq 之后错过的消息
+
+        Returns:
+            (是否完整, 补发条数)
+        """
+        # 序号只在同一服务器实例内有效
+        try:
+            last_seq = int(client_info.get("last_seq") or 0)
+        except (TypeError, ValueError):
+            last_seq = 0
+        if client_info.get("epoch") != self._replay.epoch:
+            last_seq = 0
+
+        missed, complete = session.since(last_seq)
+        if not complete:
+            # 缺口无法补全，改为发送完整状态
+            self._replay.incomplete_resumes += 1
+            return False, 0
+
+        replayed = 0
+        # 补发期间到达的新消息也进入缓冲区，循环直到追上；最后一次检查与加入连接集合之间没有 await
+        while missed:
+            for seq, message in missed:
+                await self._send_frame(websocket, message)
+                last_seq = seq
+                replayed += 1
+            missed = session.since(last_seq)[0]
+
+        self._replay.replayed += replayed
+        if replayed:
+            logger.info(f"已补发 {replayed} 条消息，会话: {session.session_id}")
+        return True, replayed
+
     async def disconnect(self, websocket: WebSocket):
         """
         断开WebSocket连接
@@ -81,6 +471,15 @@ class WebSocketManager:
             if websocket in self._connection_info:
                 del self._connection_info[websocket]
 
+            self._message_limiter.forget(websocket)
+            self._transfer_limiter.forget(websocket)
+            self._throttled.discard(websocket)
+            self._replay.detach(websocket)
+
+            codec = self._codecs.pop(websocket, None)
+            if codec and codec.enabled:
+                logger.info(f"连接压缩统计: {codec.stats.to_dict()}")
+
             logger.info(f"WebSocket连接已断开，当前连接数: {len(self._connections)}")
 
         except Exception as e:
@@ -95,9 +494,21 @@ class WebSocketManager:
             data: 要发送的数据
         """
         try:
-            if websocket in self._connections:
+            # 发给正在重连的会话的消息记入缓冲区，重连后补发
+            session = self._replay.session_for(websocket) \
+                if data.get("type") not in UNSEQUENCED_MESSAGE_TYPES else None
+            if websocket not in self._connections and session is None:
+                return
+
+            if session is not None:
+                seq = self._replay.next_seq()
+                message = json.dumps({**data, "seq": seq}, ensure_ascii=False)
+                self._replay.record(websocket, seq, message)
+            else:
                 message = json.dumps(data, ensure_ascii=False)
-                await websocket.send_text(message)
+
+            if websocket in self._connections:
+                await self._send_frame(websocket, message)
 
         except WebSocketDisconnect:
             await self.disconnect(websocket)
@@ -111,16 +522,29 @@ class WebSocketManager:
         Args:
             data: 要广播的数据
         """
+        # 编号后的广播对所有会话只序列化一次，记入各会话的缓冲区（包括正在重连的会话）
+        if self._replay.enabled and data.get("type") not in UNSEQUENCED_MESSAGE_TYPES:
+            seq = self._replay.next_seq()
+            message = json.dumps({**data, "seq": seq}, ensure_ascii=False)
+            self._replay.record_broadcast(seq, message)
+        else:
+            message = json.dumps(data, ensure_ascii=False)
+
         if not self._connections:
             logger.warning("没有活跃的WebSocket连接，无法广播消息")
             return
 
-        message = json.dumps(data, ensure_ascii=False)
+        raw = message.encode("utf-8")
+        compressed: Optional[bytes] = None
         disconnected_clients = []
 
         for websocket in self._connections.copy():
             try:
-                await websocket.send_text(message)
+                # 同一条广播只压缩一次
+                codec = self._codecs.get(websocket)
+                if compressed is None and codec and codec.should_compress(raw):
+                    compressed = codec.compress(raw)
+                await self._send_frame(websocket, message, compressed)
             except WebSocketDisconnect:
                 disconnected_clients.append(websocket)
             except Exception as e:
@@ -133,6 +557,93 @@ class WebSocketManager:
 
         logger.info(f"消息已广播到 {len(self._connections)} 个客户端")
 
+    async def _send_frame(self, websocket: WebSocket, message: str,
+                          compressed: Optional[bytes] = None):
+        """按连接的压缩设置发送文本帧或压缩后的二进制帧"""
+        codec = self._codecs.get(websocket)
+        frame = codec.encode(message, compressed) if codec else message
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+
+    async def handle_client_frame(self, websocket: WebSocket, frame: Union[str, bytes]):
+        """
+        解码客户端帧（可能是压缩后的二进制帧）并处理
+
+        Args:
+            websocket: WebSocket连接对象
+            frame: 文本帧或二进制帧内容
+        """
+        codec = self._codecs.get(websocket)
+        try:
+            if codec:
+                message = codec.decode(frame)
+            elif isinstance(frame, bytes):
+                raise CompressionError("该连接未启用负载压缩")
+            else:
+                message = frame
+        except (CompressionError, UnicodeDecodeError) as e:
+            logger.error(f"无法解码客户端消息: {e}")
+            await self.send_to_client(websocket, {
+                "type": "error",
+                "message": f"无法解码消息: {e}"
+            })
+            return
+
+        await self.handle_client_message(websocket, message)
+
+    async def _admit(self, websocket: WebSocket, data: Dict) -> bool:
+        """
+        按消息类型限流：上传、提交与心跳使用单独的预算，不会因其他消息过多而被丢弃
+
+        Returns:
+            是否处理该消息
+        """
+        transfer = data.get("type") in TRANSFER_MESSAGE_TYPES
+        limiter = self._transfer_limiter if transfer else self._message_limiter
+        retry_after = limiter.check(websocket)
+        if not retry_after:
+            if not transfer:
+                self._throttled.discard(websocket)
+            return True
+
+        info = self._connection_info.get(websocket)
+        if info is not None:
+            info["rate_limited"] += 1
+
+        if transfer:
+            await self._reject_transfer(websocket, data, retry_after)
+        else:
+            await self._reject_rate_limited(websocket, retry_after)
+        return False
+
+    async def _reject_transfer(self, websocket: WebSocket, data: Dict, retry_after: float):
+        """上传数据块或提交被限流：逐条回复消息类型与ID，客户端等待后重发，而不是等到确认超时"""
+        reply = {
+            "type": "rate_limited",
+            "message_type": data.get("type"),
+            "message": "消息过于频繁，请稍后重发",
+            "retry_after": round(retry_after, 3)
+        }
+        for key in ("upload_id", "request_id"):
+            if data.get(key):
+                reply[key] = data[key]
+        if "upload_id" in reply or "request_id" in reply:
+            await self.send_to_client(websocket, reply)
+
+    async def _reject_rate_limited(self, websocket: WebSocket, retry_after: float):
+        """丢弃超出限流的消息；连续被限流时只通知客户端一次"""
+        if websocket in self._throttled:
+            return
+        self._throttled.add(websocket)
+        logger.warning(f"客户端消息过于频繁，已限流（{self._message_limiter.rate:g} 条/秒）")
+        await self.send_to_client(websocket, {
+            "type": "rate_limited",
+            "message": "消息过于频繁，部分消息已被丢弃",
+            "retry_after": round(retry_after, 3)
+        })
+
     async def handle_client_message(self, websocket: WebSocket, message: str):
         """
         处理客户端发送的消息
@@ -143,14 +654,27 @@ class WebSocketManager:
         """
         try:
             data = json.loads(message)
+            if not isinstance(data, dict) or not await self._admit(websocket, data):
+                return
             message_type = data.get("type")
 
+            if message_type in STATEFUL_MESSAGE_TYPES:
+                await self._wait_for_handoff_state()
+
             if message_type == "heartbeat":
                 await self._handle_heartbeat(websocket, data)
             elif message_type == "feedback_submit":
                 await self._handle_feedback_submission(websocket, data)
+            elif message_type == "feedback_images":
+                await self._handle_feedback_images(websocket, data)
             elif message_type == "feedback_cancel":
                 await self._handle_feedback_cancellation(websocket, data)
+            elif message_type == "blob_check":
+                await self._handle_blob_check(websocket, data)
+            elif message_type == "upload_begin":
+                await self._handle_upload_begin(websocket, data)
+            elif message_type == "upload_chunk":
+                await self._handle_upload_chunk(websocket, data)
 
             elif message_type == "request_feedback":
                 # request_feedback 应该由服务器发送到客户端，而不是从客户端接收
@@ -167,7 +691,8 @@ class WebSocketManager:
                 })
 
         except json.JSONDecodeError:
-            logger.error(f"收到无效的JSON消息: {message}")
+            # 消息可能很大，只记录开头部分
+            logger.error(f"收到无效的JSON消息: {message[:200]}")
             await self.send_to_client(websocket, {
                 "type": "error",
                 "message": "无效的JSON格式"
@@ -202,35 +727,378 @@ class WebSocketManager:
             return
 
         request_id = data.get("request_id")
+        if request_id and await self._reject_cancelled(websocket, request_id):
+            return
         if request_id:
-            # 存储反馈数据
-            self._feedback_storage[request_id] = {
-                "status": "completed",
-                "data": {
-                    "text": data.get("text", ""),
-                    "images": data.get("images", []),
-                    "auto_append": data.get("auto_append", True),
-                    "language": data.get("language", "CN"),
-                    "timestamp": data.get("timestamp", datetime.now().isoformat())
-                },
-                "completed_at": datetime.now().isoformat()
+            language = data.get("language", "CN")
+            images_pending = int(data.get("images_pending") or 0)
+
+            feedback_data = {
+                "text": data.get("text", ""),
+                "images": [],
+                "auto_append": data.get("auto_append", True),
+                "language": language,
+                "timestamp": data.get("timestamp", datetime.now().isoformat())
             }
 
-            logger.info(
-                f"反馈已存储，请求ID: {request_id}, 自动附加: {data.get('auto_append', True)}")
+            # 批量问题的答案随文字一起提交，校验不通过时拒绝整个提交，用户修改后重新提交
+            questions = (self._pending_requests.get(request_id) or {}).get("questions")
+            if questions:
+                answers, errors = validate_answers(questions, data.get("answers"), language)
+                if errors:
+                    logger.warning(f"拒绝反馈提交，请求ID: {request_id}, 原因: {errors}")
+                    await self.send_to_client(websocket, {
+                        "type": "feedback_rejected",
+                        "request_id": request_id,
+                        "message": get_text("answers_rejected", language),
+                        "errors": errors
+                    })
+                    return
+                feedback_data["questions"] = questions
+                feedback_data["answers"] = answers
+
+            if images_pending:
+                # 分阶段提交：先提交文字，图片上传完成后通过 feedback_images 补充
+                feedback_data["images_pending"] = images_pending
+                self._store_feedback_result(request_id, {
+                    "status": "partial",
+                    "data": feedback_data,
+                    "partial_at": datetime.now().isoformat()
+                })
+                logger.info(f"文字反馈已提交，请求ID: {request_id}, 待上传图片: {images_pending}")
+            else:
+                images = await self._prepare_submitted_images(
+                    websocket, request_id, data.get("images", []), language)
+                if images is None:
+                    return
+
+                # 存储反馈数据
+                feedback_data["images"] = images
+                self._store_feedback_result(request_id, {
+                    "status": "completed",
+                    "data": feedback_data,
+                    "completed_at": datetime.now().isoformat()
+                })
+
+                logger.info(
+                    f"反馈已存储，请求ID: {request_id}, 自动附加: {data.get('auto_append', True)}")
 
             # 向客户端发送确认
             await self.send_to_client(websocket, {
                 "type": "feedback_received",
                 "request_id": request_id,
-                "status": "success"
+                "status": "success",
+                "partial": bool(images_pending)
             })
+            await self._broadcast_queue()
         else:
             await self.send_to_client(websocket, {
                 "type": "error",
                 "message": "缺少请求ID"
             })
 
+    async def _handle_feedback_images(self, websocket: WebSocket, data: Dict):
+        """处理分阶段提交的图片部分：补充到已提交的文字反馈并完成请求"""
+        request_id = data.get("request_id")
+        if await self._reject_cancelled(websocket, request_id):
+            return
+        partial = (self._feedback_storage or {}).get(request_id)
+        if not partial or partial.get("status") != "partial":
+            await self.send_to_client(websocket, {
+                "type": "error",
+                "message": "没有等待图片的反馈请求"
+            })
+            return
+
+        language = partial["data"].get("language", "CN")
+        images = await self._prepare_submitted_images(
+            websocket, request_id, data.get("images", []), language)
+        if images is None:
+            return
+
+        # 客户端未能上传的图片以错误条目返回给调用方
+        for failed in data.get("failed") or []:
+            images.append({
+                "name": failed.get("name"),
+                "data": "",
+                "error": failed.get("message") or "上传失败"
+            })
+
+        feedback_data = {k: v for k, v in partial["data"].items() if k != "images_pending"}
+        feedback_data["images"] = images
+        self._store_feedback_result(request_id, {
+            "status": "completed",
+            "data": feedback_data,
+            "completed_at": datetime.now().isoformat()
+        })
+        logger.info(f"反馈图片已补充，请求ID: {request_id}, 图片数: {len(images)}")
+
+        await self.send_to_client(websocket, {
+            "type": "feedback_received",
+            "request_id": request_id,
+            "status": "success",
+            "partial": False
+        })
+
+    async def _prepare_submitted_images(self, websocket: WebSocket, request_id: str,
+                                        images: List[Dict], language: str) -> Optional[List[Dict]]:
+        """
+        校验并处理一次提交中的图片
+
+        Returns:
+            处理后的图片列表；校验未通过时返回 None（已向客户端发送拒绝说明）
+        """
+        # 在解码、哈希和规范化之前校验大小与格式，拒绝的提交不会结束请求，用户可修改后重新提交
+        errors = self._validate_images(images, language)
+        if errors:
+            logger.warning(f"拒绝反馈提交，请求ID: {request_id}, 原因: {errors}")
+            await self.send_to_client(websocket, {
+                "type": "feedback_rejected",
+                "request_id": request_id,
+                "message": get_text("upload_rejected", language),
+                "errors": errors
+            })
+            return None
+
+        # 只携带哈希的图片：查询后可能已被淘汰（或服务器刚从旧进程接管），要求客户端重新上传这些图片，
+        # 而不是存储一个错误条目；仍在存储中的先持有引用，之后的等待期间不会被淘汰
+        referenced = [image["hash"] for image in images
+                      if not image.get("data") and not image.get("upload_id") and image.get("hash")]
+        missing = sorted(set(referenced) - set(self._blob_store.known(referenced)))
+        if missing:
+            logger.info(f"图片已不在服务器缓存中，要求重新上传，请求ID: {request_id}, 数量: {len(missing)}")
+            await self.send_to_client(websocket, {
+                "type": "feedback_rejected",
+                "request_id": request_id,
+                "message": get_text("images_resend", language),
+                "missing_hashes": missing
+            })
+            return None
+        for content_hash in referenced:
+            self._blob_store.acquire(content_hash)
+
+        try:
+            # 分块上传的图片在校验通过后才取出，被拒绝时用户仍可引用已上传的数据重新提交
+            if any(image.get("upload_id") for image in images):
+                images = await asyncio.to_thread(self._take_uploads, images)
+
+            # 按内容哈希去重，并在进程池中校验、生成规范化版本（原图保留）
+            if images:
+                images = await self._ingest_images(images)
+        except Exception:
+            for content_hash in referenced:
+                self._blob_store.release(content_hash)
+            raise
+
+        # 同机 MCP 请求了共享内存交接时，图片字节只写一次，结果中只保留描述符（解码与写入在线程中执行）
+        # 选项保留到请求被删除，同一请求的再次提交（例如先提交文字再补充图片）仍使用共享内存
+        options = self._request_options.get(request_id, {})
+        if options.get("image_handoff") == "shm" and images:
+            images = await asyncio.to_thread(self._get_image_store().write_images, request_id, images)
+
+        return images
+
+    def _image_problem(self, name: Optional[str], size: int, image_format: Optional[str],
+                       language: str, check_format: bool = True) -> Optional[str]:
+        """
+        检查单张图片的扩展名、大小与格式
+
+        Args:
+            name: 文件名（没有文件名时不检查扩展名）
+            size: 解码后的字节数
+            image_format: 根据文件头识别的格式
+            language: 说明的语言
+            check_format: 是否检查格式（分块上传开始时尚未收到数据）
+
+        Returns:
+            不合格时的说明
+        """
+        allowed = ", ".join(config.ALLOWED_EXTENSIONS)
+        display_name = name or "image"
+
+        if name and not config.is_allowed_file_extension(name):
+            return get_text("image_extension_not_allowed", language).format(
+                name=display_name, allowed=allowed)
+        if size > config.MAX_FILE_SIZE:
+            return get_text("image_too_large_detail", language).format(
+                name=display_name, size=size, limit=config.MAX_FILE_SIZE)
+        if not check_format:
+            return None
+        if image_format is None:
+            return get_text("image_format_not_recognized", language).format(name=display_name)
+        if not set(FORMAT_EXTENSIONS[image_format]) & set(config.ALLOWED_EXTENSIONS):
+            return get_text("image_format_not_allowed", language).format(
+                name=display_name, format=image_format, allowed=allowed)
+        return None
+
+    def _validate_images(self, images: List[Dict], language: str) -> List[str]:
+        """
+        校验提交的图片：只解码开头字节识别格式，大小由 base64 长度推算
+
+        Args:
+            images: 客户端提交的图片列表（只携带 hash 的图片已在服务器中，无需校验；
+                分块上传的图片已在上传过程中校验，这里只检查是否上传完成）
+            language: 错误说明的语言
+
+        Returns:
+            每张不合格图片的说明，全部合格时为空列表
+        """
+        errors = []
+
+        for index, image in enumerate(images):
+            name = image.get("name") or f"image_{index + 1}"
+
+            if image.get("upload_id"):
+                try:
+                    self._get_upload_store().ensure_complete(image["upload_id"])
+                except UploadError as e:
+                    errors.append(f"{name}: {e}")
+                continue
+
+            data = image.get("data")
+            if not data:
+                continue
+
+            image_format, size = inspect_base64_image(data)
+            problem = self._image_problem(image.get("name"), size, image_format, language)
+            if problem:
+                errors.append(problem)
+
+        return errors
+
+    def _take_uploads(self, images: List[Dict]) -> List[Dict]:
+        """将引用分块上传的图片替换为完整数据（在线程中执行）"""
+        store = self._get_upload_store()
+        result = []
+        for image in images:
+            if image.get("upload_id"):
+                uploaded = store.take(image["upload_id"])
+                image = {**{k: v for k, v in image.items() if k != "upload_id"},
+                         "data": uploaded["data"], "size": uploaded["size"]}
+            result.append(image)
+        return result
+
+    async def _handle_upload_begin(self, websocket: WebSocket, data: Dict):
+        """开始或恢复分块上传：回复服务器已确认的偏移"""
+        upload_id = data.get("upload_id") or ""
+        language = data.get("language", "CN")
+        try:
+            size = int(data.get("size", 0))
+            problem = self._image_problem(data.get("name"), size, None, language, check_format=False)
+            if problem:
+                raise UploadError(problem)
+            offset = self._get_upload_store().begin(
+                upload_id, data.get("name") or "image", size, data.get("mime_type") or "")
+        except (UploadError, ValueError) as e:
+            await self._send_upload_error(websocket, upload_id, str(e))
+            return
+
+        if offset:
+            logger.info(f"恢复上传 {upload_id}，从偏移 {offset} 继续")
+        await self.send_to_client(websocket, {
+            "type": "upload_ack",
+            "upload_id": upload_id,
+            "offset": offset
+        })
+
+    async def _handle_upload_chunk(self, websocket: WebSocket, data: Dict):
+        """追加数据块并确认新的偏移；收到文件头后立即识别格式"""
+        upload_id = data.get("upload_id") or ""
+        language = data.get("language", "CN")
+        store = self._get_upload_store()
+        try:
+            chunk_offset = int(data.get("offset", -1))
+            # 同步写入：读取偏移与追加之间没有 await，同一上传的重复数据块不会交错
+            offset = store.append(upload_id, chunk_offset, data.get("data") or "")
+
+            # 第一块包含文件头，此时即可拒绝不是图片或格式不允许的上传
+            if chunk_offset == 0 and offset > 0:
+                image_format = sniff_image_format(store.read_header(upload_id, SNIFF_BYTES))
+                problem = self._image_problem(
+                    store.meta(upload_id)["name"], 0, image_format, language)
+                if problem:
+                    store.discard(upload_id)
+                    raise UploadError(problem)
+        except (UploadError, ValueError) as e:
+            await self._send_upload_error(websocket, upload_id, str(e))
+            return
+
+        await self.send_to_client(websocket, {
+            "type": "upload_ack",
+            "upload_id": upload_id,
+            "offset": offset
+        })
+
+    async def _send_upload_error(self, websocket: WebSocket, upload_id: str, message: str):
+        """通知客户端上传失败（不可重试）"""
+        logger.warning(f"拒绝上传 {upload_id}: {message}")
+        await self.send_to_client(websocket, {
+            "type": "upload_error",
+            "upload_id": upload_id,
+            "message": message
+        })
+
+    async def _ingest_images(self, images: List[Dict]) -> List[Dict]:
+        """
+        处理提交的图片：引用已知哈希的图片直接复用，新图片处理后存入内容寻址存储
+
+        每个带 hash 的结果条目都持有一个存储引用，在结果被删除时释放；
+        只携带 hash 的图片已由调用方持有引用
+
+        Args:
+            images: 客户端提交的图片列表，已知图片可只携带 hash
+
+        Returns:
+            处理后的图片列表
+        """
+        result: List[Optional[Dict]] = [None] * len(images)
+        pending = []
+
+        for index, image in enumerate(images):
+            if image.get("data"):
+                # 哈希以服务器计算的结果为准
+                try:
+                    content_hash = await asyncio.to_thread(hash_image_data, image["data"])
+                except Exception:
+                    content_hash = None
+                stored = self._blob_store.get(content_hash) if content_hash else None
+                if stored is None:
+                    pending.append((index, content_hash, image))
+                    continue
+                self._blob_store.acquire(content_hash)
+            else:
+                stored = self._blob_store.get(image.get("hash") or "")
+                if stored is None:
+                    result[index] = {**image, "data": "", "error": "图片缺少数据"}
+                    continue
+
+            result[index] = {**stored, "name": image.get("name")}
+
+        if pending:
+            new_images = [image for _, _, image in pending]
+            if config.IMAGE_NORMALIZE:
+                new_images = await self._get_image_pipeline().process(new_images)
+
+            for (index, content_hash, _), processed in zip(pending, new_images):
+                if content_hash and not processed.get("error"):
+                    stored = self._blob_store.put(content_hash, processed)
+                    processed = {**stored, "name": processed.get("name")}
+                else:
+                    # 未存入存储的条目不持有引用，去掉客户端声明的 hash，删除结果时不会误释放
+                    processed = {k: v for k, v in processed.items() if k != "hash"}
+                result[index] = processed
+
+        return result
+
+    async def _handle_blob_check(self, websocket: WebSocket, data: Dict):
+        """处理上传前的哈希查询：返回服务器已保存的图片哈希"""
+        hashes = data.get("hashes") or []
+        await self.send_to_client(websocket, {
+            "type": "blob_check_result",
+            "check_id": data.get("check_id"),
+            "known": self._blob_store.known(hashes)
+        })
+
     async def _handle_feedback_cancellation(self, websocket: WebSocket, data: Dict):
         """处理反馈取消消息"""
         logger.info(f"收到反馈取消请求: {data.get('request_id', 'unknown')}")
@@ -246,14 +1114,14 @@ class WebSocketManager:
         request_id = data.get("request_id")
         if request_id:
             # 存储取消状态
-            self._feedback_storage[request_id] = {
+            self._store_feedback_result(request_id, {
                 "status": "cancelled",
                 "data": {
                     "reason": "用户取消",
                     "timestamp": data.get("timestamp", datetime.now().isoformat())
                 },
                 "cancelled_at": datetime.now().isoformat()
-            }
+            })
 
             logger.info(f"反馈已取消，请求ID: {request_id}")
 
@@ -263,6 +1131,7 @@ class WebSocketManager:
                 "request_id": request_id,
                 "status": "success"
             })
+            await self._broadcast_queue()
         else:
             await self.send_to_client(websocket, {
                 "type": "error",
@@ -274,6 +1143,8 @@ class WebSocketManager:
         while True:
             try:
                 await asyncio.sleep(self._heartbeat_interval)
+                self._replay.prune()
+                self._expire_results()
 
                 if not self._connections:
                     continue
@@ -295,12 +1166,143 @@ class WebSocketManager:
         """获取当前连接数"""
         return len(self._connections)
 
+    def get_rate_limit_stats(self) -> Dict:
+        """获取消息限流统计（上传、提交与心跳的预算单独统计）"""
+        return {**self._message_limiter.stats(), "transfer": self._transfer_limiter.stats()}
+
+    def get_handoff_probe(self) -> Optional[Dict]:
+        """共享内存交接的同机证明（路径与令牌），供 MCP 端决定是否请求共享内存交接"""
+        try:
+            return self._get_image_store().locality_probe()
+        except OSError as e:
+            logger.warning(f"共享内存存储不可用: {e}")
+            return None
+
+    def get_replay_stats(self) -> Dict:
+        """获取消息补发统计"""
+        return self._replay.stats()
+
+    def get_memory_stats(self) -> Dict[str, Dict]:
+        """
+        主要内存容器的条目数与深度字节数（只在调用时遍历计算）
+
+        同一对象被多个容器引用时（例如反馈结果与图片存储共享的图片数据）在每个容器中都会计入
+        """
+        return {
+            "feedback_storage": container_usage(self._feedback_storage or {}),
+            "connection_info": container_usage(self._connection_info),
+            "pending_requests": container_usage(self._pending_requests),
+            "request_options": container_usage(self._request_options),
+            "codecs": container_usage(self._codecs),
+            # 按会话缓冲的已发送消息（断线补发）
+            "send_buffers": {**container_usage(self._replay),
+                             "entries": self._replay.stats()["buffered_messages"]},
+            "blob_store": {**container_usage(self._blob_store),
+                           "entries": self._blob_store.stats()["blobs"]}
+        }
+
     def get_connection_info(self) -> List[Dict]:
         """获取所有连接信息"""
-        return list(self._connection_info.values())
+        result = []
+        for websocket, info in self._connection_info.items():
+            codec = self._codecs.get(websocket)
+            result.append({
+                **info,
+                "compression": codec.stats.to_dict() if codec else None
+            })
+        return result
+
+    async def notify_restart(self):
+        """通知客户端服务器正在重启，连接随后以 1012 关闭，客户端应立即重连"""
+        await self.broadcast_message({
+            "type": "server_restarting",
+            "timestamp": datetime.now().isoformat()
+        })
+
+    def export_state(self) -> Dict:
+        """导出交给新进程的状态：已存储的结果与未完成请求的选项"""
+        return {
+            "feedback_storage": dict(self._feedback_storage or {}),
+            "request_options": dict(self._request_options),
+            "pending_requests": dict(self._pending_requests),
+            "cancelled_requests": list(self._cancelled_requests)
+        }
+
+    def expect_handoff_state(self):
+        """标记本进程从旧进程接管而来，状态到达前暂缓处理反馈消息"""
+        self._handoff_state_ready = asyncio.Event()
+
+    def import_state(self, state: Optional[Dict]):
+        """
+        合并旧进程交接的状态；本进程接管后已写入的结果更新，不会被覆盖
+
+        Args:
+            state: export_state() 的结果；交接失败时为 None
+        """
+        if state and self._feedback_storage is not None:
+            storage = state.get("feedback_storage") or {}
+            for request_id, result in storage.items():
+                if request_id not in self._feedback_storage:
+                    self._store_feedback_result(request_id, self._adopt_result_images(result))
+
+            for request_id, options in (state.get("request_options") or {}).items():
+                current = self._feedback_storage.get(request_id)
+                if current is None or current.get("status") == "partial":
+                    self._request_options.setdefault(request_id, options)
+
+            for request_id, request_data in (state.get("pending_requests") or {}).items():
+                current = self._feedback_storage.get(request_id)
+                if current is None or current.get("status") == "partial":
+                    self._pending_requests.setdefault(request_id, request_data)
+
+            for request_id in state.get("cancelled_requests") or []:
+                self._cancelled_requests[request_id] = None
+
+            logger.info(f"已接收旧进程交接的状态: {len(storage)} 个结果, "
+                        f"{len(state.get('request_options') or {})} 个未完成请求的选项")
 
-    async def cleanup(self):
-        """清理资源"""
+        if self._handoff_state_ready:
+            self._handoff_state_ready.set()
+
+    def _adopt_result_images(self, result: Dict) -> Dict:
+        """
+        旧进程交接的结果：图片存储没有随状态交接，带内联数据的图片重新存入本进程的存储并持有引用，
+        之后客户端只发送哈希时仍能复用；没有内联数据的图片（共享内存描述符）去掉 hash，删除结果时不会误释放
+        """
+        data = result.get("data") or {}
+        images = data.get("images")
+        if not images:
+            return result
+
+        adopted = []
+        for image in images:
+            if image.get("hash") and image.get("data"):
+                stored = self._blob_store.put(image["hash"], image)
+                image = {**stored, "name": image.get("name")}
+            elif image.get("hash"):
+                image = {k: v for k, v in image.items() if k != "hash"}
+            adopted.append(image)
+        return {**result, "data": {**data, "images": adopted}}
+
+    async def _wait_for_handoff_state(self):
+        """等待旧进程交接状态（旧进程排空最多需要 GRACEFUL_SHUTDOWN_TIMEOUT）"""
+        if self._handoff_state_ready is None or self._handoff_state_ready.is_set():
+            return
+        try:
+            await asyncio.wait_for(self._handoff_state_ready.wait(),
+                                   config.GRACEFUL_SHUTDOWN_TIMEOUT + 5)
+        except asyncio.TimeoutError:
+            logger.warning("等待旧进程交接状态超时，继续处理消息")
+            self._handoff_state_ready.set()
+
+    async def cleanup(self, close_timeout: float = 5.0, close_code: int = 1000):
+        """
+        清理资源
+
+        Args:
+            close_timeout: 关闭所有连接的最长时间（秒），各连接并发关闭，超时未完成的直接丢弃
+            close_code: 关闭码；平滑重启时使用 1012 让客户端立即重连
+        """
         try:
             # 取消心跳任务
             if self._heartbeat_task and not self._heartbeat_task.done():
@@ -310,15 +1312,30 @@ class WebSocketManager:
                 except asyncio.CancelledError:
                     pass
 
-            # 关闭所有连接
-            for websocket in self._connections.copy():
+            # 并发关闭所有连接，单个客户端无响应不会拖慢其他连接
+            connections = list(self._connections)
+            if connections:
+                closing = asyncio.gather(
+                    *(websocket.close(code=close_code) for websocket in connections),
+                    return_exceptions=True)
                 try:
-                    await websocket.close()
-                except Exception:
-                    pass
+                    await asyncio.wait_for(closing, close_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"关闭 WebSocket 连接超时 ({close_timeout}s)，未完成的连接将被丢弃")
 
             self._connections.clear()
             self._connection_info.clear()
+            self._codecs.clear()
+
+            # 取消仍在等待的 Future，避免等待者永久挂起
+            with self._waiters_lock:
+                waiters = [f for fs in self._feedback_waiters.values() for f, _ in fs]
+                self._feedback_waiters.clear()
+            for future in waiters:
+                future.cancel()
+
+            if self._image_pipeline:
+                self._image_pipeline.shutdown()
 
             logger.info("WebSocket管理器资源清理完成")
 
@@ -0,0 +1,135 @@
+"""
+WebSocket 负载压缩
+超过阈值的消息以 zlib 压缩后的二进制帧发送，并按连接统计压缩率
+"""
+
+import zlib
+from typing import Dict, Optional, Union
+
+# 客户端在连接 URL 中声明支持的压缩格式（与浏览器 CompressionStream('deflate') 一致）
+PAYLOAD_ENCODING = "deflate"
+
+
+class CompressionError(ValueError):
+    """压缩帧无法解码"""
+
+
+class CompressionStats:
+    """单个连接的压缩统计"""
+
+    def __init__(self):
+        self.raw_bytes_sent = 0
+        self.wire_bytes_sent = 0
+        self.raw_bytes_received = 0
+        self.wire_bytes_received = 0
+        self.frames_compressed = 0
+        self.frames_uncompressed = 0
+
+    def record_sent(self, raw_size: int, wire_size: int, compressed: bool):
+        """记录一次发送"""
+        self.raw_bytes_sent += raw_size
+        self.wire_bytes_sent += wire_size
+        if compressed:
+            self.frames_compressed += 1
+        else:
+            self.frames_uncompressed += 1
+
+    def record_received(self, raw_size: int, wire_size: int, compressed: bool):
+        """记录一次接收"""
+        self.raw_bytes_received += raw_size
+        self.wire_bytes_received += wire_size
+        if compressed:
+            self.frames_compressed += 1
+        else:
+            self.frames_uncompressed += 1
+
+    @staticmethod
+    def _ratio(raw: int, wire: int) -> Optional[float]:
+        return round(wire / raw, 4) if raw else None
+
+    def to_dict(self) -> Dict:
+        """转换为可序列化的字典"""
+        return {
+            "raw_bytes_sent": self.raw_bytes_sent,
+            "wire_bytes_sent": self.wire_bytes_sent,
+            "raw_bytes_received": self.raw_bytes_received,
+            "wire_bytes_received": self.wire_bytes_received,
+            "frames_compressed": self.frames_compressed,
+            "frames_uncompressed": self.frames_uncompressed,
+            "send_ratio": self._ratio(self.raw_bytes_sent, self.wire_bytes_sent),
+            "receive_ratio": self._ratio(self.raw_bytes_received, self.wire_bytes_received)
+        }
+
+
+class PayloadCodec:
+    """WebSocket 消息编解码器"""
+
+    def __init__(self, enabled: bool, threshold: int, level: int = 6,
+                 max_message_size: int = 64 * 1024 * 1024):
+        """
+        Args:
+            enabled: 是否对该连接启用负载压缩
+            threshold: 小于该字节数的消息不压缩
+            level: zlib 压缩级别
+            max_message_size: 解压后允许的最大字节数
+        """
+        self.enabled = enabled
+        self.threshold = threshold
+        self.level = level
+        self.max_message_size = max_message_size
+        self.stats = CompressionStats()
+
+    def should_compress(self, raw: bytes) -> bool:
+        """判断消息是否需要压缩"""
+        return self.enabled and len(raw) >= self.threshold
+
+    def compress(self, raw: bytes) -> bytes:
+        """压缩消息"""
+        return zlib.compress(raw, self.level)
+
+    def encode(self, message: str, compressed: Optional[bytes] = None) -> Union[str, bytes]:
+        """
+        编码待发送消息
+
+        Args:
+            message: JSON 文本
+            compressed: 预先压缩好的数据（广播时复用）
+
+        Returns:
+            文本帧内容或二进制帧内容
+        """
+        raw = message.encode("utf-8")
+        if not self.should_compress(raw):
+            self.stats.record_sent(len(raw), len(raw), False)
+            return message
+
+        payload = compressed if compressed is not None else self.compress(raw)
+        self.stats.record_sent(len(raw), len(payload), True)
+        return payload
+
+    def decode(self, frame: Union[str, bytes]) -> str:
+        """
+        解码收到的帧
+
+        Args:
+            frame: 文本帧或压缩后的二进制帧
+
+        Returns:
+            JSON 文本
+        """
+        if isinstance(frame, str):
+            size = len(frame.encode("utf-8"))
+            self.stats.record_received(size, size, False)
+            return frame
+
+        decompressor = zlib.decompressobj()
+        try:
+            raw = decompressor.decompress(frame, self.max_message_size)
+        except zlib.error as e:
+            raise CompressionError(f"压缩帧解码失败: {e}") from e
+        if decompressor.unconsumed_tail:
+            raise CompressionError(
+                f"解压后的消息超过大小限制 ({self.max_message_size} bytes)")
+
+        self.stats.record_received(len(raw), len(frame), True)
+        return raw.decode("utf-8")
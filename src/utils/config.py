@@ -13,6 +13,8 @@ class Config:
         # Web 服务器配置
         self.WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
         self.WEB_PORT = int(os.getenv("WEB_PORT", "9999"))
+        # 可选：额外监听的 Unix 域套接字路径，供同机 MCP 服务器使用
+        self.WEB_UDS_PATH = os.getenv("WEB_UDS_PATH") or None
 
         # MCP 配置
         self.MCP_TIMEOUT = int(os.getenv("MCP_DIALOG_TIMEOUT", "600"))
@@ -31,12 +33,92 @@ class Config:
         self.WS_RECONNECT_ATTEMPTS = int(
             os.getenv("WS_RECONNECT_ATTEMPTS", "5"))
 
+        # WebSocket 压缩配置
+        # payload: 应用层按阈值压缩大消息（关闭 permessage-deflate，避免重复压缩）
+        # permessage-deflate: 由 uvicorn 协商传输层压缩
+        # off: 不压缩
+        self.WS_COMPRESSION = os.getenv("WS_COMPRESSION", "payload").lower()
+        self.WS_COMPRESSION_THRESHOLD = int(
+            os.getenv("WS_COMPRESSION_THRESHOLD", "4096"))
+        self.WS_COMPRESSION_LEVEL = int(os.getenv("WS_COMPRESSION_LEVEL", "6"))
+
+        # 单条 WebSocket 消息的最大字节数（压缩消息按解压后大小计算），超出时在读取负载前断开
+        self.WS_MAX_MESSAGE_SIZE = int(
+            os.getenv("WS_MAX_MESSAGE_SIZE", str(64 * 1024 * 1024)))
+
+        # 限流（令牌桶）：每个 WebSocket 连接每秒的消息数及突发上限，0 表示不限流
+        self.WS_RATE_LIMIT = float(os.getenv("WS_RATE_LIMIT", "50"))
+        self.WS_RATE_BURST = int(os.getenv("WS_RATE_BURST", "200"))
+        # 上传数据块、反馈提交与心跳使用单独的预算（由确认驱动，每个连接同时只有一个数据块在途）
+        self.WS_TRANSFER_RATE_LIMIT = float(os.getenv("WS_TRANSFER_RATE_LIMIT", "100"))
+        self.WS_TRANSFER_RATE_BURST = int(os.getenv("WS_TRANSFER_RATE_BURST", "100"))
+        # 每个调用方每秒可发起的反馈请求数及突发上限（每次请求都会广播到所有客户端）
+        self.REQUEST_RATE_LIMIT = float(os.getenv("REQUEST_RATE_LIMIT", "1"))
+        self.REQUEST_RATE_BURST = int(os.getenv("REQUEST_RATE_BURST", "10"))
+        # 调用方按对端地址区分；同一地址下自报标识（X-Feedback-Caller）单独计数的数量上限，超出的共用地址的预算
+        self.REQUEST_CALLERS_PER_ADDRESS = int(os.getenv("REQUEST_CALLERS_PER_ADDRESS", "8"))
+
+        # 断线补发：每个会话（标签页）保留的最近消息条数（0 表示关闭），以及断开后会话保留的时间（秒）
+        self.WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", "256"))
+        self.WS_SESSION_TTL = float(os.getenv("WS_SESSION_TTL", "300"))
+
         # 日志配置
         self.LOG_LEVEL = "ERROR"
 
         # 临时文件目录
         self.TEMP_DIR = os.getenv("TEMP_DIR", "/tmp/feedback_collector")
 
+        # 静态资源构建目录（指纹化文件及其 .gz/.br 副本）
+        self.STATIC_BUILD_DIR = os.getenv(
+            "STATIC_BUILD_DIR", os.path.join(self.TEMP_DIR, "static_build"))
+
+        # Service Worker 离线缓存：页面与指纹化资源从浏览器缓存加载，资源内容哈希变化时失效
+        self.WEB_SERVICE_WORKER = os.getenv(
+            "WEB_SERVICE_WORKER", "true").lower() in ("1", "true", "yes")
+
+        # 图片规范化：在进程池中校验、去除元数据、缩放并重新编码
+        self.IMAGE_NORMALIZE = os.getenv(
+            "IMAGE_NORMALIZE", "true").lower() in ("1", "true", "yes")
+        self.IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+        self.IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "webp").lower()
+        self.IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+        self.IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+        # 内容寻址图片存储容量（字节），超出时淘汰无引用的图片
+        self.BLOB_STORE_MAX_BYTES = int(
+            os.getenv("BLOB_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+        # 同机图片交接：共享内存目录（默认 /dev/shm，不可用时回退到 TEMP_DIR）及未取走文件的保留时间
+        self.IMAGE_HANDOFF_DIR = os.getenv("IMAGE_HANDOFF_DIR") or None
+        self.IMAGE_HANDOFF_TTL = int(os.getenv("IMAGE_HANDOFF_TTL", "900"))
+
+        # 已存储的反馈结果保留时间（秒），到期后删除并释放图片引用与共享内存文件
+        self.FEEDBACK_RESULT_TTL = int(os.getenv("FEEDBACK_RESULT_TTL", "900"))
+
+        # 分块上传：每块的字节数及未完成上传在 TEMP_DIR 中的保留时间
+        self.UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+        self.UPLOAD_TTL = int(os.getenv("UPLOAD_TTL", "3600"))
+
+        # 平滑重启：新进程通过控制套接字接管监听套接字，旧进程排空后交接未完成的请求与结果
+        self.WEB_HANDOFF = os.getenv(
+            "WEB_HANDOFF", "true").lower() in ("1", "true", "yes")
+        self.WEB_HANDOFF_SOCKET = os.getenv("WEB_HANDOFF_SOCKET") or os.path.join(
+            self.TEMP_DIR, f"web_server_{self.WEB_PORT}.handoff.sock")
+        # 关闭时等待进行中的请求完成、关闭 WebSocket 连接的最长时间（秒）
+        self.GRACEFUL_SHUTDOWN_TIMEOUT = float(
+            os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "10"))
+
+        # 事件循环监控（可选）：延迟采样间隔、慢回调阈值与就绪检查的延迟上限（秒）
+        self.LOOP_MONITOR = os.getenv(
+            "LOOP_MONITOR", "false").lower() in ("1", "true", "yes")
+        self.LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+        self.SLOW_CALLBACK_THRESHOLD = float(
+            os.getenv("SLOW_CALLBACK_THRESHOLD", "0.1"))
+        self.LOOP_LAG_LIMIT = float(os.getenv("LOOP_LAG_LIMIT", "0.5"))
+
+        # 管理接口令牌（/admin/*，通过 Authorization: Bearer 或 X-Admin-Token 传递），未设置时不开放管理接口
+        self.ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
         # 确保临时目录存在
         os.makedirs(self.TEMP_DIR, exist_ok=True)
 
@@ -50,7 +50,7 @@ class I18n:
             "submit_feedback": "提交反馈",
 
             # 操作提示
-            "shortcuts_hint": "快捷键：⌘+Enter (Ctrl+Enter) 提交反馈，ESC 取消",
+            "shortcuts_hint": "快捷键：⌘+Enter (Ctrl+Enter) 提交反馈，ESC 取消，Alt+↑/↓ 切换请求",
             "timeout_hint": "对话框将在 10 分钟后自动关闭",
 
             # 反馈状态
@@ -65,6 +65,13 @@ class I18n:
             "submit_error": "反馈提交失败",
             "connection_lost": "连接丢失，正在重连...",
             "connection_restored": "连接已恢复",
+            "server_restarting": "服务器正在重启，连接将自动恢复",
+            "rate_limited": "操作过于频繁，部分消息未被处理，请稍后重试",
+            "queue_title": "待回答的请求",
+            "request_queued": "新的反馈请求已加入队列",
+            "queue_priority": "优先级",
+            "questions_label": "请回答以下问题",
+            "answers_required": "请回答所有必答问题",
             "feedback_submitted_success": "您的反馈已成功提交",
             "send_failed": "发送失败，请检查网络连接",
             "enter_feedback_or_upload": "请输入反馈内容或上传图片",
@@ -85,6 +92,17 @@ class I18n:
             "clipboard_access_denied": "剪贴板访问被拒绝，请允许浏览器访问剪贴板或使用Ctrl+V快捷键",
             "no_image_content_in_clipboard": "剪贴板中没有找到图片内容",
             "paste_image_failed": "粘贴图片失败，请尝试使用Ctrl+V快捷键或重新复制图片",
+            "upload_rejected": "服务器拒绝了提交的图片",
+            "images_resend": "部分图片已不在服务器缓存中，正在重新上传",
+            "answers_rejected": "部分问题的回答未通过校验",
+            "question_required": "{prompt}: 此问题必须回答",
+            "question_invalid_answer": "{prompt}: 回答不是有效的选项",
+            "message_too_large": "提交内容超过服务器允许的大小，请删除或缩小部分图片后重试",
+            "uploading_images": "正在上传图片",
+            "image_too_large_detail": "{name}: 图片大小 {size} 字节超过上限 {limit} 字节",
+            "image_extension_not_allowed": "{name}: 不支持的文件扩展名（允许: {allowed}）",
+            "image_format_not_recognized": "{name}: 文件内容不是可识别的图片",
+            "image_format_not_allowed": "{name}: 图片格式 {format} 不在允许列表中（允许: {allowed}）",
 
             # MCP 工具相关
             "user_text_feedback": "用户文字反馈：",
@@ -93,6 +111,13 @@ class I18n:
             "feedback_collection_timeout": "用户反馈收集超时或被取消",
             "feedback_collection_error": "反馈收集过程中发生错误",
             "mcp_components_not_initialized": "MCP 服务器组件未正确初始化，请重启服务器",
+            "images_still_uploading": "另有 {count} 张图片仍在上传，可稍后调用 get_feedback_images（request_id: {request_id}）获取",
+            "images_not_ready": "图片仍在上传，请稍后重试",
+            "no_feedback_images": "该反馈没有图片",
+            "batch_answers_title": "用户对各问题的回答：",
+            "answer_yes": "是",
+            "answer_no": "否",
+            "answer_skipped": "（未回答）",
             "auto_append_prompt": "\n\n以下是你需要非常注意的 2 点：\n1. 对以上用户反馈进行处理（或回答）。\n2. 在处理完（或回答完）以上用户反馈后，必须重新调用 <feedback-collector-web.collect_feedback> MCP 以获取用户反馈",
 
             # Web 服务器连接相关
@@ -140,7 +165,7 @@ class I18n:
             "submit_feedback": "Submit Feedback",
 
             # 操作提示
-            "shortcuts_hint": "Shortcuts: ⌘+Enter (Ctrl+Enter) to submit, ESC to cancel",
+            "shortcuts_hint": "Shortcuts: ⌘+Enter (Ctrl+Enter) to submit, ESC to cancel, Alt+↑/↓ to switch requests",
             "timeout_hint": "Dialog will close automatically in 10 minutes",
 
             # 反馈状态
@@ -155,6 +180,13 @@ class I18n:
             "submit_error": "Feedback submission failed",
             "connection_lost": "Connection lost, reconnecting...",
             "connection_restored": "Connection restored",
+            "server_restarting": "Server is restarting, the connection will be restored automatically",
+            "rate_limited": "Too many messages, some were not processed. Please try again shortly",
+            "queue_title": "Pending requests",
+            "request_queued": "A new feedback request was added to the queue",
+            "queue_priority": "Priority",
+            "questions_label": "Please answer the following questions",
+            "answers_required": "Please answer all required questions",
             "feedback_submitted_success": "Your feedback has been successfully submitted",
             "send_failed": "Send failed, please check network connection",
             "enter_feedback_or_upload": "Please enter feedback content or upload images",
@@ -175,6 +207,17 @@ class I18n:
             "clipboard_access_denied": "Clipboard access denied, please allow browser to access clipboard or use Ctrl+V shortcut",
             "no_image_content_in_clipboard": "No image content found in clipboard",
             "paste_image_failed": "Failed to paste image, please try using Ctrl+V shortcut or copy the image again",
+            "upload_rejected": "The server rejected the submitted images",
+            "images_resend": "Some images are no longer cached on the server, uploading them again",
+            "answers_rejected": "Some answers did not pass validation",
+            "question_required": "{prompt}: this question is required",
+            "question_invalid_answer": "{prompt}: the answer is not a valid option",
+            "message_too_large": "The submission exceeds the size the server accepts, please remove or shrink some images and retry",
+            "uploading_images": "Uploading images",
+            "image_too_large_detail": "{name}: image is {size} bytes, the limit is {limit} bytes",
+            "image_extension_not_allowed": "{name}: file extension not allowed (allowed: {allowed})",
+            "image_format_not_recognized": "{name}: file content is not a recognized image",
+            "image_format_not_allowed": "{name}: image format {format} is not allowed (allowed: {allowed})",
 
             # MCP 工具相关
             "user_text_feedback": "User text feedback: ",
@@ -183,6 +226,13 @@ class I18n:
             "feedback_collection_timeout": "User feedback collection timed out or was cancelled",
             "feedback_collection_error": "Error occurred during feedback collection",
             "mcp_components_not_initialized": "MCP server components not properly initialized, please restart the server",
+            "images_still_uploading": "{count} more image(s) are still uploading; call get_feedback_images (request_id: {request_id}) to fetch them later",
+            "images_not_ready": "Images are still uploading, please retry later",
+            "no_feedback_images": "This feedback has no images",
+            "batch_answers_title": "User answers to the questions:",
+            "answer_yes": "Yes",
+            "answer_no": "No",
+            "answer_skipped": "(not answered)",
             "auto_append_prompt": "\n\nThe following are the 2 points you must pay attention to:\n1. Process (or answer) the above user feedback.\n2. After processing (or answering) the above user feedback, you must re-call <feedback-collector-web.collect_feedback> MCP to get user feedback",
 
             # Web 服务器连接相关
@@ -0,0 +1,77 @@
+"""
+图片格式识别模块
+根据文件头的魔数判断图片格式，而不是依赖文件名或客户端声明的 MIME 类型
+"""
+
+import base64
+import binascii
+from typing import Optional, Tuple
+
+# 识别格式所需的最少字节数
+SNIFF_BYTES = 12
+
+# data URL 前缀（data:image/png;base64,）的最大长度
+MAX_DATA_URL_PREFIX = 256
+
+# 格式 -> 扩展名（与 Config.ALLOWED_EXTENSIONS 对应）
+FORMAT_EXTENSIONS = {
+    "png": [".png"],
+    "jpeg": [".jpg", ".jpeg"],
+    "gif": [".gif"],
+    "webp": [".webp"],
+    "bmp": [".bmp"]
+}
+
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """
+    根据文件头识别图片格式
+
+    Args:
+        header: 图片数据的前若干字节（至少 SNIFF_BYTES 字节才能识别全部格式）
+
+    Returns:
+        png / jpeg / gif / webp / bmp，无法识别时返回 None
+    """
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if len(header) >= 12 and header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    if header.startswith(b"BM"):
+        return "bmp"
+    return None
+
+
+def inspect_base64_image(data: str) -> Tuple[Optional[str], int]:
+    """
+    只解码 base64 图片数据的开头部分来识别格式，并根据编码长度推算解码后的大小
+
+    Args:
+        data: base64 字符串或 data URL
+
+    Returns:
+        (格式, 解码后字节数)；无法识别时格式为 None
+    """
+    start = 0
+    if data.startswith("data:"):
+        start = data.find(",", 0, MAX_DATA_URL_PREFIX) + 1
+        if start == 0:
+            return None, 0
+
+    encoded_length = len(data) - start
+    padding = 2 if data.endswith("==") else 1 if data.endswith("=") else 0
+    size = max(encoded_length * 3 // 4 - padding, 0)
+
+    # 每 4 个 base64 字符对应 3 个字节
+    head_chars = (SNIFF_BYTES + 2) // 3 * 4
+    head = data[start:start + head_chars]
+    try:
+        header = base64.b64decode(head + "=" * (-len(head) % 4))
+    except (binascii.Error, ValueError):
+        return None, size
+
+    return sniff_image_format(header), size
@@ -0,0 +1,112 @@
+"""
+启动导入耗时报告
+在子进程中以 python -X importtime 导入模块，汇总耗时最高的导入，并检查总耗时是否超出预算
+
+用法:
+    python -m src.utils.import_budget [模块名...] [--budget-ms 毫秒] [--top 条数] [--repeat 次数]
+
+超出预算时退出码为 1，可用于 CI 或发布前检查
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# 默认检查的模块：MCP 握手前必须完成导入的部分
+DEFAULT_MODULES = ["mcp_server"]
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+
+def measure_imports(module: str) -> List[Dict]:
+    """
+    在全新的解释器中导入模块并解析 -X importtime 输出
+
+    Args:
+        module: 模块名
+
+    Returns:
+        导入记录（name / self_us / cumulative_us / depth），顺序与输出一致
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 标题行
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        records.append({
+            "name": stripped,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+            "depth": (len(name) - len(stripped) - 1) // 2
+        })
+    return records
+
+
+def best_of(module: str, repeat: int) -> List[Dict]:
+    """多次测量取总耗时最少的一次，减少磁盘缓存与系统负载的干扰"""
+    runs = [measure_imports(module) for _ in range(max(repeat, 1))]
+    return min(runs, key=lambda records: total_us(module, records))
+
+
+def total_us(module: str, records: List[Dict]) -> int:
+    """模块本身的累计导入耗时（微秒）"""
+    for record in reversed(records):
+        if record["name"] == module and record["depth"] == 0:
+            return record["cumulative_us"]
+    return sum(record["self_us"] for record in records)
+
+
+def report(module: str, records: List[Dict], top: int) -> str:
+    """生成耗时报告：模块直接导入的依赖按累计耗时排序，另列自身耗时最高的模块"""
+    lines = [f"{module}: {total_us(module, records) / 1000:.1f} ms"]
+
+    direct = [r for r in records if r["depth"] == 1]
+    lines.append(f"  直接导入（按累计耗时，前 {top} 项）:")
+    for record in sorted(direct, key=lambda r: r["cumulative_us"], reverse=True)[:top]:
+        lines.append(f"    {record['cumulative_us'] / 1000:8.1f} ms  {record['name']}")
+
+    lines.append(f"  自身耗时最高的模块（前 {top} 项）:")
+    for record in sorted(records, key=lambda r: r["self_us"], reverse=True)[:top]:
+        lines.append(f"    {record['self_us'] / 1000:8.1f} ms  {record['name']}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="测量模块导入耗时并检查启动预算")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="要测量的模块")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="单个模块的导入耗时预算（毫秒），默认取 IMPORT_BUDGET_MS")
+    parser.add_argument("--top", type=int, default=10, help="报告中列出的条数")
+    parser.add_argument("--repeat", type=int, default=3, help="测量次数，取最快的一次")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for module in args.modules:
+        records = best_of(module, args.repeat)
+        elapsed_ms = total_us(module, records) / 1000
+        print(report(module, records, args.top))
+        if elapsed_ms > args.budget_ms:
+            over_budget = True
+            print(f"  ❌ 超出预算 {args.budget_ms:.0f} ms")
+        else:
+            print(f"  ✅ 预算 {args.budget_ms:.0f} ms 内")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
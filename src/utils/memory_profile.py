@@ -0,0 +1,170 @@
+"""
+按需内存分析
+通过管理接口开关 tracemalloc，按模块汇总分配位置，并深度计算主要内存容器的大小。
+未开启时不跟踪任何分配，容器大小只在调用时遍历计算
+"""
+
+import sys
+import tracemalloc
+from collections import deque
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# 始终出现在按模块汇总中的项目模块（即使没有分配）
+TRACKED_MODULES = ["src.core.websocket_manager", "src.web_server", "src.utils.i18n"]
+
+# 排除分析器自身与导入机制的分配
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _follows_attributes(obj) -> bool:
+    """只展开项目自己的对象；第三方对象（WebSocket、Future 等）只计自身大小，避免遍历整个应用对象图"""
+    return type(obj).__module__.startswith("src.")
+
+
+def deep_sizeof(obj) -> int:
+    """
+    估算对象及其引用的容器、字符串等占用的字节数（同一对象只计一次）
+
+    Args:
+        obj: 要计算的对象
+
+    Returns:
+        字节数
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif _follows_attributes(current):
+            if hasattr(current, "__dict__"):
+                stack.append(current.__dict__)
+            for cls in type(current).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if hasattr(current, name):
+                        stack.append(getattr(current, name))
+    return total
+
+
+def container_usage(container) -> Dict:
+    """容器的条目数与深度字节数"""
+    usage = {"bytes": deep_sizeof(container)}
+    if hasattr(container, "__len__"):
+        usage["entries"] = len(container)
+    return usage
+
+
+def _module_label(filename: str) -> str:
+    """分配位置所属的模块：项目文件取模块路径，第三方库取顶层包名，标准库取文件名"""
+    path = Path(filename)
+    try:
+        relative = path.resolve().relative_to(PROJECT_ROOT)
+        return ".".join(relative.with_suffix("").parts)
+    except (ValueError, OSError):
+        pass
+
+    parts = path.parts
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            index = parts.index(marker)
+            if index + 1 < len(parts):
+                return Path(parts[index + 1]).stem
+    return path.stem
+
+
+class MemoryProfiler:
+    """tracemalloc 开关与分配报告"""
+
+    def __init__(self):
+        # 由本分析器开启（而不是 PYTHONTRACEMALLOC 等外部开启）的跟踪
+        self._started_here = False
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        """开始跟踪分配（frames 为每个分配保存的调用栈帧数）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(frames, 1))
+            self._started_here = True
+
+    def stop(self):
+        """停止跟踪并释放跟踪数据"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_here = False
+
+    def status(self) -> Dict:
+        """跟踪状态与当前/峰值跟踪内存"""
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "started_here": self._started_here,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory()
+        }
+
+    def report(self, limit: int = 20) -> Dict:
+        """
+        分配报告：按模块汇总及最大的分配位置
+
+        Args:
+            limit: 返回的模块与分配位置条数
+
+        Returns:
+            跟踪状态；正在跟踪时附带 by_module 与 top_sites
+        """
+        result = self.status()
+        if not result["tracing"]:
+            return result
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+        modules: Dict[str, Dict] = {name: {"module": name, "bytes": 0, "count": 0}
+                                    for name in TRACKED_MODULES}
+        for stat in snapshot.statistics("filename"):
+            label = _module_label(stat.traceback[0].filename)
+            entry = modules.setdefault(label, {"module": label, "bytes": 0, "count": 0})
+            entry["bytes"] += stat.size
+            entry["count"] += stat.count
+
+        tracked = [modules[name] for name in TRACKED_MODULES]
+        others = sorted((entry for name, entry in modules.items() if name not in TRACKED_MODULES),
+                        key=lambda entry: entry["bytes"], reverse=True)
+        result["by_module"] = tracked + others[:limit]
+
+        top_sites: List[Dict] = []
+        for stat in snapshot.statistics("lineno")[:limit]:
+            frame = stat.traceback[0]
+            top_sites.append({
+                "module": _module_label(frame.filename),
+                "location": f"{frame.filename}:{frame.lineno}",
+                "bytes": stat.size,
+                "count": stat.count
+            })
+        result["top_sites"] = top_sites
+        return result
+
@@ -0,0 +1,150 @@
+"""
+端口占用进程查询
+Linux 下直接读取 /proc/net/tcp* 与 /proc/*/fd 找到监听端口的进程，无需启动 lsof；
+其他平台回退到 lsof
+"""
+
+import os
+import subprocess
+import time
+from typing import Callable, Dict, List, Set
+
+# /proc/net/tcp 中 LISTEN 状态的编码
+TCP_LISTEN_STATE = "0A"
+
+# 轮询等待的默认间隔（秒）
+POLL_INTERVAL = 0.05
+
+
+def _listening_inodes(port: int) -> Set[str]:
+    """读取 /proc/net/tcp 与 tcp6，返回监听指定端口的套接字 inode"""
+    inodes = set()
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table, "r") as f:
+                next(f, None)  # 跳过标题行
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 10 or fields[3] != TCP_LISTEN_STATE:
+                        continue
+                    # local_address 形如 0100007F:270F（十六进制地址:端口）
+                    if int(fields[1].rsplit(":", 1)[1], 16) == port and fields[9] != "0":
+                        inodes.add(fields[9])
+        except FileNotFoundError:
+            continue
+    return inodes
+
+
+def _read_proc_file(pid: str, name: str) -> str:
+    """读取 /proc/<pid>/ 下的文件，失败时返回空字符串"""
+    try:
+        with open(f"/proc/{pid}/{name}", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+    except OSError:
+        return ""
+
+
+def _process_user(pid: str) -> str:
+    """获取进程的用户名"""
+    try:
+        import pwd
+
+        return pwd.getpwuid(os.stat(f"/proc/{pid}").st_uid).pw_name
+    except (ImportError, KeyError, OSError):
+        return "unknown"
+
+
+def _proc_port_owners(port: int) -> List[Dict]:
+    """通过 /proc 查找持有监听套接字的进程"""
+    inodes = _listening_inodes(port)
+    if not inodes:
+        return []
+
+    targets = {f"socket:[{inode}]" for inode in inodes}
+    processes = []
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            # 进程已退出或无权限查看
+            continue
+        for fd in fds:
+            try:
+                if os.readlink(f"{fd_dir}/{fd}") in targets:
+                    break
+            except OSError:
+                continue
+        else:
+            continue
+
+        processes.append({
+            "command": _read_proc_file(pid, "comm") or "unknown",
+            "cmdline": _read_proc_file(pid, "cmdline"),
+            "pid": pid,
+            "user": _process_user(pid)
+        })
+    return processes
+
+
+def _lsof_port_owners(port: int) -> List[Dict]:
+    """通过 lsof 查找监听端口的进程（无 /proc 的平台）"""
+    try:
+        result = subprocess.run(["lsof", "-n", "-P", f"-iTCP:{port}", "-sTCP:LISTEN"],
+                                capture_output=True, text=True)
+    except OSError:
+        return []
+    if result.returncode != 0:
+        return []
+
+    processes = []
+    for line in result.stdout.strip().split("\n")[1:]:  # 跳过标题行
+        parts = line.split()
+        if len(parts) >= 2 and all(p["pid"] != parts[1] for p in processes):
+            processes.append({
+                "command": parts[0],
+                "cmdline": parts[0],
+                "pid": parts[1],
+                "user": parts[2] if len(parts) > 2 else "unknown"
+            })
+    return processes
+
+
+def find_port_owners(port: int) -> List[Dict]:
+    """
+    查找监听指定 TCP 端口的进程
+
+    Args:
+        port: 端口号
+
+    Returns:
+        进程信息列表（command / cmdline / pid / user）；无权限查看的进程不会出现在结果中
+    """
+    if os.path.exists("/proc/net/tcp"):
+        return _proc_port_owners(port)
+    return _lsof_port_owners(port)
+
+
+def wait_until(condition: Callable[[], bool], timeout: float,
+               interval: float = POLL_INTERVAL) -> bool:
+    """
+    轮询等待条件成立，代替固定时长的 sleep
+
+    Args:
+        condition: 条件函数
+        timeout: 最长等待时间（秒）
+        interval: 轮询间隔（秒）
+
+    Returns:
+        条件是否在超时前成立
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if condition():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
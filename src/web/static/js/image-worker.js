@@ -0,0 +1,106 @@
+/**
+ * 图片预处理 Worker
+ * 在后台线程中缩放、重新编码图片，生成预览缩略图与 SHA-256，避免阻塞页面
+ */
+
+/**
+ * 计算内容的 SHA-256（仅在安全上下文中可用）
+ */
+async function computeHash(blob) {
+    if (!self.crypto?.subtle) {
+        return null;
+    }
+    try {
+        const digest = await self.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest))
+            .map(byte => byte.toString(16).padStart(2, '0'))
+            .join('');
+    } catch (error) {
+        return null;
+    }
+}
+
+/**
+ * 将位图按比例绘制到画布并编码
+ */
+async function encodeScaled(bitmap, scale, type, quality) {
+    const width = Math.max(1, Math.round(bitmap.width * scale));
+    const height = Math.max(1, Math.round(bitmap.height * scale));
+    const canvas = new OffscreenCanvas(width, height);
+    const context = canvas.getContext('2d');
+    context.imageSmoothingQuality = 'high';
+    context.drawImage(bitmap, 0, 0, width, height);
+
+    // 浏览器不支持目标格式时 convertToBlob 会回退为 PNG，以 blob.type 为准
+    const blob = await canvas.convertToBlob({ type, quality });
+    return { blob, width, height };
+}
+
+/**
+ * 按最大边长缩放并重新编码；不需要处理或结果不合适时返回 null
+ */
+async function downscale(file, bitmap, options) {
+    // 动图重新绘制会丢失动画帧
+    if (file.type === 'image/gif') {
+        return null;
+    }
+
+    const scale = Math.min(1, options.maxDimension / Math.max(bitmap.width, bitmap.height));
+    if (scale === 1 && file.size <= options.reencodeAbove) {
+        return null;
+    }
+
+    const encoded = await encodeScaled(bitmap, scale, options.outputType, options.quality);
+    if (!options.allowedTypes.includes(encoded.blob.type)) {
+        return null;
+    }
+    if (scale === 1 && encoded.blob.size >= file.size) {
+        return null;
+    }
+    return encoded;
+}
+
+/**
+ * 生成预览缩略图；图片本身已足够小时返回 null，直接预览原图
+ */
+async function makeThumbnail(bitmap, options) {
+    const scale = Math.min(1, options.thumbnailSize / Math.max(bitmap.width, bitmap.height));
+    if (scale === 1) {
+        return null;
+    }
+    const thumbnail = await encodeScaled(bitmap, scale, 'image/webp', 0.8);
+    return thumbnail.blob;
+}
+
+self.onmessage = async (event) => {
+    const { id, file, options } = event.data;
+    try {
+        let processed = null;
+        let thumbnail = null;
+
+        if (typeof OffscreenCanvas !== 'undefined') {
+            const bitmap = await createImageBitmap(file);
+            try {
+                processed = await downscale(file, bitmap, options);
+                thumbnail = await makeThumbnail(bitmap, options);
+            } finally {
+                bitmap.close();
+            }
+        }
+
+        const blob = processed ? processed.blob : file;
+        self.postMessage({
+            id,
+            resized: Boolean(processed),
+            blob: blob,
+            thumbnail: thumbnail,
+            type: blob.type,
+            size: blob.size,
+            width: processed?.width,
+            height: processed?.height,
+            hash: await computeHash(blob)
+        });
+    } catch (error) {
+        self.postMessage({ id, error: String(error) });
+    }
+};
@@ -1,12 +1,61 @@
 /**
  * 主应用逻辑
  */
+
+// 扩展名 -> MIME 类型
+const IMAGE_EXTENSION_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.bmp': 'image/bmp'
+};
+
+// 未超过最大边长的图片，只有大于该字节数时才尝试重新编码
+const REENCODE_ABOVE_BYTES = 1024 * 1024;
+
+// 可在 Worker 中缩小的原始文件最多允许为上传上限的倍数
+const MAX_SOURCE_SIZE_FACTOR = 4;
+
+// 预览缩略图的最大边长（CSS 像素）
+const THUMBNAIL_SIZE = 160;
+
+// 提交后显示成功状态的时间（毫秒）；队列中还有请求时更快切换到下一个
+const SUBMIT_HIDE_DELAY = 3000;
+const QUEUE_ADVANCE_DELAY = 800;
+
+// 剩余时间少于该秒数时在队列中高亮
+const URGENT_SECONDS = 60;
+
 class FeedbackApp {
     constructor() {
         this.currentRequestId = null;
+        // 当前请求的批量问题
+        this.currentQuestions = [];
         this.uploadedImages = [];
         this.isSubmitting = false;
         this.pasteListenerSetup = false;
+        // 等待服务器回复的图片哈希查询
+        this.pendingBlobChecks = new Map();
+        // 服务器要求重新上传的图片哈希：下次提交时不再只发送哈希
+        this.resendHashes = new Set();
+        // 尚未确认的提交消息（类型:请求ID -> 消息），被服务器限流时重发
+        this.unconfirmedSubmissions = new Map();
+        // 提交后隐藏表单的定时器
+        this.submitHideTimer = null;
+        // 服务器维护的待回答请求队列（已排序）、切换请求时保存的草稿、服务器与本地的时钟差
+        this.requestQueue = [];
+        this.requestDrafts = new Map();
+        this.clockOffset = 0;
+        this.queueTimer = null;
+        // Service Worker 已更新页面资源，空闲时重新加载
+        this.reloadWhenIdle = false;
+        // 图片预处理 Worker 及等待中的任务
+        this.imageWorker = null;
+        this.imageJobs = new Map();
+        this.nextImageJobId = 0;
+        this.imageWorkerDisabled = false;
 
         // DOM 元素
         this.elements = {};
@@ -36,10 +85,56 @@ class FeedbackApp {
         this.initEventListeners();
         this.initWebSocketHandlers();
         this.loadUserSettings();
+        this.initServiceWorker();
 
         console.log('Feedback collection app initialized');
     }
 
+    /**
+     * 注册 Service Worker 缓存页面与资源；页面加载完成后再注册，不与 WebSocket 连接争用
+     * 新版本接管后（资源已更新）在没有待回答的请求时重新加载页面
+     */
+    initServiceWorker() {
+        if (!('serviceWorker' in navigator)) {
+            return;
+        }
+
+        if (!window.APP_CONFIG?.serviceWorker) {
+            // 服务器关闭了离线缓存：注销此前注册的 Service Worker
+            navigator.serviceWorker.getRegistrations()
+                .then(registrations => registrations.forEach(registration => registration.unregister()))
+                .catch(() => undefined);
+            return;
+        }
+
+        const hadController = Boolean(navigator.serviceWorker.controller);
+        navigator.serviceWorker.addEventListener('controllerchange', () => {
+            if (hadController) {
+                this.reloadWhenIdle = true;
+                this.reloadIfIdle();
+            }
+        });
+
+        const register = () => {
+            navigator.serviceWorker.register('/sw.js', { scope: '/' })
+                .catch(error => console.warn('Service worker registration failed:', error));
+        };
+        if (document.readyState === 'complete') {
+            register();
+        } else {
+            window.addEventListener('load', register, { once: true });
+        }
+    }
+
+    /**
+     * 页面资源已更新时，在没有正在回答或排队的请求时重新加载
+     */
+    reloadIfIdle() {
+        if (this.reloadWhenIdle && this.isIdle() && this.requestQueue.length === 0) {
+            window.location.reload();
+        }
+    }
+
     /**
      * 初始化DOM元素引用
      */
@@ -50,6 +145,8 @@ class FeedbackApp {
             submitStatus: document.getElementById('submitStatus'),
             requestInfo: document.getElementById('requestInfo'),
             feedbackText: document.getElementById('feedbackText'),
+            questionsSection: document.getElementById('questionsSection'),
+            questionList: document.getElementById('questionList'),
             uploadArea: document.getElementById('uploadArea'),
             fileInput: document.getElementById('fileInput'),
             imagePreview: document.getElementById('imagePreview'),
@@ -62,6 +159,9 @@ class FeedbackApp {
             statusIcon: document.getElementById('statusIcon'),
             statusTitle: document.getElementById('statusTitle'),
             statusMessage: document.getElementById('statusMessage'),
+            requestQueue: document.getElementById('requestQueue'),
+            queueList: document.getElementById('queueList'),
+            queueCount: document.getElementById('queueCount'),
             notifications: document.getElementById('notifications')
         };
     }
@@ -149,6 +249,12 @@ class FeedbackApp {
                     this.cancelFeedback();
                 }
             }
+
+            // Alt+↑ / Alt+↓ 切换到队列中的上一个 / 下一个请求
+            if (e.altKey && (e.key === 'ArrowUp' || e.key === 'ArrowDown')) {
+                e.preventDefault();
+                this.switchRequestBy(e.key === 'ArrowDown' ? 1 : -1);
+            }
         });
 
         // 文本框自动调整高度
@@ -181,6 +287,11 @@ class FeedbackApp {
             this.handleFeedbackRequest(data);
         });
 
+        // 待回答请求队列（连接时及队列变化时由服务器发送）
+        window.wsManager.onMessageType('request_queue', (data) => {
+            this.handleRequestQueue(data);
+        });
+
         // 反馈响应
         window.wsManager.onMessageType('feedback_response', (data) => {
             this.handleFeedbackResponse(data);
@@ -202,6 +313,50 @@ class FeedbackApp {
             this.handleRequestCancelled(data);
         });
 
+        // 提交被服务器拒绝（图片过大或格式不允许）
+        window.wsManager.onMessageType('feedback_rejected', (data) => {
+            this.handleFeedbackRejected(data);
+        });
+
+        // 消息超过服务器允许的大小，连接已被服务器关闭
+        window.wsManager.onMessageType('message_too_big', (data) => {
+            this.handleFeedbackRejected({ message: this.getText('message_too_large') });
+        });
+
+        // 消息过于频繁，服务器已丢弃部分消息；上传数据块由上传器重发，提交在等待后重发
+        window.wsManager.onMessageType('rate_limited', (data) => {
+            if (data.upload_id) {
+                return;
+            }
+            const submission = this.unconfirmedSubmissions.get(`${data.message_type}:${data.request_id}`);
+            if (submission) {
+                setTimeout(() => window.wsManager.send(submission), (data.retry_after || 0) * 1000);
+                return;
+            }
+            this.showNotification('warning', this.getText('rate_limited'));
+        });
+
+        // 服务器已存储提交
+        window.wsManager.onMessageType('feedback_received', (data) => {
+            this.unconfirmedSubmissions.delete(`feedback_submit:${data.request_id}`);
+            if (!data.partial) {
+                this.unconfirmedSubmissions.delete(`feedback_images:${data.request_id}`);
+            }
+        });
+
+        // 服务器平滑重启，连接将自动恢复
+        window.wsManager.onMessageType('server_restarting', (data) => {
+            this.showNotification('info', this.getText('server_restarting'));
+        });
+
+        // 图片哈希查询结果
+        window.wsManager.onMessageType('blob_check_result', (data) => {
+            const resolve = this.pendingBlobChecks.get(data.check_id);
+            if (resolve) {
+                resolve(data.known || []);
+            }
+        });
+
         // 连接状态变化
         window.wsManager.onConnectionChange((status) => {
             if (status === 'connected') {
@@ -213,19 +368,68 @@ class FeedbackApp {
     }
 
     /**
-     * 处理反馈请求
+     * 处理反馈请求：没有正在回答的请求时直接显示，否则加入队列
      */
     handleFeedbackRequest(data) {
         console.log('收到反馈请求:', data);
 
+        if (!this.requestQueue.some(request => request.id === data.id)) {
+            this.requestQueue.push(data);
+        }
+
+        if (this.isIdle()) {
+            this.activateRequest(data);
+        } else if (data.id !== this.currentRequestId) {
+            this.showNotification('info', this.getText('request_queued'));
+            this.renderQueue();
+        }
+    }
+
+    /**
+     * 处理队列快照：更新队列面板，丢弃已不在队列中的草稿，空闲时显示队首请求
+     */
+    handleRequestQueue(data) {
+        this.requestQueue = data.requests || [];
+        if (data.server_time) {
+            this.clockOffset = data.server_time * 1000 - Date.now();
+        }
+
+        const queued = new Set(this.requestQueue.map(request => request.id));
+        for (const [requestId, draft] of this.requestDrafts) {
+            if (!queued.has(requestId)) {
+                this.releaseImages(draft.images);
+                this.requestDrafts.delete(requestId);
+            }
+        }
+
+        if (this.isIdle()) {
+            this.activateNextRequest();
+        }
+        this.renderQueue();
+    }
+
+    /**
+     * 是否没有正在回答或正在提交的请求
+     */
+    isIdle() {
+        return !this.currentRequestId && !this.isSubmitting && !this.submitHideTimer;
+    }
+
+    /**
+     * 显示请求，恢复切换离开时保存的草稿
+     */
+    activateRequest(data) {
         this.currentRequestId = data.id;
 
         // 更新请求信息
         if (this.elements.requestInfo) {
             const timeout = data.timeout || 600;
-            const timeoutText = this.getText('timeout');
+            const summary = data.summary
+                ? `<strong>${this.escapeHtml(data.summary)}</strong><br>`
+                : '';
             this.elements.requestInfo.innerHTML = `
-                <strong>请求ID:</strong> ${data.id}<br>
+                ${summary}
+                <strong>请求ID:</strong> ${this.escapeHtml(data.id)}<br>
                 <strong>超时时间:</strong> ${timeout}秒<br>
                 <strong>请求时间:</strong> ${new Date(data.timestamp).toLocaleString()}
             `;
@@ -233,6 +437,9 @@ class FeedbackApp {
 
         // 显示反馈表单
         this.showFeedbackForm();
+        this.renderQuestions(data.questions || []);
+        this.restoreDraft(data.id);
+        this.renderQueue();
 
         // 聚焦到文本框
         setTimeout(() => {
@@ -240,6 +447,317 @@ class FeedbackApp {
         }, 100);
     }
 
+    /**
+     * 显示队列中下一个请求（按服务器排序），队列为空时保持等待状态
+     */
+    activateNextRequest() {
+        const next = this.requestQueue.find(request => !this.isExpired(request));
+        if (next) {
+            this.activateRequest(next);
+        }
+    }
+
+    /**
+     * 切换到队列中的另一个请求，当前请求已填写的内容保存为草稿
+     */
+    switchRequest(requestId) {
+        if (this.isSubmitting || this.submitHideTimer || requestId === this.currentRequestId) {
+            return;
+        }
+        const target = this.requestQueue.find(request => request.id === requestId);
+        if (!target) {
+            return;
+        }
+
+        this.saveDraft();
+        this.activateRequest(target);
+    }
+
+    /**
+     * 按队列顺序切换到相邻的请求
+     */
+    switchRequestBy(step) {
+        if (this.requestQueue.length < 2) {
+            return;
+        }
+        const index = this.requestQueue.findIndex(request => request.id === this.currentRequestId);
+        const next = (index + step + this.requestQueue.length) % this.requestQueue.length;
+        this.switchRequest(this.requestQueue[next].id);
+    }
+
+    /**
+     * 保存当前请求的文字与图片（图片预览保持有效），表单随后由 activateRequest 清空
+     */
+    saveDraft() {
+        if (!this.currentRequestId) {
+            return;
+        }
+        const text = this.elements.feedbackText?.value || '';
+        const answers = this.collectAnswers();
+        if (text || this.uploadedImages.length > 0 || Object.keys(answers).length > 0) {
+            this.requestDrafts.set(this.currentRequestId, { text, answers, images: this.uploadedImages });
+        }
+        this.uploadedImages = [];
+    }
+
+    /**
+     * 恢复请求的草稿
+     */
+    restoreDraft(requestId) {
+        const draft = this.requestDrafts.get(requestId);
+        if (!draft) {
+            return;
+        }
+        this.requestDrafts.delete(requestId);
+
+        if (this.elements.feedbackText) {
+            this.elements.feedbackText.value = draft.text;
+            this.elements.feedbackText.style.height = 'auto';
+            this.elements.feedbackText.style.height = this.elements.feedbackText.scrollHeight + 'px';
+        }
+        this.applyAnswers(draft.answers);
+        this.uploadedImages = draft.images;
+        this.updateImagePreview();
+    }
+
+    /**
+     * 渲染批量问题；没有问题时隐藏问题区域
+     */
+    renderQuestions(questions) {
+        this.currentQuestions = questions;
+        const { questionsSection: section, questionList: list } = this.elements;
+        if (!section || !list) {
+            return;
+        }
+
+        list.innerHTML = '';
+        section.style.display = questions.length > 0 ? 'block' : 'none';
+
+        questions.forEach((question, index) => {
+            const item = document.createElement('div');
+            item.className = 'question-item';
+            item.dataset.questionId = question.id;
+
+            const prompt = document.createElement('label');
+            prompt.className = 'question-prompt';
+            prompt.textContent = `${index + 1}. ${question.prompt}`;
+            if (question.required) {
+                const mark = document.createElement('span');
+                mark.className = 'required-mark';
+                mark.textContent = '*';
+                prompt.appendChild(mark);
+            }
+            item.appendChild(prompt);
+
+            const name = `question-${index}`;
+            if (question.type === 'text') {
+                const input = document.createElement('textarea');
+                input.className = 'feedback-textarea';
+                input.name = name;
+                input.rows = 2;
+                item.appendChild(input);
+            } else {
+                // 确认题显示为“是 / 否”两个单选项
+                const options = question.type === 'confirm'
+                    ? [[true, this.getText('answer_yes')], [false, this.getText('answer_no')]]
+                    : question.options.map(option => [option, option]);
+                const group = document.createElement('div');
+                group.className = 'question-options';
+                options.forEach(([value, label]) => {
+                    const option = document.createElement('label');
+                    option.className = 'question-option';
+                    const input = document.createElement('input');
+                    input.type = question.type === 'multi_choice' ? 'checkbox' : 'radio';
+                    input.name = name;
+                    input.value = JSON.stringify(value);
+                    const text = document.createElement('span');
+                    text.textContent = label;
+                    option.appendChild(input);
+                    option.appendChild(text);
+                    group.appendChild(option);
+                });
+                item.appendChild(group);
+            }
+
+            item.addEventListener('input', () => item.classList.remove('missing'));
+            list.appendChild(item);
+        });
+    }
+
+    /**
+     * 读取已填写的答案，未回答的问题不包含在结果中
+     */
+    collectAnswers() {
+        const answers = {};
+        const items = this.elements.questionList?.querySelectorAll('.question-item') || [];
+        items.forEach((item, index) => {
+            const question = this.currentQuestions[index];
+            if (!question) {
+                return;
+            }
+            if (question.type === 'text') {
+                const value = item.querySelector('textarea').value.trim();
+                if (value) {
+                    answers[question.id] = value;
+                }
+                return;
+            }
+            const checked = Array.from(item.querySelectorAll('input:checked'))
+                .map(input => JSON.parse(input.value));
+            if (question.type === 'multi_choice') {
+                if (checked.length > 0) {
+                    answers[question.id] = checked;
+                }
+            } else if (checked.length > 0) {
+                answers[question.id] = checked[0];
+            }
+        });
+        return answers;
+    }
+
+    /**
+     * 将草稿中的答案填回表单
+     */
+    applyAnswers(answers) {
+        if (!answers) {
+            return;
+        }
+        const items = this.elements.questionList?.querySelectorAll('.question-item') || [];
+        items.forEach((item, index) => {
+            const question = this.currentQuestions[index];
+            if (!question || !(question.id in answers)) {
+                return;
+            }
+            const value = answers[question.id];
+            if (question.type === 'text') {
+                item.querySelector('textarea').value = value;
+                return;
+            }
+            const selected = new Set((Array.isArray(value) ? value : [value]).map(v => JSON.stringify(v)));
+            item.querySelectorAll('input').forEach(input => {
+                input.checked = selected.has(input.value);
+            });
+        });
+    }
+
+    /**
+     * 标记未回答的必答问题，返回是否全部已回答
+     */
+    checkRequiredAnswers(answers) {
+        let complete = true;
+        const items = this.elements.questionList?.querySelectorAll('.question-item') || [];
+        items.forEach((item, index) => {
+            const question = this.currentQuestions[index];
+            const missing = question && question.required && !(question.id in answers);
+            item.classList.toggle('missing', Boolean(missing));
+            if (missing && complete) {
+                item.scrollIntoView({ behavior: 'smooth', block: 'center' });
+                complete = false;
+            }
+        });
+        return complete;
+    }
+
+    /**
+     * 请求完成、取消或关闭后从本地队列移除（服务器随后发送的快照会确认）
+     */
+    removeFromQueue(requestId) {
+        this.requestQueue = this.requestQueue.filter(request => request.id !== requestId);
+        const draft = this.requestDrafts.get(requestId);
+        if (draft) {
+            this.releaseImages(draft.images);
+            this.requestDrafts.delete(requestId);
+        }
+        this.renderQueue();
+    }
+
+    /**
+     * 请求剩余的秒数（按服务器时钟）
+     */
+    remainingSeconds(request) {
+        if (!request.deadline) {
+            return null;
+        }
+        return Math.floor((request.deadline * 1000 - Date.now() - this.clockOffset) / 1000);
+    }
+
+    isExpired(request) {
+        const remaining = this.remainingSeconds(request);
+        return remaining !== null && remaining <= 0;
+    }
+
+    /**
+     * 渲染队列面板：只有一个请求且正在回答时隐藏
+     */
+    renderQueue() {
+        const { requestQueue: panel, queueList: list, queueCount: count } = this.elements;
+        if (!panel || !list) {
+            return;
+        }
+
+        const requests = this.requestQueue.filter(request => !this.isExpired(request));
+        const visible = requests.some(request => request.id !== this.currentRequestId);
+        panel.style.display = visible ? 'block' : 'none';
+        if (count) {
+            count.textContent = requests.length;
+        }
+
+        // 有队列时每秒刷新剩余时间
+        if (visible && !this.queueTimer) {
+            this.queueTimer = setInterval(() => this.renderQueue(), 1000);
+        } else if (!visible && this.queueTimer) {
+            clearInterval(this.queueTimer);
+            this.queueTimer = null;
+        }
+        if (!visible) {
+            return;
+        }
+
+        list.innerHTML = '';
+        requests.forEach(request => {
+            const item = document.createElement('li');
+            item.className = 'queue-item';
+            if (request.id === this.currentRequestId) {
+                item.classList.add('active');
+            }
+            item.onclick = () => this.switchRequest(request.id);
+
+            if (request.priority) {
+                const priority = document.createElement('span');
+                priority.className = 'queue-priority';
+                priority.title = this.getText('queue_priority');
+                priority.textContent = `P${request.priority}`;
+                item.appendChild(priority);
+            }
+
+            const summary = document.createElement('span');
+            summary.className = 'queue-summary';
+            summary.textContent = request.summary || request.id.slice(0, 8);
+            summary.title = request.summary || request.id;
+            item.appendChild(summary);
+
+            if (request.caller) {
+                const caller = document.createElement('span');
+                caller.className = 'queue-caller';
+                caller.textContent = request.caller;
+                item.appendChild(caller);
+            }
+
+            const remaining = this.remainingSeconds(request);
+            if (remaining !== null) {
+                const time = document.createElement('span');
+                time.className = 'queue-remaining';
+                if (remaining < URGENT_SECONDS) {
+                    time.classList.add('urgent');
+                }
+                time.textContent = `${Math.floor(remaining / 60)}:${String(remaining % 60).padStart(2, '0')}`;
+                item.appendChild(time);
+            }
+
+            list.appendChild(item);
+        });
+    }
+
     /**
      * 处理反馈响应
      */
@@ -262,17 +780,88 @@ class FeedbackApp {
         }, 3000);
     }
 
+    /**
+     * 处理被拒绝的提交：恢复表单，保留已填写的内容，用户可修改后重新提交
+     */
+    handleFeedbackRejected(data) {
+        console.warn('提交被拒绝:', data);
+
+        if (this.submitHideTimer) {
+            clearTimeout(this.submitHideTimer);
+            this.submitHideTimer = null;
+        }
+        if (data.request_id && !this.currentRequestId) {
+            this.currentRequestId = data.request_id;
+        }
+        this.isSubmitting = false;
+
+        this.unconfirmedSubmissions.delete(`feedback_submit:${data.request_id}`);
+        this.unconfirmedSubmissions.delete(`feedback_images:${data.request_id}`);
+
+        // 只发送了哈希的图片已不在服务器缓存中：带上数据自动重新提交一次
+        const missing = (data.missing_hashes || []).filter(hash => !this.resendHashes.has(hash));
+        if (missing.length > 0 && this.currentRequestId === data.request_id) {
+            missing.forEach(hash => this.resendHashes.add(hash));
+            this.showNotification('info', this.escapeHtml(data.message));
+            this.submitFeedback();
+            return;
+        }
+
+        // 说明中包含文件名，转义后再显示
+        const lines = [data.message, ...(data.errors || [])].map(line => this.escapeHtml(line));
+        this.showNotification('error', lines.join('<br>'), 8000);
+
+        if (this.currentRequestId) {
+            this.elements.waitingState.style.display = 'none';
+            this.elements.submitStatus.style.display = 'none';
+            this.elements.feedbackForm.style.display = 'block';
+        }
+    }
+
+    /**
+     * 分块上传带数据的图片，提交中只引用上传ID
+     * 返回已上传图片的引用与上传失败的图片（失败原因会随反馈一起交给调用方）
+     */
+    async uploadImages(images) {
+        const pending = images.filter(image => image.blob);
+
+        this.elements.feedbackForm.style.display = 'none';
+        this.elements.submitStatus.style.display = 'block';
+
+        const uploaded = [];
+        const failed = [];
+        let index = 0;
+        for (const image of images) {
+            if (!image.blob) {
+                uploaded.push(image);
+                continue;
+            }
+            index++;
+            this.updateSubmitStatus('loading', this.getText('uploading_images'), `${index}/${pending.length}`);
+            try {
+                const uploadId = await window.uploader.upload(image);
+                uploaded.push({
+                    name: image.name,
+                    size: image.size,
+                    type: image.type,
+                    hash: image.hash,
+                    upload_id: uploadId,
+                    uploadTime: image.uploadTime
+                });
+            } catch (error) {
+                console.error('Image upload failed:', image.name, error);
+                failed.push({ name: image.name, message: error.message });
+            }
+        }
+        return { uploaded, failed };
+    }
+
     /**
      * 处理请求超时
      */
     handleRequestTimeout(data) {
         console.log('请求超时:', data);
-        this.updateSubmitStatus('error', this.getText('timeout'), data.message);
-        this.showNotification('warning', this.getText('timeout'));
-
-        setTimeout(() => {
-            this.hideFeedbackForm();
-        }, 3000);
+        this.dismissRequest(data, 'timeout', 'warning');
     }
 
     /**
@@ -280,11 +869,34 @@ class FeedbackApp {
      */
     handleRequestCancelled(data) {
         console.log('请求取消:', data);
-        this.updateSubmitStatus('error', this.getText('cancelled'), data.message);
-        this.showNotification('info', this.getText('cancelled'));
+        this.dismissRequest(data, 'cancelled', 'info');
+    }
+
+    /**
+     * 关闭已超时或被调用方取消的请求；消息带有请求ID时只处理当前显示的请求
+     */
+    dismissRequest(data, textKey, level) {
+        if (data.request_id && data.request_id !== this.currentRequestId) {
+            this.removeFromQueue(data.request_id);
+            return;
+        }
 
+        const requestId = this.currentRequestId;
+        this.removeFromQueue(requestId);
+        this.isSubmitting = false;
+        if (this.submitHideTimer) {
+            clearTimeout(this.submitHideTimer);
+            this.submitHideTimer = null;
+        }
+
+        this.updateSubmitStatus('error', this.getText(textKey), data.message);
+        this.showNotification(level, this.getText(textKey));
+
+        // 期间收到新的请求时不再隐藏
         setTimeout(() => {
-            this.hideFeedbackForm();
+            if (this.currentRequestId === requestId) {
+                this.hideFeedbackForm();
+            }
         }, 3000);
     }
 
@@ -313,6 +925,11 @@ class FeedbackApp {
 
         this.currentRequestId = null;
         this.clearFormContent(); // 只清空内容，保持用户设置
+
+        // 继续回答队列中的下一个请求
+        this.activateNextRequest();
+        this.renderQueue();
+        this.reloadIfIdle();
     }
 
     /**
@@ -328,43 +945,158 @@ class FeedbackApp {
         // 获取反馈内容
         const text = this.elements.feedbackText?.value?.trim() || '';
         const autoAppend = this.elements.autoAppend?.checked ?? true;
+        const answers = this.collectAnswers();
+
+        // 批量问题：必答问题都回答后才能提交
+        if (this.currentQuestions.length > 0 && !this.checkRequiredAnswers(answers)) {
+            this.showNotification('warning', this.getText('answers_required'));
+            this.isSubmitting = false;
+            return;
+        }
 
-        // 检查是否有内容
-        if (!text && this.uploadedImages.length === 0) {
+        // 检查是否有内容（回答了问题时文字与图片可以为空）
+        if (!text && this.uploadedImages.length === 0 && Object.keys(answers).length === 0) {
             this.showNotification('warning', this.getText('enter_feedback_or_upload'));
             this.isSubmitting = false;
             return;
         }
 
-        // 准备提交数据
+        // 服务器已保存的图片只发送哈希，其余图片需要分块上传（断线重连后续传）
+        const images = await this.prepareImagesForUpload();
+        const requestId = this.currentRequestId;
+        const needsUpload = images.some(image => image.blob);
+
+        // 准备提交数据；有图片需要上传时先提交文字，图片上传完成后再补充
         const submitData = {
             type: 'feedback_submit',
-            request_id: this.currentRequestId,
+            request_id: requestId,
             text: text,
-            images: this.uploadedImages,
+            answers: answers,
+            images: needsUpload ? [] : images,
+            images_pending: needsUpload ? images.length : 0,
             auto_append: autoAppend,
             language: window.APP_CONFIG?.language || 'CN',
             timestamp: new Date().toISOString()
         };
 
         // 发送数据
-        const success = window.wsManager.send(submitData);
+        let success = this.sendSubmission(submitData);
+
+        if (success && needsUpload) {
+            const { uploaded, failed } = await this.uploadImages(images);
+            try {
+                await window.uploader.waitForConnection(Date.now() + window.uploader.stallTimeout);
+                success = this.sendSubmission({
+                    type: 'feedback_images',
+                    request_id: requestId,
+                    images: uploaded,
+                    failed: failed
+                });
+            } catch (error) {
+                success = false;
+            }
+
+            if (failed.length > 0) {
+                const lines = [this.getText('upload_rejected'), ...failed.map(item => `${item.name}: ${item.message}`)];
+                this.showNotification('error', lines.map(line => this.escapeHtml(line)).join('<br>'), 8000);
+            }
+        }
 
         if (!success) {
-            this.showNotification('error', this.getText('send_failed'));
-            this.isSubmitting = false;
+            // 恢复表单，重新提交时已上传的数据会被复用
+            this.handleFeedbackRejected({ message: this.getText('send_failed') });
         } else {
             // 发送成功，立即显示提交成功
             this.updateSubmitStatus('success', this.getText('submitted'), this.getText('feedback_submitted_success'));
             this.elements.feedbackForm.style.display = 'none';
             this.elements.submitStatus.style.display = 'block';
             this.showNotification('success', this.getText('submit_success'));
+            this.removeFromQueue(requestId);
 
-            // 3秒后隐藏界面
-            setTimeout(() => {
-                this.hideFeedbackForm();
+            // 稍后隐藏界面并切换到下一个请求（提交被服务器拒绝时取消）
+            const delay = this.requestQueue.length > 0 ? QUEUE_ADVANCE_DELAY : SUBMIT_HIDE_DELAY;
+            this.submitHideTimer = setTimeout(() => {
+                this.submitHideTimer = null;
                 this.isSubmitting = false;
-            }, 3000);
+                this.hideFeedbackForm();
+            }, delay);
+        }
+    }
+
+    /**
+     * 发送提交消息，并在服务器确认前保留，被限流时可以重发
+     */
+    sendSubmission(message) {
+        this.unconfirmedSubmissions.set(`${message.type}:${message.request_id}`, message);
+        return window.wsManager.send(message);
+    }
+
+    /**
+     * 准备待上传的图片：服务器已有相同内容时只发送哈希
+     */
+    async prepareImagesForUpload() {
+        const hashes = this.uploadedImages.map(image => image.hash).filter(Boolean);
+        const known = await this.checkKnownImages(hashes);
+
+        return this.uploadedImages.map(image => {
+            if (!known.has(image.hash) || this.resendHashes.has(image.hash)) {
+                return image;
+            }
+            return {
+                name: image.name,
+                size: image.size,
+                type: image.type,
+                hash: image.hash,
+                uploadTime: image.uploadTime
+            };
+        });
+    }
+
+    /**
+     * 向服务器查询哪些图片哈希已保存，超时或失败时视为都未保存
+     */
+    checkKnownImages(hashes) {
+        if (hashes.length === 0) {
+            return Promise.resolve(new Set());
+        }
+
+        const checkId = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        return new Promise((resolve) => {
+            const finish = (known) => {
+                clearTimeout(timer);
+                this.pendingBlobChecks.delete(checkId);
+                resolve(new Set(known));
+            };
+            const timer = setTimeout(() => finish([]), 2000);
+            this.pendingBlobChecks.set(checkId, finish);
+
+            const sent = window.wsManager.send({
+                type: 'blob_check',
+                check_id: checkId,
+                hashes: hashes
+            });
+            if (!sent) {
+                finish([]);
+            }
+        });
+    }
+
+    /**
+     * 计算文件内容的 SHA-256（仅在安全上下文中可用）
+     */
+    async computeImageHash(file) {
+        if (!window.crypto?.subtle) {
+            return null;
+        }
+
+        try {
+            const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+            return Array.from(new Uint8Array(digest))
+                .map(byte => byte.toString(16).padStart(2, '0'))
+                .join('');
+        } catch (error) {
+            console.warn('Failed to hash image:', error);
+            return null;
         }
     }
 
@@ -390,6 +1122,7 @@ class FeedbackApp {
             } else {
                 console.warn('发送取消反馈消息失败');
             }
+            this.removeFromQueue(this.currentRequestId);
         }
 
         this.hideFeedbackForm();
@@ -405,8 +1138,11 @@ class FeedbackApp {
             this.elements.feedbackText.style.height = 'auto';
         }
 
+        this.releaseImages(this.uploadedImages);
         this.uploadedImages = [];
+        this.resendHashes.clear();
         this.updateImagePreview();
+        this.renderQuestions([]);
 
         this.isSubmitting = false;
     }
@@ -446,21 +1182,38 @@ class FeedbackApp {
                     continue;
                 }
 
-                // 检查文件大小
-                if (file.size > maxFileSize) {
+                // 检查文件大小（可在 Worker 中缩小的图片允许更大的原始文件）
+                const worker = this.getImageWorker();
+                if (file.size > maxFileSize * (worker ? MAX_SOURCE_SIZE_FACTOR : 1)) {
                     this.showNotification('error', `${file.name}: ${this.getText('file_too_large')}`);
                     continue;
                 }
 
-                // 读取文件
-                const imageData = await this.readFileAsDataURL(file);
+                // 缩放、编码、缩略图与哈希在 Worker 中完成，不阻塞页面
+                const processed = worker
+                    ? await this.processImageInWorker(worker, file)
+                    : {
+                        blob: file,
+                        thumbnail: null,
+                        hash: await this.computeImageHash(file),
+                        size: file.size,
+                        type: file.type
+                    };
+
+                if (processed.size > maxFileSize) {
+                    this.showNotification('error', `${file.name}: ${this.getText('file_too_large')}`);
+                    continue;
+                }
 
-                // 添加到上传列表
+                // 添加到上传列表：完整数据只以 Blob 形式保留，上传时再分块编码；
+                // 预览使用缩略图的对象 URL，移除图片时释放
                 const imageInfo = {
-                    name: file.name,
-                    size: file.size,
-                    type: file.type,
-                    data: imageData,
+                    name: processed.resized ? this.renameForType(file.name, processed.type) : file.name,
+                    size: processed.size,
+                    type: processed.type,
+                    blob: processed.blob,
+                    previewUrl: URL.createObjectURL(processed.thumbnail || processed.blob),
+                    hash: processed.hash,
                     uploadTime: new Date().toISOString()
                 };
 
@@ -477,17 +1230,80 @@ class FeedbackApp {
     }
 
     /**
-     * 读取文件为Data URL
+     * 获取图片预处理 Worker（浏览器不支持时返回 null）
      */
-    readFileAsDataURL(file) {
+    getImageWorker() {
+        if (this.imageWorker || this.imageWorkerDisabled || typeof Worker === 'undefined' || !window.APP_CONFIG?.imageWorkerUrl) {
+            return this.imageWorker;
+        }
+
+        try {
+            this.imageWorker = new Worker(window.APP_CONFIG.imageWorkerUrl);
+            this.imageWorker.onmessage = (event) => {
+                const job = this.imageJobs.get(event.data.id);
+                if (!job) {
+                    return;
+                }
+                this.imageJobs.delete(event.data.id);
+                if (event.data.error) {
+                    job.reject(new Error(event.data.error));
+                } else {
+                    job.resolve(event.data);
+                }
+            };
+            // Worker 脚本加载失败时，结束等待中的任务并改为在页面中读取图片
+            this.imageWorker.onerror = (event) => {
+                console.warn('Image worker failed:', event.message);
+                this.imageJobs.forEach(job => job.reject(new Error(event.message || 'Image worker failed')));
+                this.imageJobs.clear();
+                this.imageWorker.terminate();
+                this.imageWorkerDisabled = true;
+                this.imageWorker = null;
+            };
+        } catch (error) {
+            console.warn('Image worker unavailable:', error);
+            this.imageWorker = null;
+        }
+        return this.imageWorker;
+    }
+
+    /**
+     * 在 Worker 中按服务器配置缩放并重新编码图片
+     */
+    processImageInWorker(worker, file) {
+        const config = window.APP_CONFIG || {};
+        const allowedTypes = (config.allowedExtensions || [])
+            .map(ext => IMAGE_EXTENSION_TYPES[ext])
+            .filter(Boolean);
+        const outputFormat = (config.imageOutputFormat || 'webp').replace('jpg', 'jpeg');
+        const options = {
+            maxDimension: config.imageMaxDimension || 2048,
+            quality: (config.imageQuality || 85) / 100,
+            outputType: `image/${outputFormat}`,
+            allowedTypes: allowedTypes,
+            reencodeAbove: REENCODE_ABOVE_BYTES,
+            thumbnailSize: Math.round(THUMBNAIL_SIZE * (window.devicePixelRatio || 1))
+        };
+
         return new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onload = (e) => resolve(e.target.result);
-            reader.onerror = (e) => reject(e);
-            reader.readAsDataURL(file);
+            const id = ++this.nextImageJobId;
+            this.imageJobs.set(id, { resolve, reject });
+            worker.postMessage({ id, file, options });
         });
     }
 
+    /**
+     * 重新编码后按新格式修改文件扩展名
+     */
+    renameForType(name, type) {
+        const ext = Object.keys(IMAGE_EXTENSION_TYPES).find(key => IMAGE_EXTENSION_TYPES[key] === type);
+        if (!ext) {
+            return name;
+        }
+        const dot = name.lastIndexOf('.');
+        return (dot > 0 ? name.slice(0, dot) : name) + ext;
+    }
+
     /**
      * 更新图片预览
      */
@@ -516,8 +1332,9 @@ class FeedbackApp {
         imageItem.className = 'image-item';
 
         const img = document.createElement('img');
-        img.src = imageInfo.data;
+        img.src = imageInfo.previewUrl;
         img.alt = imageInfo.name;
+        img.decoding = 'async';
 
         const removeBtn = document.createElement('button');
         removeBtn.className = 'image-remove';
@@ -540,10 +1357,23 @@ class FeedbackApp {
      * 移除图片
      */
     removeImage(index) {
-        this.uploadedImages.splice(index, 1);
+        const [removed] = this.uploadedImages.splice(index, 1);
+        this.releaseImages(removed ? [removed] : []);
         this.updateImagePreview();
     }
 
+    /**
+     * 释放图片的预览对象 URL
+     */
+    releaseImages(images) {
+        images.forEach(image => {
+            if (image.previewUrl) {
+                URL.revokeObjectURL(image.previewUrl);
+                image.previewUrl = null;
+            }
+        });
+    }
+
     /**
      * 格式化文件大小
      */
@@ -624,6 +1454,15 @@ class FeedbackApp {
         return texts[key] || key;
     }
 
+    /**
+     * 转义 HTML 特殊字符
+     */
+    escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text ?? '';
+        return div.innerHTML;
+    }
+
     /**
      * 从剪贴板粘贴图片
      */
@@ -724,6 +1563,7 @@ class FeedbackApp {
             return;
         }
 
+        this.releaseImages(this.uploadedImages);
         this.uploadedImages = [];
         this.updateImagePreview();
         this.showNotification('success', this.getText('all_images_cleared'));
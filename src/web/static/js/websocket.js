@@ -8,10 +8,32 @@ class WebSocketManager {
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 1000; // 1秒
+        // 服务器平滑重启时的重连延迟：监听套接字已交给新进程，可以立即重连
+        this.restartReconnectDelay = 200;
+        this.restartPending = false;
         this.heartbeatInterval = null;
         this.messageHandlers = new Map();
         this.connectionCallbacks = [];
 
+        // 断线补发：本标签页的会话ID、服务器实例标识及最后收到的消息序号，重连时交给服务器
+        this.sessionId = this.createSessionId();
+        this.epoch = null;
+        this.lastSeq = 0;
+
+        // 负载压缩（由服务器在 connection_established 中确认）
+        this.compression = null;
+        this.compressionStats = {
+            rawBytesSent: 0,
+            wireBytesSent: 0,
+            rawBytesReceived: 0,
+            wireBytesReceived: 0
+        };
+        this.textEncoder = new TextEncoder();
+        this.textDecoder = new TextDecoder();
+        // 压缩/解压是异步的，用队列保证消息顺序
+        this.sendChain = Promise.resolve();
+        this.receiveChain = Promise.resolve();
+
         // 绑定方法
         this.connect = this.connect.bind(this);
         this.disconnect = this.disconnect.bind(this);
@@ -28,11 +50,21 @@ class WebSocketManager {
     connect() {
         try {
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const wsUrl = `${protocol}//${window.location.host}/ws`;
+            const params = new URLSearchParams({ session: this.sessionId });
+            if (this.supportsCompression()) {
+                params.set('compress', 'deflate');
+            }
+            if (this.epoch) {
+                params.set('epoch', this.epoch);
+                params.set('last_seq', String(this.lastSeq));
+            }
+            const wsUrl = `${protocol}//${window.location.host}/ws?${params}`;
 
             console.log('Connecting to WebSocket:', wsUrl);
 
+            this.compression = null;
             this.ws = new WebSocket(wsUrl);
+            this.ws.binaryType = 'arraybuffer';
             this.ws.onopen = this.onOpen;
             this.ws.onmessage = this.onMessage;
             this.ws.onclose = this.onClose;
@@ -68,8 +100,22 @@ class WebSocketManager {
 
         try {
             const message = JSON.stringify(data);
-            this.ws.send(message);
             console.log('Sending message:', data);
+
+            if (!this.compression) {
+                this.ws.send(message);
+                return true;
+            }
+
+            const ws = this.ws;
+            this.sendChain = this.sendChain
+                .then(() => this.encodeFrame(message))
+                .then((frame) => {
+                    if (ws.readyState === WebSocket.OPEN) {
+                        ws.send(frame);
+                    }
+                })
+                .catch((error) => console.error('Failed to send message:', error));
             return true;
         } catch (error) {
             console.error('Failed to send message:', error);
@@ -77,6 +123,56 @@ class WebSocketManager {
         }
     }
 
+    /**
+     * 生成本标签页的会话ID
+     */
+    createSessionId() {
+        if (window.crypto?.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    /**
+     * 浏览器是否支持负载压缩
+     */
+    supportsCompression() {
+        return typeof CompressionStream !== 'undefined' && typeof DecompressionStream !== 'undefined';
+    }
+
+    /**
+     * 编码待发送消息：超过阈值时压缩为二进制帧
+     */
+    async encodeFrame(message) {
+        const bytes = this.textEncoder.encode(message);
+        this.compressionStats.rawBytesSent += bytes.length;
+
+        if (bytes.length < this.compression.threshold) {
+            this.compressionStats.wireBytesSent += bytes.length;
+            return message;
+        }
+
+        const stream = new Blob([bytes]).stream().pipeThrough(new CompressionStream(this.compression.encoding));
+        const compressed = await new Response(stream).arrayBuffer();
+        this.compressionStats.wireBytesSent += compressed.byteLength;
+        return compressed;
+    }
+
+    /**
+     * 解码收到的帧：二进制帧为压缩后的 JSON
+     */
+    async decodeFrame(frame) {
+        if (typeof frame === 'string') {
+            return frame;
+        }
+
+        const stream = new Blob([frame]).stream().pipeThrough(new DecompressionStream('deflate'));
+        const bytes = await new Response(stream).arrayBuffer();
+        this.compressionStats.rawBytesReceived += bytes.byteLength;
+        this.compressionStats.wireBytesReceived += frame.byteLength;
+        return this.textDecoder.decode(bytes);
+    }
+
     /**
      * 连接打开事件
      */
@@ -105,11 +201,44 @@ class WebSocketManager {
      * 接收消息事件
      */
     onMessage(event) {
+        this.receiveChain = this.receiveChain
+            .then(() => this.decodeFrame(event.data))
+            .then((message) => this.dispatchMessage(message))
+            .catch((error) => console.error('Message processing failed:', error));
+    }
+
+    /**
+     * 分发已解码的消息
+     */
+    dispatchMessage(message) {
         try {
-            const data = JSON.parse(event.data);
+            const data = JSON.parse(message);
             console.log('Received message:', data);
 
             const messageType = data.type;
+            if (messageType === 'connection_established') {
+                this.compression = data.compression || null;
+                // 服务器实例变化（重启）后序号重新开始
+                const epoch = data.replay?.epoch || null;
+                if (epoch !== this.epoch) {
+                    this.epoch = epoch;
+                    this.lastSeq = 0;
+                }
+            } else if (messageType === 'server_restarting') {
+                this.restartPending = true;
+            } else if (messageType === 'resume') {
+                console.log(`Resumed session: ${data.replayed} missed message(s) replayed, complete: ${data.complete}`);
+                return;
+            }
+
+            // 编号消息只处理一次（补发与实时消息可能重叠）
+            if (typeof data.seq === 'number') {
+                if (data.seq <= this.lastSeq) {
+                    return;
+                }
+                this.lastSeq = data.seq;
+            }
+
             if (this.messageHandlers.has(messageType)) {
                 const handler = this.messageHandlers.get(messageType);
                 handler(data);
@@ -142,6 +271,24 @@ class WebSocketManager {
             }
         });
 
+        // 1009: 消息超过服务器允许的大小，通知页面说明原因
+        if (event.code === 1009 && this.messageHandlers.has('message_too_big')) {
+            this.messageHandlers.get('message_too_big')({ type: 'message_too_big', reason: event.reason });
+        }
+
+        // 1012: 服务器重启，不计入重连次数并立即重连
+        if (event.code === 1012 || this.restartPending) {
+            this.restartPending = false;
+            this.reconnectAttempts = 0;
+            this.updateConnectionStatus('reconnecting');
+            setTimeout(() => {
+                if (!this.isConnected) {
+                    this.connect();
+                }
+            }, this.restartReconnectDelay);
+            return;
+        }
+
         // 尝试重连（如果不是主动关闭）
         if (event.code !== 1000) {
             this.scheduleReconnect();
@@ -280,13 +427,163 @@ class WebSocketManager {
         return {
             isConnected: this.isConnected,
             reconnectAttempts: this.reconnectAttempts,
-            readyState: this.ws ? this.ws.readyState : WebSocket.CLOSED
+            readyState: this.ws ? this.ws.readyState : WebSocket.CLOSED,
+            compression: this.compression,
+            compressionStats: { ...this.compressionStats }
         };
     }
 }
 
+/**
+ * 可续传的分块图片上传
+ * 每个数据块都需要服务器确认；连接中断后，重连时从服务器确认的偏移继续上传
+ */
+class ResumableUploader {
+    constructor(wsManager) {
+        this.wsManager = wsManager;
+        // 等待确认的请求: upload_id -> { resolve, reject, timer }
+        this.pending = new Map();
+        this.ackTimeout = 15000;
+        // 超过该时间没有任何进展则放弃（覆盖重连的指数退避）
+        this.stallTimeout = 60000;
+
+        wsManager.onMessageType('upload_ack', (data) => {
+            this.settle(data.upload_id, null, data.offset);
+        });
+        wsManager.onMessageType('upload_error', (data) => {
+            const error = new Error(data.message);
+            error.rejected = true;
+            this.settle(data.upload_id, error);
+        });
+        // 数据块被服务器限流丢弃：等待后从服务器确认的偏移继续，而不是等到确认超时
+        wsManager.onMessageType('rate_limited', (data) => {
+            if (data.upload_id) {
+                const error = new Error('Rate limited');
+                error.retryAfter = data.retry_after || 0;
+                this.settle(data.upload_id, error);
+            }
+        });
+        wsManager.onConnectionChange((status) => {
+            if (status === 'disconnected') {
+                // 等待中的请求不会再收到确认，重连后重新发送
+                for (const uploadId of [...this.pending.keys()]) {
+                    this.settle(uploadId, new Error('Connection lost'));
+                }
+            }
+        });
+    }
+
+    /**
+     * 上传一张图片（image.blob），返回服务器端的上传ID
+     * 上传ID保存在图片对象上，重试提交时可复用服务器已收到的数据
+     */
+    async upload(image) {
+        const size = image.blob.size;
+        if (!image.uploadId) {
+            image.uploadId = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        }
+
+        // 每次只读取并编码一块，页面中不保留完整的 base64 字符串
+        const chunkSize = window.APP_CONFIG?.uploadChunkSize || 256 * 1024;
+        const language = window.APP_CONFIG?.language || 'CN';
+        let deadline = Date.now() + this.stallTimeout;
+
+        while (true) {
+            try {
+                await this.waitForConnection(deadline);
+                let offset = await this.request({
+                    type: 'upload_begin',
+                    upload_id: image.uploadId,
+                    name: image.name,
+                    mime_type: image.type,
+                    size: size,
+                    language: language
+                });
+
+                while (offset < size) {
+                    const chunk = await image.blob.slice(offset, offset + chunkSize).arrayBuffer();
+                    offset = await this.request({
+                        type: 'upload_chunk',
+                        upload_id: image.uploadId,
+                        offset: offset,
+                        data: this.encodeBase64(new Uint8Array(chunk)),
+                        language: language
+                    });
+                    deadline = Date.now() + this.stallTimeout;
+                }
+                return image.uploadId;
+
+            } catch (error) {
+                if (error.rejected || Date.now() > deadline) {
+                    throw error;
+                }
+                if (error.retryAfter) {
+                    await new Promise(resolve => setTimeout(resolve, error.retryAfter * 1000));
+                    continue;
+                }
+                console.warn(`Upload ${image.uploadId} interrupted, resuming after reconnect:`, error.message);
+            }
+        }
+    }
+
+    /**
+     * 将字节编码为 base64（分段转换，避免参数过多）
+     */
+    encodeBase64(bytes) {
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        return btoa(binary);
+    }
+
+    /**
+     * 发送上传请求并等待服务器确认的偏移
+     */
+    request(message) {
+        return new Promise((resolve, reject) => {
+            const uploadId = message.upload_id;
+            const timer = setTimeout(() => this.settle(uploadId, new Error('Upload acknowledgement timed out')), this.ackTimeout);
+            this.pending.set(uploadId, { resolve, reject, timer });
+            if (!this.wsManager.send(message)) {
+                this.settle(uploadId, new Error('Send failed'));
+            }
+        });
+    }
+
+    /**
+     * 完成等待中的请求
+     */
+    settle(uploadId, error, offset) {
+        const pending = this.pending.get(uploadId);
+        if (!pending) {
+            return;
+        }
+        clearTimeout(pending.timer);
+        this.pending.delete(uploadId);
+        if (error) {
+            pending.reject(error);
+        } else {
+            pending.resolve(offset);
+        }
+    }
+
+    /**
+     * 等待连接恢复
+     */
+    async waitForConnection(deadline) {
+        while (!this.wsManager.isConnected) {
+            if (Date.now() > deadline) {
+                throw new Error('Connection not restored');
+            }
+            await new Promise(resolve => setTimeout(resolve, 250));
+        }
+    }
+}
+
 // 创建全局WebSocket管理器实例
 window.wsManager = new WebSocketManager();
+window.uploader = new ResumableUploader(window.wsManager);
 
 // 页面加载完成后自动连接
 document.addEventListener('DOMContentLoaded', () => {
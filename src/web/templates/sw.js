@@ -0,0 +1,85 @@
+/**
+ * Service Worker：缓存页面外壳与指纹化资源
+ * 页面先从缓存渲染，再在后台刷新；资源内容哈希变化时本脚本随之变化，浏览器安装新版本并清理旧缓存
+ */
+
+const CACHE_PREFIX = 'feedback-shell-';
+const CACHE_NAME = CACHE_PREFIX + {{ cache_version | tojson }};
+const SHELL_PAGE = '/';
+const SHELL_ASSETS = {{ shell_assets | tojson }};
+const ASSET_PREFIX = '/assets/';
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then((cache) => cache.addAll([SHELL_PAGE, ...SHELL_ASSETS]))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((names) => Promise.all(names
+                .filter((name) => name.startsWith(CACHE_PREFIX) && name !== CACHE_NAME)
+                .map((name) => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    // 指纹化资源内容不变：缓存优先
+    if (url.pathname.startsWith(ASSET_PREFIX)) {
+        event.respondWith(cacheFirst(request));
+        return;
+    }
+
+    // 页面：立即返回缓存，同时在后台获取最新版本供下次使用
+    if (request.mode === 'navigate' && url.pathname === SHELL_PAGE) {
+        event.respondWith(staleWhileRevalidate(event, request));
+    }
+
+    // 其他请求（API、WebSocket、健康检查）不经过缓存
+});
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(CACHE_NAME);
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function staleWhileRevalidate(event, request) {
+    const cache = await caches.open(CACHE_NAME);
+    const cached = await cache.match(request);
+
+    const refresh = fetch(request)
+        .then(async (response) => {
+            if (response.ok) {
+                await cache.put(request, response.clone());
+            }
+            return response;
+        });
+
+    if (cached) {
+        event.waitUntil(refresh.catch(() => undefined));
+        return cached;
+    }
+    return refresh;
+}
@@ -3,23 +3,33 @@ Web 服务器入口
 """
 
 import asyncio
+import hashlib
+import hmac
 import os
+import socket
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import uuid
-from datetime import datetime
 import json
+import math
+import mimetypes
 
 import uvicorn
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-
-from src.core.websocket_manager import WebSocketManager
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response
+
+from src.core.feedback_questions import QuestionError, normalize_questions
+from src.core.listener_handoff import ListenerHandoff
+from src.core.loop_monitor import LoopMonitor, HandlerContextMiddleware
+from src.core.rate_limit import CallerKeys, RateLimiter
+from src.core.static_assets import StaticAssetPipeline, IMMUTABLE_CACHE_CONTROL
+from src.core.websocket_manager import WebSocketManager, CLOSE_SERVICE_RESTART
 from src.utils.config import Config
 from src.utils.logger import setup_logger
-from src.utils.i18n import get_all_texts
+from src.utils.memory_profile import MemoryProfiler
+from src.utils.i18n import I18n, get_all_texts
 
 # 初始化配置和日志
 config = Config()
@@ -48,8 +58,34 @@ TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
+# 静态资源管道（指纹化 + 预压缩），在启动事件中构建
+asset_pipeline = StaticAssetPipeline(STATIC_DIR, Path(config.STATIC_BUILD_DIR))
+
 # 设置模板引擎
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+templates.env.globals["asset_url"] = asset_pipeline.url_for
+
+# 平滑重启：监听套接字交接（仅 run_web_server 启动的独立进程启用）
+listener_handoff = ListenerHandoff(config.WEB_HANDOFF_SOCKET)
+
+# 反馈请求限流（按调用方），每次请求都会广播到所有客户端
+request_limiter = RateLimiter(config.REQUEST_RATE_LIMIT, config.REQUEST_RATE_BURST)
+request_callers = CallerKeys(
+    config.REQUEST_CALLERS_PER_ADDRESS,
+    config.REQUEST_RATE_BURST / config.REQUEST_RATE_LIMIT if config.REQUEST_RATE_LIMIT > 0 else 0)
+
+# 事件循环监控（可选），在启动事件中开始采样
+loop_monitor = LoopMonitor(
+    config.LOOP_LAG_INTERVAL, config.SLOW_CALLBACK_THRESHOLD, config.LOOP_LAG_LIMIT)
+if config.LOOP_MONITOR:
+    # 记录请求 scope，慢回调据此归属到路由处理函数
+    app.add_middleware(HandlerContextMiddleware)
+
+# 按需内存分析（通过管理接口开启 tracemalloc）
+memory_profiler = MemoryProfiler()
+
+# Service Worker 缓存版本，在启动事件中随静态资源构建计算
+shell_cache_version: Optional[str] = None
 
 
 def set_websocket_manager(manager: WebSocketManager):
@@ -63,9 +99,16 @@ def set_websocket_manager(manager: WebSocketManager):
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
-    global websocket_manager, feedback_storage
+    global websocket_manager, feedback_storage, shell_cache_version
 
     try:
+        if config.LOOP_MONITOR:
+            loop_monitor.start()
+
+        # 构建指纹化静态资源
+        asset_pipeline.build()
+        shell_cache_version = _compute_shell_cache_version()
+
         # 检查是否已设置WebSocket管理器，如果没有则创建一个新的
         if websocket_manager is None:
             logger.warning("WebSocket管理器未设置，创建新的WebSocket管理器")
@@ -74,6 +117,14 @@ async def startup_event():
         # 设置反馈存储
         websocket_manager.set_feedback_storage(feedback_storage)
 
+        # 从旧进程接管而来：旧进程排空后交接未完成的请求与已存储的结果
+        if listener_handoff.has_predecessor:
+            websocket_manager.expect_handoff_state()
+            asyncio.create_task(_receive_handoff_state())
+
+        # 等待下一次平滑重启的接管请求
+        await listener_handoff.start(websocket_manager.notify_restart)
+
         logger.info(f"Web服务器启动成功，监听地址: {config.get_web_url()}")
         logger.info(
             f"使用WebSocket管理器，当前连接数: {websocket_manager.get_connection_count()}")
@@ -89,8 +140,19 @@ async def shutdown_event():
     global websocket_manager
 
     try:
+        loop_monitor.stop()
+        handed_over = listener_handoff.handed_over
         if websocket_manager:
-            await websocket_manager.cleanup()
+            await websocket_manager.cleanup(
+                config.GRACEFUL_SHUTDOWN_TIMEOUT,
+                CLOSE_SERVICE_RESTART if handed_over else 1000)
+
+        if handed_over:
+            # 监听套接字与 Unix 域套接字文件已归新进程所有，只交接状态
+            await listener_handoff.send_state(websocket_manager.export_state())
+        else:
+            listener_handoff.close()
+            _remove_uds_path()
 
         logger.info("Web服务器已关闭")
 
@@ -98,6 +160,21 @@ async def shutdown_event():
         logger.error(f"Web服务器关闭时发生错误: {e}")
 
 
+def _compute_shell_cache_version() -> str:
+    """页面外壳缓存版本：资源清单、页面模板、Service Worker 脚本与界面文本任一变化时改变"""
+    digest = hashlib.sha256(asset_pipeline.version.encode("utf-8"))
+    for template in ("index.html", "sw.js"):
+        digest.update((TEMPLATES_DIR / template).read_bytes())
+    digest.update(json.dumps(I18n.TEXTS, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+async def _receive_handoff_state():
+    """接收旧进程交接的状态并合并"""
+    state = await listener_handoff.receive_state(config.GRACEFUL_SHUTDOWN_TIMEOUT + 5)
+    websocket_manager.import_state(state)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """主页面"""
@@ -115,7 +192,12 @@ async def index(request: Request):
                 "web_port": config.WEB_PORT,
                 "max_file_size": config.MAX_FILE_SIZE,
                 "allowed_extensions": config.ALLOWED_EXTENSIONS,
-                "ws_heartbeat_interval": config.WS_HEARTBEAT_INTERVAL
+                "upload_chunk_size": config.UPLOAD_CHUNK_SIZE,
+                "image_max_dimension": config.IMAGE_MAX_DIMENSION,
+                "image_quality": config.IMAGE_QUALITY,
+                "image_output_format": config.IMAGE_OUTPUT_FORMAT,
+                "ws_heartbeat_interval": config.WS_HEARTBEAT_INTERVAL,
+                "service_worker": config.WEB_SERVICE_WORKER
             }
         }
 
@@ -129,12 +211,54 @@ async def index(request: Request):
         )
 
 
+@app.get("/sw.js")
+async def service_worker(request: Request):
+    """Service Worker 脚本：每次都向服务器确认，内容随缓存版本变化，浏览器据此安装新版本"""
+    if not config.WEB_SERVICE_WORKER or shell_cache_version is None:
+        return Response(status_code=404)
+
+    return templates.TemplateResponse("sw.js", {
+        "request": request,
+        "cache_version": shell_cache_version,
+        "shell_assets": asset_pipeline.asset_urls()
+    }, media_type="application/javascript", headers={
+        "Cache-Control": "no-cache",
+        "Service-Worker-Allowed": "/"
+    })
+
+
+@app.get("/assets/{asset_path:path}")
+async def fingerprinted_asset(asset_path: str, request: Request):
+    """指纹化静态资源，按 Accept-Encoding 选择预压缩副本"""
+    resolved = asset_pipeline.resolve(
+        asset_path, request.headers.get("accept-encoding"))
+    if resolved is None:
+        return Response(status_code=404)
+
+    file_path, encoding = resolved
+    media_type = mimetypes.guess_type(asset_path)[0] or "application/octet-stream"
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Vary": "Accept-Encoding"
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return FileResponse(file_path, media_type=media_type, headers=headers)
+
+
 @app.get("/health")
 async def health_check():
     """健康检查接口"""
     return {
         "status": "healthy",
         "connections": websocket_manager.get_connection_count() if websocket_manager else 0,
+        "rate_limits": {
+            "websocket": websocket_manager.get_rate_limit_stats() if websocket_manager else None,
+            "request_feedback": request_limiter.stats()
+        },
+        "replay": websocket_manager.get_replay_stats() if websocket_manager else None,
+        "image_handoff": websocket_manager.get_handoff_probe() if websocket_manager else None,
         "config": {
             "host": config.WEB_HOST,
             "port": config.WEB_PORT,
@@ -143,6 +267,100 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """就绪检查：事件循环延迟超过上限或服务正在交接给新进程时返回 503"""
+    reasons = []
+    if websocket_manager is None:
+        reasons.append("starting")
+    if listener_handoff.handed_over:
+        reasons.append("draining")
+    if not loop_monitor.is_healthy():
+        reasons.append("loop_lag")
+
+    return JSONResponse(
+        status_code=503 if reasons else 200,
+        content={
+            "status": "not_ready" if reasons else "ready",
+            "reasons": reasons,
+            "loop": loop_monitor.stats()
+        })
+
+
+def _check_admin(request: Request) -> Optional[JSONResponse]:
+    """校验管理令牌；未配置令牌时管理接口不存在"""
+    if not config.ADMIN_TOKEN:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+
+    token = request.headers.get("x-admin-token")
+    authorization = request.headers.get("authorization", "")
+    if token is None and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not token or not hmac.compare_digest(token.encode("utf-8"), config.ADMIN_TOKEN.encode("utf-8")):
+        return JSONResponse(status_code=401, content={"status": "error", "error": "需要管理令牌"})
+    return None
+
+
+@app.get("/admin/memory")
+async def admin_memory(request: Request, limit: int = 20):
+    """管理接口：主要内存容器的大小，以及 tracemalloc 开启时按模块汇总的分配"""
+    denied = _check_admin(request)
+    if denied:
+        return denied
+
+    limit = min(max(limit, 1), 100)
+    containers = websocket_manager.get_memory_stats() if websocket_manager else {}
+    containers["jinja_cache"] = {"entries": len(templates.env.cache or ())}
+    return {
+        "tracemalloc": memory_profiler.report(limit),
+        "containers": containers
+    }
+
+
+@app.post("/admin/memory/tracemalloc")
+async def admin_toggle_tracemalloc(request: Request):
+    """管理接口：开启或关闭 tracemalloc（请求体 {"enabled": bool, "frames": int}）"""
+    denied = _check_admin(request)
+    if denied:
+        return denied
+
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+
+    enabled = body.get("enabled", not memory_profiler.tracing)
+    if enabled:
+        try:
+            frames = int(body.get("frames", 1))
+        except (TypeError, ValueError):
+            return JSONResponse(status_code=400, content={"status": "error", "error": "frames 必须是整数"})
+        memory_profiler.start(min(max(frames, 1), 64))
+        logger.warning("已开启 tracemalloc 内存跟踪")
+    else:
+        memory_profiler.stop()
+        logger.warning("已关闭 tracemalloc 内存跟踪")
+    return {"tracemalloc": memory_profiler.status()}
+
+
+@app.get("/api/connections")
+async def api_connections():
+    """API 端点：获取连接信息及压缩统计"""
+    if not websocket_manager:
+        return {"connections": []}
+    return {"connections": websocket_manager.get_connection_info()}
+
+
+@app.get("/api/queue")
+async def api_queue():
+    """API 端点：获取等待回答的请求队列（按优先级与截止时间排序）"""
+    if not websocket_manager:
+        return {"requests": []}
+    return {"requests": websocket_manager.get_request_queue()}
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket连接处理"""
@@ -155,16 +373,27 @@ async def websocket_endpoint(websocket: WebSocket):
     # 先接受 WebSocket 连接
     await websocket.accept()
 
-    # 然后通过管理器管理连接
-    await websocket_manager.connect(websocket)
+    # 然后通过管理器管理连接；重连的标签页带上会话ID与最后收到的序号，服务器补发其间的消息
+    await websocket_manager.connect(websocket, {
+        "compression": websocket.query_params.get("compress"),
+        "session": websocket.query_params.get("session"),
+        "epoch": websocket.query_params.get("epoch"),
+        "last_seq": websocket.query_params.get("last_seq")
+    })
 
     try:
         while True:
-            # 接收消息
-            data = await websocket.receive_text()
+            # 接收消息（文本帧或压缩后的二进制帧）
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            frame = message.get("bytes")
+            if frame is None:
+                frame = message.get("text", "")
 
             # 处理客户端消息
-            await websocket_manager.handle_client_message(websocket, data)
+            await websocket_manager.handle_client_frame(websocket, frame)
 
     except WebSocketDisconnect:
         logger.info("WebSocket连接断开")
@@ -182,32 +411,73 @@ async def api_request_feedback(request: Request):
     if not websocket_manager:
         return {"error": "WebSocket管理器未初始化"}
 
+    # 按对端地址限流（Unix 域套接字没有地址）；同机多个 MCP 进程地址相同，
+    # 它们声明的标识在地址内部细分，数量有上限，不能用来绕过限流
+    address = request.client.host if request.client and request.client.host else "local"
+    caller = request_callers.key(address, request.headers.get("x-feedback-caller"))
+    retry_after = request_limiter.check(caller)
+    if retry_after:
+        logger.warning(f"反馈请求过于频繁，已拒绝: {caller}")
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+            content={
+                "status": "error",
+                "error": "反馈请求过于频繁，请稍后重试",
+                "retry_after": round(retry_after, 3)
+            }
+        )
+
     try:
         # 解析请求数据
         data = await request.json()
         request_id = data.get("id", str(uuid.uuid4()))
         timeout = data.get("timeout", 600)
         language = data.get("language", "CN")
+        image_handoff = data.get("image_handoff")
+        priority = int(data.get("priority") or 0)
+        summary = data.get("summary")
+        questions = data.get("questions")
+        if questions is not None:
+            try:
+                questions = normalize_questions(questions)
+            except QuestionError as e:
+                return JSONResponse(status_code=400, content={"status": "error", "error": str(e)})
+
+        # 发送反馈请求到所有客户端，并按优先级加入队列
+        await websocket_manager.request_feedback(
+            request_id, timeout, language, image_handoff,
+            priority=priority, summary=summary, caller=caller, questions=questions)
 
-        # 发送反馈请求到所有客户端
-        request_data = {
-            "type": "request_feedback",
-            "id": request_id,
-            "timestamp": datetime.now().isoformat(),
-            "timeout": timeout,
-            "language": language
+        return {
+            "status": "success",
+            "request_id": request_id,
+            "message": "反馈请求已发送"
         }
 
-        await websocket_manager.broadcast_message(request_data)
+    except Exception as e:
+        logger.error(f"API 请求反馈失败: {e}")
+        return {"error": str(e)}
+
+
+@app.post("/api/feedback/{request_id}/cancel")
+async def api_cancel_feedback(request_id: str, request: Request):
+    """API 端点：调用方取消请求，关闭浏览器中的表单并删除请求与已存储的结果"""
+    if not websocket_manager:
+        return {"error": "WebSocket管理器未初始化"}
 
+    try:
+        data = await request.json() if await request.body() else {}
+        reason = data.get("reason", "cancelled")
+        existed = await websocket_manager.cancel_request(request_id, reason)
         return {
             "status": "success",
             "request_id": request_id,
-            "message": "反馈请求已发送"
+            "existed": existed
         }
 
     except Exception as e:
-        logger.error(f"API 请求反馈失败: {e}")
+        logger.error(f"API 取消反馈请求失败: {e}")
         return {"error": str(e)}
 
 
@@ -227,6 +497,55 @@ async def api_get_feedback(request_id: str):
         }
 
 
+def _build_uvicorn_config() -> uvicorn.Config:
+    """构建uvicorn配置"""
+    return uvicorn.Config(
+        app=app,
+        host=config.WEB_HOST,
+        port=config.WEB_PORT,
+        log_level=config.LOG_LEVEL.lower(),
+        access_log=True,
+        loop="asyncio",
+        ws_per_message_deflate=config.WS_COMPRESSION == "permessage-deflate",
+        # 超限消息在协议层按帧头长度拒绝（关闭码 1009），不会先缓冲完整负载
+        ws_max_size=config.WS_MAX_MESSAGE_SIZE,
+        # 关闭（包括平滑重启排空）时等待进行中请求的最长时间
+        timeout_graceful_shutdown=config.GRACEFUL_SHUTDOWN_TIMEOUT
+    )
+
+
+def _bind_sockets(uvicorn_config: uvicorn.Config) -> List[socket.socket]:
+    """
+    绑定监听套接字：TCP 端口供浏览器访问，可选的 Unix 域套接字供同机 MCP 服务器访问
+
+    Args:
+        uvicorn_config: uvicorn配置
+
+    Returns:
+        已绑定的套接字列表
+    """
+    sockets = [uvicorn_config.bind_socket()]
+
+    if config.WEB_UDS_PATH:
+        # 清理上次运行遗留的套接字文件
+        if os.path.exists(config.WEB_UDS_PATH):
+            os.unlink(config.WEB_UDS_PATH)
+        uds_config = uvicorn.Config(app=app, uds=config.WEB_UDS_PATH)
+        sockets.append(uds_config.bind_socket())
+        logger.info(f"同时监听 Unix 域套接字: {config.WEB_UDS_PATH}")
+
+    return sockets
+
+
+def _remove_uds_path():
+    """删除 Unix 域套接字文件"""
+    if config.WEB_UDS_PATH and os.path.exists(config.WEB_UDS_PATH):
+        try:
+            os.unlink(config.WEB_UDS_PATH)
+        except OSError as e:
+            logger.warning(f"删除 Unix 域套接字文件失败: {e}")
+
+
 async def start_web_server(shared_websocket_manager: Optional[WebSocketManager] = None):
     """启动Web服务器"""
     try:
@@ -239,36 +558,34 @@ async def start_web_server(shared_websocket_manager: Optional[WebSocketManager]
             set_websocket_manager(WebSocketManager())
 
         # 配置uvicorn
-        uvicorn_config = uvicorn.Config(
-            app=app,
-            host=config.WEB_HOST,
-            port=config.WEB_PORT,
-            log_level=config.LOG_LEVEL.lower(),
-            access_log=True,
-            loop="asyncio"
-        )
+        uvicorn_config = _build_uvicorn_config()
 
         # 创建服务器实例
         server = uvicorn.Server(uvicorn_config)
 
         # 在后台任务中运行服务器
-        await server.serve()
+        await server.serve(sockets=_bind_sockets(uvicorn_config))
 
     except Exception as e:
         logger.error(f"启动Web服务器失败: {e}")
         raise
 
 
-def run_web_server():
-    """运行Web服务器（同步版本）"""
+def run_web_server(sockets: Optional[List[socket.socket]] = None):
+    """
+    运行Web服务器（同步版本）
+
+    Args:
+        sockets: 已接管的监听套接字（平滑重启时由 listener_handoff.take_over() 取得），
+                 为空时自行绑定
+    """
     try:
-        uvicorn.run(
-            app,
-            host=config.WEB_HOST,
-            port=config.WEB_PORT,
-            log_level=config.LOG_LEVEL.lower(),
-            access_log=True
-        )
+        uvicorn_config = _build_uvicorn_config()
+        server = uvicorn.Server(uvicorn_config)
+        sockets = sockets or _bind_sockets(uvicorn_config)
+        if config.WEB_HANDOFF:
+            listener_handoff.attach(server, sockets)
+        server.run(sockets=sockets)
     except Exception as e:
         logger.error(f"运行Web服务器失败: {e}")
         raise